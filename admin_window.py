@@ -5,10 +5,12 @@ from PySide6.QtWidgets import (QMainWindow, QWidget, QLabel, QComboBox, QPushBut
                                QListWidgetItem, QGridLayout, QDateEdit, QSpinBox,
                                QRadioButton, QButtonGroup, QCheckBox, QTextEdit,
                                QHeaderView, QStackedWidget, QSplitter, QTimeEdit,
-                               QFileDialog)
+                               QFileDialog, QTableView)
 from PySide6.QtCore import Qt, Signal, QDate, QSize, QTimer, QTime
-from PySide6.QtGui import QFont, QIcon, QColor, QPixmap, QPainter, QPen, QBrush, QPainterPath
+from PySide6.QtGui import (QFont, QIcon, QColor, QPixmap, QPainter, QPen, QBrush, QPainterPath,
+                           QShortcut, QKeySequence)
 from datetime import datetime, timedelta
+import logging
 import sys
 import json
 import os
@@ -26,7 +28,49 @@ import xlwt
 import ssl
 import report_generator
 
-from database_connection import db
+from database_connection import db, date_range_bounds, patient_search_match
+from async_query import query_executor
+from paged_table import PagedTableModel, ActionButtonsDelegate
+from global_search import GlobalSearchBox
+from patient_picker import PatientPicker
+from workload_trends import WorkloadTrendsWidget
+
+logger = logging.getLogger(__name__)
+
+# Ограничение формата .xls: строк на одном листе (вместе с заголовком)
+XLS_MAX_ROWS = 65536
+
+
+def write_xls_rows(workbook, sheet_name, headers, rows, header_style=None, cell_style=None, column_width=None):
+    """
+    Запись строк (последовательностей значений) на лист книги xlwt по мере чтения.
+    Строки, не поместившиеся на лист, продолжаются на листах "<имя> (2)", "<имя> (3)"...
+    Возвращает количество записанных строк.
+    """
+    header_style = header_style or xlwt.Style.default_style
+    cell_style = cell_style or xlwt.Style.default_style
+
+    def add_sheet(number):
+        sheet = workbook.add_sheet(sheet_name if number == 1 else f"{sheet_name} ({number})")
+        for col, header in enumerate(headers):
+            sheet.write(0, col, header, header_style)
+            if column_width:
+                sheet.col(col).width = column_width
+        return sheet
+
+    sheet = add_sheet(1)
+    row = 0
+    count = 0
+    for values in rows:
+        row += 1
+        if row == XLS_MAX_ROWS:
+            sheet = add_sheet(count // (XLS_MAX_ROWS - 1) + 1)
+            row = 1
+        for col, value in enumerate(values):
+            sheet.write(row, col, value, cell_style)
+        count += 1
+    return count
+
 
 GLOBAL_STYLESHEET = """
     /* Общие стили для всех виджетов */
@@ -87,14 +131,14 @@ GLOBAL_STYLESHEET = """
     }
 
     /* Стили для таблицы */
-    QTableWidget {
+    QTableWidget, QTableView {
         border: 1px solid #ced4da;
         border-radius: 4px;
         background-color: white;
         font-size: 14px;
     }
 
-    QTableWidget::item {
+    QTableWidget::item, QTableView::item {
         padding: 5px;
     }
 
@@ -223,9 +267,9 @@ GLOBAL_STYLESHEET = """
 try:
     from app.utils.document_generator import DocumentGenerator
     from app.utils.email_sender import EmailSender
-    print("Импортированы классы из app.utils")
+    logger.debug("Импортированы классы из app.utils")
 except ImportError:
-    print("Невозможно импортировать классы из app.utils, используются встроенные версии")
+    logger.warning("Невозможно импортировать классы из app.utils, используются встроенные версии")
     # DocumentGenerator класс определен в другом месте - app.utils.document_generator
 
 
@@ -277,14 +321,14 @@ class EmailSender:
 
             # В тестовом режиме не отправляем письмо, а только выводим информацию
             if self.test_mode:
-                print(f"\n[ТЕСТОВЫЙ РЕЖИМ] Отправка email:")
-                print(f"От: {self.username}")
-                print(f"Кому: {recipient_email}")
-                print(f"Тема: {subject}")
-                print(f"Содержание: HTML-письмо")
+                logger.info("[ТЕСТОВЫЙ РЕЖИМ] Отправка email:")
+                logger.info("От: %s", self.username)
+                logger.info("Кому: %s", recipient_email)
+                logger.info("Тема: %s", subject)
+                logger.info("Содержание: HTML-письмо")
                 if attachments:
-                    print(f"Вложения: {', '.join([os.path.basename(f) for f in attachments if os.path.isfile(f)])}")
-                print("Email успешно отправлен (тестовый режим)")
+                    logger.info("Вложения: %s", ', '.join([os.path.basename(f) for f in attachments if os.path.isfile(f)]))
+                logger.info("Email успешно отправлен (тестовый режим)")
                 return True
             
             # Отправка письма
@@ -299,7 +343,7 @@ class EmailSender:
             return True
             
         except Exception as e:
-            print(f"Ошибка при отправке email: {str(e)}")
+            logger.error("Ошибка при отправке email: %s", e)
             return False
     
     def send_report(self, recipient_email, recipient_name, report_type, report_period, report_file_path, additional_text=None):
@@ -317,7 +361,7 @@ class EmailSender:
         try:
             # Проверка существования файла отчета
             if not os.path.isfile(report_file_path):
-                print(f"Ошибка: файл отчета {report_file_path} не найден")
+                logger.error("Ошибка: файл отчета %s не найден", report_file_path)
                 return False
             
             # Создание HTML-содержимого письма
@@ -369,7 +413,7 @@ class EmailSender:
             )
             
         except Exception as e:
-            print(f"Ошибка при отправке отчета: {str(e)}")
+            logger.error("Ошибка при отправке отчета: %s", e)
             return False
 
 
@@ -517,7 +561,7 @@ class DocumentGenerator:
             return file_path
 
         except Exception as e:
-            print(f"Ошибка при создании документа: {str(e)}")
+            logger.error("Ошибка при создании документа: %s", e)
             return None
 
     def _get_normal_values(self, parameter):
@@ -738,12 +782,14 @@ class AddEditUserDialog(QDialog):
                 query += " WHERE id = ?"
                 params.append(user_id)
                 
-                print(f"Выполнение обновления пользователя: {query}")
-                print(f"Параметры: {params}")
+                logger.debug("Обновление пользователя с ID %s", user_id)
                 
-                if db.execute_query(query, params):
+                # Пользователь и запись о враче сохраняются одной транзакцией
+                with db.transaction():
+                    updated = db.execute_query(query, params)
+                    
                     # Обновление информации о враче, если это врач
-                    if role == "doctor":
+                    if updated and role == "doctor":
                         specialization = self.specialization_input.text().strip()
                         
                         # Проверяем, существует ли уже запись о враче
@@ -759,25 +805,27 @@ class AddEditUserDialog(QDialog):
                                 "INSERT INTO doctors (user_id, specialization) VALUES (?, ?)",
                                 (user_id, specialization)
                             )
-                    
+                
+                if updated:
                     QMessageBox.information(self, "Успех", "Пользователь успешно обновлен")
                     self.accept()
                 else:
                     QMessageBox.warning(self, "Ошибка", "Не удалось обновить пользователя")
             else:  # Добавление нового пользователя
                 # Добавление пользователя
-                print(f"Добавление нового пользователя: {username}, {role}")
-                user_id = db.add_user(username, password, full_name, role, email)
-                
-                if user_id:
+                logger.debug("Добавление нового пользователя: %s, %s", username, role)
+                with db.transaction():
+                    user_id = db.add_user(username, password, full_name, role, email)
+                    
                     # Добавление информации о враче, если это врач
-                    if role == "doctor":
+                    if user_id and role == "doctor":
                         specialization = self.specialization_input.text().strip()
                         db.execute_query(
                             "INSERT INTO doctors (user_id, specialization) VALUES (?, ?)",
                             (user_id, specialization)
                         )
-                    
+                
+                if user_id:
                     QMessageBox.information(self, "Успех", "Пользователь успешно добавлен")
                     self.accept()
                 else:
@@ -907,12 +955,13 @@ class UserListWidget(QWidget):
         
         if reply == QMessageBox.Yes:
             try:
-                # Удаление врача, если это врач
-                if user.get('role') == 'doctor':
-                    db.execute_query("DELETE FROM doctors WHERE user_id = ?", (user.get('id'),))
-                
-                # Удаление пользователя
-                result = db.execute_query("DELETE FROM users WHERE id = ?", (user.get('id'),))
+                with db.transaction():
+                    # Удаление врача, если это врач
+                    if user.get('role') == 'doctor':
+                        db.execute_query("DELETE FROM doctors WHERE user_id = ?", (user.get('id'),))
+                    
+                    # Удаление пользователя
+                    result = db.execute_query("DELETE FROM users WHERE id = ?", (user.get('id'),))
                 
                 if result:
                     QMessageBox.information(self, "Успех", "Пользователь успешно удален")
@@ -981,43 +1030,69 @@ class SystemStatisticsWidget(QWidget):
         self.statistics_layout = QVBoxLayout(statistics_widget)
         
         self.statistics_area.setWidget(statistics_widget)
-        layout.addWidget(self.statistics_area)
+        
+        # Графики динамики нагрузки за тот же период
+        self.trends_widget = WorkloadTrendsWidget()
+        
+        self.statistics_tabs = QTabWidget()
+        self.statistics_tabs.addTab(self.statistics_area, "Сводка")
+        self.statistics_tabs.addTab(self.trends_widget, "Динамика")
+        layout.addWidget(self.statistics_tabs)
         
         # Загрузка статистики
         self.load_statistics()
     
     def load_statistics(self):
-        """Загрузка статистики"""
-        # Очистка предыдущих данных
+        """Загрузка статистики (запросы выполняются в фоновом потоке)"""
+        self._clear_statistics()
+        self.statistics_layout.addWidget(QLabel("Загрузка статистики..."))
+        
+        # Получение параметров фильтрации: полуинтервал [начало, конец + 1 день)
+        start_date, end_date = date_range_bounds(self.start_date.date().toString("yyyy-MM-dd"),
+                                                 self.end_date.date().toString("yyyy-MM-dd"))
+        
+        # Статистика считается по ежедневным сводкам (db.get_statistics)
+        query_executor().submit(
+            self,
+            lambda connection: connection.get_statistics(start_date, end_date),
+            self._show_statistics,
+            self._on_statistics_failed
+        )
+        self.trends_widget.load(start_date, end_date)
+    
+    def _clear_statistics(self):
+        """Очистка блоков статистики"""
         for i in reversed(range(self.statistics_layout.count())):
             widget = self.statistics_layout.itemAt(i).widget()
             if widget:
                 widget.setParent(None)
-        
-        # Получение параметров фильтрации
-        start_date = self.start_date.date().toString("yyyy-MM-dd")
-        end_date = self.end_date.date().toString("yyyy-MM-dd")
+    
+    def _on_statistics_failed(self, message):
+        """Сообщение об ошибке вместо блоков статистики"""
+        self._clear_statistics()
+        self.statistics_layout.addWidget(QLabel(f"Ошибка при загрузке статистики: {message}"))
+    
+    def _show_statistics(self, statistics):
+        """Отображение статистики, полученной db.get_statistics"""
+        self._clear_statistics()
         
         # Статистика пользователей
-        self._add_user_statistics()
+        self._add_user_statistics(statistics['users_by_role'])
         
         # Статистика пациентов
-        self._add_patient_statistics(start_date, end_date)
+        self._add_patient_statistics(statistics['total_patients'], statistics['new_patients'])
         
         # Статистика анализов
-        self._add_analysis_statistics(start_date, end_date)
+        self._add_analysis_statistics(statistics['total_analyses'], statistics['analyses_by_type'])
         
         # Статистика приемов
-        self._add_appointment_statistics(start_date, end_date)
+        self._add_appointment_statistics(statistics['total_appointments'], statistics['appointments_by_status'])
     
-    def _add_user_statistics(self):
+    def _add_user_statistics(self, users):
         """Добавление блока статистики пользователей"""
         group_box = QGroupBox("Статистика пользователей")
         layout = QVBoxLayout()
         
-        # Общее количество пользователей
-        users = db.fetch_all("SELECT role, COUNT(*) as count FROM users GROUP BY role")
-        
         # Маппинг ролей для отображения
         role_map = {
             'admin': 'Администраторы',
@@ -1037,50 +1112,32 @@ class SystemStatisticsWidget(QWidget):
         group_box.setLayout(layout)
         self.statistics_layout.addWidget(group_box)
     
-    def _add_patient_statistics(self, start_date, end_date):
+    def _add_patient_statistics(self, total_patients, new_patients):
         """Добавление блока статистики пациентов"""
         group_box = QGroupBox("Статистика пациентов")
         layout = QVBoxLayout()
         
         # Общее количество пациентов
-        total_patients = db.fetch_one("SELECT COUNT(*) as count FROM patients")
         total_label = QLabel(f"Всего пациентов: {total_patients.get('count', 0)}")
         layout.addWidget(total_label)
         
         # Количество новых пациентов за период
-        new_patients = db.fetch_one(
-            "SELECT COUNT(*) as count FROM patients WHERE date(created_at) BETWEEN ? AND ?",
-            (start_date, end_date)
-        )
         new_patients_label = QLabel(f"Новых пациентов за период: {new_patients.get('count', 0)}")
         layout.addWidget(new_patients_label)
         
         group_box.setLayout(layout)
         self.statistics_layout.addWidget(group_box)
     
-    def _add_analysis_statistics(self, start_date, end_date):
+    def _add_analysis_statistics(self, total_analyses, analyses_by_type):
         """Добавление блока статистики анализов"""
         group_box = QGroupBox("Статистика анализов")
         layout = QVBoxLayout()
         
         # Общее количество анализов за период
-        total_analyses = db.fetch_one(
-            "SELECT COUNT(*) as count FROM analysis_results WHERE date(result_date) BETWEEN ? AND ?",
-            (start_date, end_date)
-        )
         total_label = QLabel(f"Всего анализов за период: {total_analyses.get('count', 0)}")
         layout.addWidget(total_label)
         
         # Количество анализов по типам
-        analyses_by_type = db.fetch_all("""
-            SELECT at.name, COUNT(ar.id) as count
-            FROM analysis_results ar
-            JOIN analysis_types at ON ar.analysis_type_id = at.id
-            WHERE date(ar.result_date) BETWEEN ? AND ?
-            GROUP BY at.name
-            ORDER BY count DESC
-        """, (start_date, end_date))
-        
         if analyses_by_type:
             types_label = QLabel("Анализы по типам:")
             layout.addWidget(types_label)
@@ -1097,27 +1154,15 @@ class SystemStatisticsWidget(QWidget):
         group_box.setLayout(layout)
         self.statistics_layout.addWidget(group_box)
     
-    def _add_appointment_statistics(self, start_date, end_date):
+    def _add_appointment_statistics(self, total_appointments, appointments_by_status):
         """Добавление блока статистики приемов"""
         group_box = QGroupBox("Статистика приемов")
         layout = QVBoxLayout()
         
         # Общее количество приемов за период
-        total_appointments = db.fetch_one(
-            "SELECT COUNT(*) as count FROM appointments WHERE date(appointment_date) BETWEEN ? AND ?",
-            (start_date, end_date)
-        )
         total_label = QLabel(f"Всего приемов за период: {total_appointments.get('count', 0)}")
         layout.addWidget(total_label)
         
-        # Количество приемов по статусам
-        appointments_by_status = db.fetch_all("""
-            SELECT status, COUNT(*) as count
-            FROM appointments
-            WHERE date(appointment_date) BETWEEN ? AND ?
-            GROUP BY status
-        """, (start_date, end_date))
-        
         # Маппинг статусов для отображения
         status_map = {
             'scheduled': 'Запланировано',
@@ -1158,16 +1203,17 @@ class SystemStatisticsWidget(QWidget):
             ws_general.write(1, 0, f"Период: {self.start_date.date().toString('dd.MM.yyyy')} - {self.end_date.date().toString('dd.MM.yyyy')}")
             ws_general.write(2, 0, f"Дата создания отчета: {datetime.now().strftime('%d.%m.%Y %H:%M')}")
             
-            # Получаем данные
-            start_date = self.start_date.date().toString("yyyy-MM-dd")
-            end_date = self.end_date.date().toString("yyyy-MM-dd")
+            # Получаем данные: та же статистика по сводкам, что и на вкладке
+            start_date, end_date = date_range_bounds(self.start_date.date().toString("yyyy-MM-dd"),
+                                                     self.end_date.date().toString("yyyy-MM-dd"))
+            statistics = db.get_statistics(start_date, end_date)
             
             # Статистика пользователей
             row = 4
             ws_general.write(row, 0, "Статистика пользователей")
             row += 1
             
-            users = db.fetch_all("SELECT role, COUNT(*) as count FROM users GROUP BY role")
+            users = statistics['users_by_role']
             role_map = {
                 'admin': 'Администраторы',
                 'doctor': 'Врачи',
@@ -1186,15 +1232,12 @@ class SystemStatisticsWidget(QWidget):
             ws_general.write(row, 0, "Статистика пациентов")
             row += 1
             
-            total_patients = db.fetch_one("SELECT COUNT(*) as count FROM patients")
+            total_patients = statistics['total_patients']
             ws_general.write(row, 0, "Всего пациентов")
             ws_general.write(row, 1, total_patients.get('count', 0))
             row += 1
             
-            new_patients = db.fetch_one(
-                "SELECT COUNT(*) as count FROM patients WHERE date(created_at) BETWEEN ? AND ?",
-                (start_date, end_date)
-            )
+            new_patients = statistics['new_patients']
             ws_general.write(row, 0, "Новых пациентов за период")
             ws_general.write(row, 1, new_patients.get('count', 0))
             row += 1
@@ -1204,14 +1247,7 @@ class SystemStatisticsWidget(QWidget):
             ws_general.write(row, 0, "Статистика анализов")
             row += 1
             
-            analyses_by_type = db.fetch_all("""
-                SELECT at.name, COUNT(ar.id) as count
-                FROM analysis_results ar
-                JOIN analysis_types at ON ar.analysis_type_id = at.id
-                WHERE date(ar.result_date) BETWEEN ? AND ?
-                GROUP BY at.name
-                ORDER BY count DESC
-            """, (start_date, end_date))
+            analyses_by_type = statistics['analyses_by_type']
             
             for type_stat in analyses_by_type:
                 type_name = type_stat.get('name', '')
@@ -1220,23 +1256,13 @@ class SystemStatisticsWidget(QWidget):
                 ws_general.write(row, 1, count)
                 row += 1
             
-            # Создаем лист со списком пациентов
-            ws_patients = wb.add_sheet('Список пациентов')
-            
-            # Заголовки столбцов
-            headers = ["ID", "ФИО", "Дата рождения", "Телефон", "Email", "Адрес"]
-            for col, header in enumerate(headers):
-                ws_patients.write(0, col, header)
-            
-            # Данные пациентов
-            patients = db.get_all_patients()
-            for row, patient in enumerate(patients, 1):
-                ws_patients.write(row, 0, patient.get('id', ''))
-                ws_patients.write(row, 1, patient.get('full_name', ''))
-                ws_patients.write(row, 2, patient.get('birth_date', ''))
-                ws_patients.write(row, 3, patient.get('phone', ''))
-                ws_patients.write(row, 4, patient.get('email', ''))
-                ws_patients.write(row, 5, patient.get('address', ''))
+            # Лист со списком пациентов: строки читаются из базы потоком, пачками
+            patients = db.iter_rows(
+                "SELECT id, full_name, birth_date, phone, email, address FROM patients",
+                row_factory='tuple'
+            )
+            write_xls_rows(wb, 'Список пациентов',
+                           ["ID", "ФИО", "Дата рождения", "Телефон", "Email", "Адрес"], patients)
             
             # Сохраняем отчет
             report_name = f"medical_report_Общий_список_пациентов_{datetime.now().strftime('%Y-%m-%d')}.xls"
@@ -1253,9 +1279,6 @@ class SystemStatisticsWidget(QWidget):
             import csv
             from datetime import datetime
             
-            # Получаем данные
-            patients = db.get_all_patients()
-            
             # Создаем CSV-файл
             report_name = f"medical_report_Общий_список_пациентов_{datetime.now().strftime('%Y-%m-%d')}.csv"
             
@@ -1270,16 +1293,11 @@ class SystemStatisticsWidget(QWidget):
                 # Заголовки столбцов
                 writer.writerow(["ID", "ФИО", "Дата рождения", "Телефон", "Email", "Адрес"])
                 
-                # Данные пациентов
-                for patient in patients:
-                    writer.writerow([
-                        patient.get('id', ''),
-                        patient.get('full_name', ''),
-                        patient.get('birth_date', ''),
-                        patient.get('phone', ''),
-                        patient.get('email', ''),
-                        patient.get('address', '')
-                    ])
+                # Данные пациентов: строки читаются из базы потоком и сразу записываются в файл
+                writer.writerows(db.iter_rows(
+                    "SELECT id, full_name, birth_date, phone, email, address FROM patients",
+                    row_factory='tuple'
+                ))
             
             QMessageBox.information(self, "Отчет создан", f"Отчет CSV успешно сохранен: {report_name}")
         
@@ -1287,8 +1305,145 @@ class SystemStatisticsWidget(QWidget):
             QMessageBox.critical(self, "Ошибка", f"Ошибка при создании отчета CSV: {str(e)}")
 
 
+class QueryDiagnosticsWidget(QWidget):
+    """Скрытая вкладка диагностики: статистика выполнения SQL-запросов (db.stats())"""
+
+    COLUMNS = [
+        ('sql', "Запрос"),
+        ('calls', "Вызовов"),
+        ('total_ms', "Всего, мс"),
+        ('avg_ms', "Среднее, мс"),
+        ('p50_ms', "p50, мс"),
+        ('p95_ms', "p95, мс"),
+        ('p99_ms', "p99, мс"),
+        ('max_ms', "Макс., мс"),
+        ('rows', "Строк"),
+    ]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.statements = []
+        self.setup_ui()
+
+    def setup_ui(self):
+        """Настройка интерфейса"""
+        layout = QVBoxLayout(self)
+
+        top_panel = QHBoxLayout()
+        self.summary_label = QLabel()
+        top_panel.addWidget(self.summary_label)
+        top_panel.addStretch()
+
+        refresh_button = QPushButton("Обновить")
+        refresh_button.setObjectName("primary")
+        refresh_button.clicked.connect(self.load_stats)
+        top_panel.addWidget(refresh_button)
+
+        reset_button = QPushButton("Сбросить")
+        reset_button.setObjectName("danger")
+        reset_button.clicked.connect(self.reset_stats)
+        top_panel.addWidget(reset_button)
+
+        dump_button = QPushButton("Сохранить в JSON")
+        dump_button.setObjectName("info")
+        dump_button.clicked.connect(self.dump_stats)
+        top_panel.addWidget(dump_button)
+
+        layout.addLayout(top_panel)
+
+        splitter = QSplitter(Qt.Vertical)
+
+        self.stats_table = QTableWidget()
+        self.stats_table.setColumnCount(len(self.COLUMNS))
+        self.stats_table.setHorizontalHeaderLabels([title for _, title in self.COLUMNS])
+        self.stats_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.stats_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.stats_table.setSortingEnabled(True)
+        self.stats_table.itemSelectionChanged.connect(self.show_plan)
+        splitter.addWidget(self.stats_table)
+
+        # План выполнения (сохраняется для медленных запросов)
+        self.plan_view = QTextEdit()
+        self.plan_view.setReadOnly(True)
+        splitter.addWidget(self.plan_view)
+        splitter.setSizes([400, 150])
+
+        layout.addWidget(splitter)
+
+        self.load_stats()
+
+    def load_stats(self):
+        """Загрузка статистики выполнения запросов"""
+        stats = db.stats()
+        self.statements = stats['statements']
+
+        self.summary_label.setText(
+            f"С {stats['since'] or '-'}; операторов: {len(self.statements)}; "
+            f"порог медленного запроса: {stats['slow_query_threshold_ms']:g} мс; "
+            f"профиль: {stats['connection'].get('profile', '-')}; "
+            f"кэш запросов: {stats['query_cache']['hits']} попаданий, "
+            f"{stats['query_cache']['misses']} промахов, {stats['query_cache']['bytes'] // 1024} КБ"
+        )
+
+        self.stats_table.setSortingEnabled(False)
+        self.stats_table.setRowCount(len(self.statements))
+        for row, statement in enumerate(self.statements):
+            for column, (key, _) in enumerate(self.COLUMNS):
+                item = QTableWidgetItem()
+                if key == 'sql':
+                    item.setText(statement[key])
+                    item.setToolTip(statement[key])
+                    # Индекс оператора для показа плана после сортировки таблицы
+                    item.setData(Qt.UserRole, row)
+                    if statement['plan']:
+                        item.setForeground(QColor("#c0392b"))
+                else:
+                    item.setData(Qt.DisplayRole, statement[key])
+                self.stats_table.setItem(row, column, item)
+        self.stats_table.setSortingEnabled(True)
+        self.plan_view.clear()
+
+    def show_plan(self):
+        """Показ плана выполнения выбранного оператора"""
+        selected = self.stats_table.selectedItems()
+        if not selected:
+            self.plan_view.clear()
+            return
+        sql_item = self.stats_table.item(selected[0].row(), 0)
+        statement = self.statements[sql_item.data(Qt.UserRole)]
+        if statement['plan']:
+            plan = "\n".join(statement['plan'])
+            self.plan_view.setPlainText(f"{statement['sql']}\n\nПлан ({statement['plan_captured_at']}):\n{plan}")
+        else:
+            self.plan_view.setPlainText(f"{statement['sql']}\n\nПлан сохраняется только для медленных запросов")
+
+    def reset_stats(self):
+        """Сброс накопленной статистики"""
+        db.reset_stats()
+        self.load_stats()
+
+    def dump_stats(self):
+        """Сохранение статистики в JSON-файл"""
+        file_name, _ = QFileDialog.getSaveFileName(
+            self, "Сохранить статистику запросов",
+            f"query_stats_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+            "JSON (*.json)"
+        )
+        if not file_name:
+            return
+        try:
+            db.dump_stats(file_name)
+            QMessageBox.information(self, "Готово", f"Статистика запросов сохранена: {file_name}")
+        except OSError as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить статистику: {str(e)}")
+
+
 class PatientListWidget(QWidget):
     """Виджет для отображения списка пациентов"""
+
+    # Пауза в наборе строки поиска (мс), после которой выполняется поиск
+    SEARCH_DELAY_MS = 250
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -1313,6 +1468,12 @@ class PatientListWidget(QWidget):
         self.search_input.textChanged.connect(self.filter_patients)
         top_panel.addWidget(self.search_input)
 
+        # Поиск запускается после паузы в наборе, а не на каждое нажатие клавиши
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.load_patients)
+
         # Кнопка обновления списка
         refresh_button = QPushButton("Обновить")
         refresh_button.setObjectName("primary")
@@ -1323,12 +1484,33 @@ class PatientListWidget(QWidget):
 
         layout.addLayout(top_panel)
 
-        # Таблица пациентов
-        self.patients_table = QTableWidget()
-        self.patients_table.setColumnCount(7)
-        self.patients_table.setHorizontalHeaderLabels([
-            "ID", "ФИО", "Дата рождения", "Пол", "Телефон", "Email", "Действия"
-        ])
+        # Таблица пациентов: модель хранит только загруженные страницы,
+        # кнопки действий рисует делегат, высота строк одинаковая
+        self.patients_model = PagedTableModel([
+            ("ID", 'id'),
+            ("ФИО", 'full_name'),
+            ("Дата рождения", 'birth_date'),
+            ("Пол", lambda patient: patient.get('gender') or 'Не указан'),
+            ("Телефон", 'phone'),
+            ("Email", 'email'),
+            ("Действия", None),
+        ], parent=self)
+        self.patients_table = QTableView()
+        self.patients_model.attach_view(self.patients_table)
+        # Изменения пациентов на других рабочих местах применяются к загруженным строкам
+        self.patients_model.watch_changes({'patients': 'id'})
+        self.patients_table.setSelectionBehavior(QTableView.SelectRows)
+        self.patients_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.patients_table.verticalHeader().setDefaultSectionSize(44)
+
+        self.actions_delegate = ActionButtonsDelegate([
+            ('edit', "Редактировать", 'primary'),
+            ('appointment', "Запись", 'success'),
+            ('delete', "Удалить", 'danger'),
+        ], self.patients_table)
+        self.actions_delegate.clicked.connect(self.on_patient_action)
+        self.patients_table.setItemDelegateForColumn(6, self.actions_delegate)
+
         # Устанавливаем фиксированную ширину для столбца ID
         self.patients_table.setColumnWidth(0, 50)
         # Устанавливаем ширину столбца «Действия»
@@ -1340,7 +1522,6 @@ class PatientListWidget(QWidget):
                 header.setSectionResizeMode(col, QHeaderView.Stretch)
             else:
                 header.setSectionResizeMode(col, QHeaderView.Fixed)  # Фиксируем ширину «Действия»
-        self.patients_table.setSortingEnabled(True)
 
         layout.addWidget(self.patients_table)
 
@@ -1348,90 +1529,42 @@ class PatientListWidget(QWidget):
         self.load_patients()
     
     def load_patients(self):
-        """Загрузка списка пациентов"""
-        patients = db.get_all_patients()
-        self.all_patients = patients  # Сохраняем для фильтрации
-        
-        self.update_table(patients)
-
-    def update_table(self, patients):
-        """Обновление таблицы пациентов"""
-        self.patients_table.setRowCount(len(patients))
-
-        for row, patient in enumerate(patients):
-            # ID
-            self.patients_table.setItem(row, 0, QTableWidgetItem(str(patient.get('id', ''))))
-
-            # ФИО
-            self.patients_table.setItem(row, 1, QTableWidgetItem(patient.get('full_name', '')))
-
-            # Дата рождения
-            self.patients_table.setItem(row, 2, QTableWidgetItem(patient.get('birth_date', '')))
-
-            # Пол (может отсутствовать в базе)
-            gender = patient.get('gender', 'Не указан')
-            self.patients_table.setItem(row, 3, QTableWidgetItem(gender))
-
-            # Телефон
-            self.patients_table.setItem(row, 4, QTableWidgetItem(patient.get('phone', '')))
-
-            # Email
-            self.patients_table.setItem(row, 5, QTableWidgetItem(patient.get('email', '')))
-
-            # Кнопки действий
-            actions_widget = QWidget()
-            actions_layout = QHBoxLayout(actions_widget)
-            actions_layout.setContentsMargins(0, 0, 0, 0)
-            actions_layout.setSpacing(5)
-
-            # Кнопки действий
-            edit_button = QPushButton("Редактировать")
-            edit_button.setObjectName("primary")
-            edit_button.setStyleSheet("min-width: 60px;")
-            edit_button.clicked.connect(lambda checked, p=patient: self.edit_patient(p))
-            actions_layout.addWidget(edit_button)
-
-            add_appointment_button = QPushButton("Запись")
-            add_appointment_button.setObjectName("success")
-            add_appointment_button.setStyleSheet("min-width: 60px;")
-            add_appointment_button.clicked.connect(lambda checked, p=patient: self.add_appointment(p))
-            actions_layout.addWidget(add_appointment_button)
-
-            delete_button = QPushButton("Удалить")
-            delete_button.setObjectName("danger")
-            delete_button.setStyleSheet("min-width: 60px;")
-            delete_button.clicked.connect(lambda checked, p=patient: self.delete_patient(p))
-            actions_layout.addWidget(delete_button)
-
-            self.patients_table.setCellWidget(row, 6, actions_widget)
+        """
+        Загрузка списка пациентов (первая страница с учетом строки поиска)
 
-            # Установка высоты строк
-            for row in range(self.patients_table.rowCount()):
-                self.patients_table.setRowHeight(row, 60)  # Устанавливаем высоту 60 пикселей
+        Без поиска список упорядочен по ФИО. Поиск идет по полнотекстовому индексу
+        patients_search (начала слов ФИО и email, цифры телефона, ключи нечеткого
+        поиска ФИО - см. patient_search_match), найденные
+        пациенты упорядочены по id - в порядке индекса, поэтому страница
+        не требует сортировки всех совпадений.
+        """
+        self.search_timer.stop()
+        match = patient_search_match(self.search_input.text().strip())
+        if match is None:
+            self.patients_model.load("SELECT * FROM patients", ('full_name', 'id'))
+            return
 
+        self.patients_model.load("""
+            SELECT s.rowid AS id, p.full_name, p.birth_date, p.gender, p.phone, p.email,
+                   p.address, p.created_at, p.updated_at
+            FROM patients_search s
+            CROSS JOIN patients p ON p.id = s.rowid
+            WHERE patients_search MATCH ?
+        """, 'id', (match,))
+
+    def on_patient_action(self, row, action):
+        """Нажатие кнопки действия в строке таблицы пациентов"""
+        patient = self.patients_model.row(row)
+        if action == 'edit':
+            self.edit_patient(patient)
+        elif action == 'appointment':
+            self.add_appointment(patient)
+        elif action == 'delete':
+            self.delete_patient(patient)
     
     def filter_patients(self):
-        """Фильтрация пациентов по поисковому запросу"""
-        search_text = self.search_input.text().lower()
-        
-        if not search_text:
-            # Если строка поиска пуста, показываем всех пациентов
-            self.update_table(self.all_patients)
-            return
-        
-        # Фильтрация пациентов
-        filtered_patients = []
-        for patient in self.all_patients:
-            full_name = patient.get('full_name', '').lower()
-            phone = patient.get('phone', '').lower()
-            email = patient.get('email', '').lower()
-            
-            if (search_text in full_name or 
-                search_text in phone or 
-                search_text in email):
-                filtered_patients.append(patient)
-        
-        self.update_table(filtered_patients)
+        """Фильтрация пациентов по поисковому запросу: поиск в базе после паузы в наборе"""
+        self.search_timer.start()
     
     def add_patient(self):
         """Добавление нового пациента"""
@@ -1457,7 +1590,7 @@ class PatientListWidget(QWidget):
         
         if reply == QMessageBox.Yes:
             try:
-                result = db.execute_query("DELETE FROM patients WHERE id = ?", (patient.get('id'),))
+                result = db.delete_patient(patient.get('id'))
                 
                 if result:
                     QMessageBox.information(self, "Успех", "Пациент успешно удален")
@@ -1492,11 +1625,11 @@ class PatientListWidget(QWidget):
             
             # Если нашли главное окно и у него есть нужный метод
             if main_window and hasattr(main_window, 'add_appointment_dialog'):
-                print(f"Вызываем метод add_appointment_dialog для пациента: {patient.get('full_name')}")
+                logger.debug("Вызываем метод add_appointment_dialog для пациента: %s", patient.get('full_name'))
                 main_window.add_appointment_dialog(patient)
             else:
                 # Если не нашли, выводим сообщение об ошибке
-                print("Не удалось найти метод add_appointment_dialog в родительском окне")
+                logger.warning("Не удалось найти метод add_appointment_dialog в родительском окне")
                 QMessageBox.warning(
                     self, 
                     "Ошибка", 
@@ -1504,7 +1637,7 @@ class PatientListWidget(QWidget):
                 )
         
         except Exception as e:
-            print(f"Ошибка при создании записи на прием: {str(e)}")
+            logger.error("Ошибка при создании записи на прием: %s", e)
             QMessageBox.warning(
                 self, 
                 "Ошибка", 
@@ -1655,12 +1788,12 @@ class AddPatientDialog(QDialog):
                         QMessageBox.information(self, "Успех", "Пациент успешно обновлен")
                         self.accept()
                     else:
-                        print("Не удалось обновить данные пациента, но ошибка не возникла")
+                        logger.warning("Не удалось обновить данные пациента, но ошибка не возникла")
                         QMessageBox.warning(self, "Примечание", "Возникла проблема при обновлении данных, но пациент мог быть обновлен")
                         self.accept()  # Все равно закрываем диалог
                 
                 except Exception as db_error:
-                    print(f"Ошибка при работе с базой данных: {str(db_error)}")
+                    logger.error("Ошибка при работе с базой данных: %s", db_error)
                     
                     # Пробуем упрощенный запрос без gender
                     try:
@@ -1678,7 +1811,7 @@ class AddPatientDialog(QDialog):
                             QMessageBox.warning(self, "Ошибка", "Не удалось обновить данные пациента")
                     
                     except Exception as e:
-                        print(f"Ошибка при упрощенном обновлении: {str(e)}")
+                        logger.error("Ошибка при упрощенном обновлении: %s", e)
                         QMessageBox.critical(self, "Ошибка", f"Не удалось обновить данные: {str(e)}")
             
             else:  # Добавление
@@ -1707,12 +1840,12 @@ class AddPatientDialog(QDialog):
                         QMessageBox.information(self, "Успех", "Пациент успешно добавлен")
                         self.accept()
                     else:
-                        print("Не удалось добавить пациента, но ошибка не возникла")
+                        logger.warning("Не удалось добавить пациента, но ошибка не возникла")
                         QMessageBox.warning(self, "Примечание", "Возникла проблема при добавлении, но пациент мог быть добавлен")
                         self.accept()  # Все равно закрываем диалог
                 
                 except Exception as db_error:
-                    print(f"Ошибка при работе с базой данных: {str(db_error)}")
+                    logger.error("Ошибка при работе с базой данных: %s", db_error)
                     
                     # Пробуем упрощенный запрос без gender
                     try:
@@ -1729,11 +1862,11 @@ class AddPatientDialog(QDialog):
                             QMessageBox.warning(self, "Ошибка", "Не удалось добавить пациента")
                     
                     except Exception as e:
-                        print(f"Ошибка при упрощенном добавлении: {str(e)}")
+                        logger.error("Ошибка при упрощенном добавлении: %s", e)
                         QMessageBox.critical(self, "Ошибка", f"Не удалось добавить пациента: {str(e)}")
         
         except Exception as e:
-            print(f"Общая ошибка при сохранении пациента: {str(e)}")
+            logger.error("Общая ошибка при сохранении пациента: %s", e)
             QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
 
 
@@ -1756,16 +1889,8 @@ class AnalysisResultsWidget(QWidget):
         
         # Выбор пациента
         patient_label = QLabel("Пациент:")
-        self.patient_combo = QComboBox()
-        self.patient_combo.setMinimumWidth(200)
-        
-        # Добавляем опцию "Все пациенты"
-        self.patient_combo.addItem("Все пациенты", None)
-        
-        # Загружаем список пациентов
-        patients = db.get_all_patients()
-        for patient in patients:
-            self.patient_combo.addItem(patient.get('full_name', ''), patient.get('id'))
+        self.patient_picker = PatientPicker("Все пациенты")
+        self.patient_picker.setMinimumWidth(200)
         
         # Выбор типа анализа
         analysis_type_label = QLabel("Тип анализа:")
@@ -1776,7 +1901,7 @@ class AnalysisResultsWidget(QWidget):
         self.analysis_type_combo.addItem("Все типы", None)
         
         # Загружаем типы анализов
-        analysis_types = db.fetch_all("SELECT * FROM analysis_types")
+        analysis_types = db.get_all_analysis_types()
         for analysis_type in analysis_types:
             self.analysis_type_combo.addItem(analysis_type.get('name', ''), analysis_type.get('id'))
         
@@ -1802,7 +1927,7 @@ class AnalysisResultsWidget(QWidget):
         
         # Размещение элементов фильтра
         filters_layout.addWidget(patient_label)
-        filters_layout.addWidget(self.patient_combo)
+        filters_layout.addWidget(self.patient_picker)
         filters_layout.addWidget(analysis_type_label)
         filters_layout.addWidget(self.analysis_type_combo)
         filters_layout.addWidget(date_from_label)
@@ -1815,19 +1940,45 @@ class AnalysisResultsWidget(QWidget):
         filters_group.setLayout(filters_layout)
         layout.addWidget(filters_group)
         
-        # Таблица результатов анализов
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(6)
-        self.results_table.setHorizontalHeaderLabels([
-            "Дата", "Пациент", "Тип анализа", "Статус", "Лаборант", "Документы"
-        ])
+        # Таблица результатов анализов: строки загружаются страницами по мере прокрутки,
+        # сортировка по щелчку на заголовке выполняется в базе (по умолчанию новые сверху).
+        # При переключении фильтров туда и обратно страницы берутся из кэша запросов
+        self.results_model = PagedTableModel([
+            ("Дата", 'result_date', ('result_date', 'id')),
+            ("Пациент", lambda result: f"{result['patient_name']} ({result['birth_date']})",
+             ('patient_name', 'patient_id', 'result_date', 'id')),
+            ("Тип анализа", 'analysis_type', ('analysis_type', 'analysis_type_id', 'result_date', 'id')),
+            ("Статус", lambda result: self.translate_status(result['status']), ('status', 'result_date', 'id')),
+            ("Лаборант", 'lab_technician', ('lab_technician', 'lab_user_id', 'result_date', 'id')),
+            ("Документы", None),
+        ], parent=self, cache_pages=True)
+        self.results_model.set_sort(0, Qt.DescendingOrder)
+        self.results_model.sort_changed.connect(self.refresh_analysis_results)
+        self.results_model.watch_changes({
+            'analysis_results': 'id',
+            'patients': 'patient_id',
+            'analysis_types': 'analysis_type_id',
+            'users': 'lab_user_id',
+        })
+
+        self.results_table = QTableView()
+        self.results_table.setSelectionBehavior(QTableView.SelectRows)
+        self.results_model.attach_view(self.results_table)
         header = self.results_table.horizontalHeader()
         for col in range(5):  # Столбцы с данными растягиваются
             header.setSectionResizeMode(col, QHeaderView.Stretch)
         header.setSectionResizeMode(5, QHeaderView.Fixed)  # Столбец действий фиксирован
         self.results_table.setColumnWidth(5, 150)  # Уменьшена ширина для одной кнопки
-        self.results_table.setSortingEnabled(True)
-        
+        vertical_header = self.results_table.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.Fixed)
+        vertical_header.setDefaultSectionSize(44)
+
+        # Кнопка просмотра рисуется делегатом, без виджета на каждую строку
+        self.documents_delegate = ActionButtonsDelegate([('view', "Просмотр", 'primary')], self.results_table)
+        self.documents_delegate.clicked.connect(
+            lambda row, action: self.view_analysis_result(self.results_model.row(row)['id']))
+        self.results_table.setItemDelegateForColumn(5, self.documents_delegate)
+
         layout.addWidget(self.results_table)
         
         # Кнопки действий
@@ -1854,10 +2005,56 @@ class AnalysisResultsWidget(QWidget):
         # Загрузка результатов анализов
         self.refresh_analysis_results()
     
-    def refresh_analysis_results(self):
-        """Обновление списка результатов анализов с учетом фильтров"""
+    # Порядок соединения для сортировки по столбцу (первый столбец ключа сортировки):
+    # ведущая таблица и индекс analysis_results, строки которого идут в порядке ключа.
+    # CROSS JOIN в SQLite не переставляется планировщиком, поэтому ORDER BY выполняется
+    # по индексам; иначе для первой страницы планировщик может выбрать сортировку всей
+    # выборки за период во временном B-дереве
+    SORT_JOINS = {
+        'patient_name': ('p', 'idx_analysis_results_patient_date'),
+        'analysis_type': ('at', 'idx_analysis_results_type_date'),
+        'status': ('ar', 'idx_analysis_results_status_date'),
+        'lab_technician': ('u', 'idx_analysis_results_lab_user_date'),
+    }
+
+    # Таблицы, соединяемые с analysis_results
+    JOINED_TABLES = {
+        'p': ("patients p", "ar.patient_id = p.id"),
+        'at': ("analysis_types at", "ar.analysis_type_id = at.id"),
+        'u': ("users u", "ar.lab_user_id = u.id"),
+    }
+
+    def _analysis_results_from(self, order_key, patient_id):
+        """FROM запроса результатов анализов для ключа сортировки order_key"""
+        if patient_id:
+            # Результаты одного пациента: строк немного, их порядок выбирает планировщик.
+            # Индекс пациента задан явно - без статистики планировщик может выбрать
+            # индекс типа анализа и просмотреть его за весь период
+            leading, index = 'ar', 'idx_analysis_results_patient_date'
+        else:
+            leading, index = self.SORT_JOINS.get(order_key[0] if order_key else None, ('ar', None))
+        if index is None:
+            return "analysis_results ar " + " ".join(
+                f"JOIN {table} ON {condition}" for table, condition in self.JOINED_TABLES.values())
+
+        results = "analysis_results ar INDEXED BY " + index
+        if leading == 'ar':
+            first, joins = results, list(self.JOINED_TABLES.values())
+        else:
+            first, condition = self.JOINED_TABLES[leading]
+            joins = [(results, condition)] + [
+                table for alias, table in self.JOINED_TABLES.items() if alias != leading]
+        return first + " " + " ".join(f"CROSS JOIN {table} ON {condition}" for table, condition in joins)
+
+    def _analysis_results_query(self, order_key=None):
+        """
+        Запрос результатов анализов с учетом фильтров (без ORDER BY) и его параметры
+
+        order_key - ключ постраничной выборки, задает порядок соединения таблиц
+        (см. SORT_JOINS); без ключа - для выборки по дате.
+        """
         # Получение параметров фильтрации
-        patient_id = self.patient_combo.currentData()
+        patient_id = self.patient_picker.patient_id()
         analysis_type_id = self.analysis_type_combo.currentData()
         from_date = self.date_from.date().toString("yyyy-MM-dd")
         to_date = self.date_to.date().toString("yyyy-MM-dd")
@@ -1875,85 +2072,30 @@ class AnalysisResultsWidget(QWidget):
             conditions.append("ar.analysis_type_id = ?")
             params.append(analysis_type_id)
         
-        conditions.append("date(ar.result_date) BETWEEN ? AND ?")
-        params.extend([from_date, to_date])
+        # Полуинтервал по дате, чтобы фильтр использовал индекс по result_date
+        conditions.append("ar.result_date >= ? AND ar.result_date < ?")
+        params.extend(date_range_bounds(from_date, to_date))
         
-        # Формирование и выполнение запроса
+        # Формирование запроса. id соединяемых таблиц входят в ключи сортировки
+        # по имени: ключ должен совпадать с порядком индекса
         query = f"""
             SELECT ar.id as id, p.full_name as patient_name, p.birth_date, at.name as analysis_type, 
-                   ar.result_date, u.full_name as lab_technician, ar.status
-            FROM analysis_results ar
-            JOIN patients p ON ar.patient_id = p.id
-            JOIN analysis_types at ON ar.analysis_type_id = at.id
-            JOIN users u ON ar.lab_user_id = u.id
+                   ar.result_date, u.full_name as lab_technician, ar.status,
+                   p.id as patient_id, at.id as analysis_type_id, u.id as lab_user_id
+            FROM {self._analysis_results_from(order_key, patient_id)}
             WHERE {' AND '.join(conditions)}
-            ORDER BY ar.result_date DESC
         """
-        results = db.fetch_all(query, params)
-        
-        # Отладочный вывод результатов запроса
-        print(f"Получено {len(results)} результатов анализов")
-        
-        # Обновление таблицы
-        self.results_table.setRowCount(len(results))
-        
-        for row, result in enumerate(results):
-            # Проверяем, содержит ли результат ID
-            if 'id' not in result:
-                print(f"ОШИБКА: Запись не содержит ID для строки {row}")
-                continue
-            
-            # Распаковка данных
-            result_id = result.get('id')
-            
-            # Проверка, что ID существует и является числом
-            if result_id is None:
-                print(f"ID результата отсутствует в данных")
-                continue
-            
-            # Гарантируем, что ID - целое число
-            try:
-                result_id = int(result_id)
-            except (ValueError, TypeError):
-                print(f"Ошибка преобразования ID {result_id} в число")
-                continue
-            
-            patient_name = result.get('patient_name', '')
-            birth_date = result.get('birth_date', '')
-            analysis_type = result.get('analysis_type', '')
-            result_date = result.get('result_date', '')
-            lab_technician = result.get('lab_technician', '')
-            status = result.get('status', '')
-            
-            # Установка данных в ячейки таблицы
-            self.results_table.setItem(row, 0, QTableWidgetItem(result_date))
-            self.results_table.setItem(row, 1, QTableWidgetItem(f"{patient_name} ({birth_date})"))
-            self.results_table.setItem(row, 2, QTableWidgetItem(analysis_type))
-            self.results_table.setItem(row, 3, QTableWidgetItem(self.translate_status(status)))
-            self.results_table.setItem(row, 4, QTableWidgetItem(lab_technician))
-            
-            # Кнопки для работы с документами
-            doc_widget = QWidget()
-            doc_layout = QHBoxLayout(doc_widget)
-            doc_layout.setContentsMargins(0, 0, 0, 0)
-
-            # Кнопки для работы с документами
-            view_button = QPushButton("Просмотр")
-            view_button.setObjectName("primary")
-            view_button.setProperty("result_id", result_id)
-            view_button.clicked.connect(self.view_analysis_result)
-            
-            doc_layout.addWidget(view_button)
-            
-            self.results_table.setCellWidget(row, 5, doc_widget)
+        return query, params
+
+    def refresh_analysis_results(self):
+        """Обновление списка результатов анализов с учетом фильтров и сортировки (первая страница)"""
+        order_key, descending = self.results_model.sort_key()
+        query, params = self._analysis_results_query(order_key)
+        self.results_model.load(query, order_key, params, descending)
 
-            # Установка высоты строк
-            for row in range(self.results_table.rowCount()):
-                self.results_table.setRowHeight(row, 60)  # Устанавливаем высоту 60 пикселей
-    
     def clear_filters(self):
         """Сброс фильтров"""
-        self.patient_combo.setCurrentIndex(0)  # "Все пациенты"
+        self.patient_picker.set_patient(None)  # "Все пациенты"
         self.analysis_type_combo.setCurrentIndex(0)  # "Все типы"
         self.date_from.setDate(QDate.currentDate().addDays(-30))
         self.date_to.setDate(QDate.currentDate())
@@ -1971,12 +2113,8 @@ class AnalysisResultsWidget(QWidget):
         }
         return status_map.get(status, status)
     
-    def view_analysis_result(self):
+    def view_analysis_result(self, result_id):
         """Просмотр результата анализа"""
-        # Получение ID результата
-        sender = self.sender()
-        result_id = sender.property("result_id")
-        
         # Проверяем, что ID является корректным
         try:
             result_id = int(result_id) if result_id is not None else 0
@@ -2103,14 +2241,14 @@ class AnalysisResultsWidget(QWidget):
         if result_id is None:
             sender = self.sender()
             result_id = sender.property("result_id")
-            print(f"Получен ID из кнопки: {result_id}, тип: {type(result_id)}")
+            logger.debug("Получен ID из кнопки: %s, тип: %s", result_id, type(result_id))
         
         # Проверка, что ID является числом и больше 0
         try:
             result_id = int(result_id) if result_id is not None else 0
-            print(f"Преобразован ID в число: {result_id}")
+            logger.debug("Преобразован ID в число: %s", result_id)
             if result_id <= 0:
-                print(f"Некорректный ID: {result_id} (должен быть > 0)")
+                logger.warning("Некорректный ID: %s (должен быть > 0)", result_id)
                 # Используем новый класс диалога вместо QMessageBox
                 error_dialog = ErrorDialog(
                     dialog or self,
@@ -2122,11 +2260,11 @@ class AnalysisResultsWidget(QWidget):
                 
             # Дополнительная проверка существования записи
             check_query = "SELECT id FROM analysis_results WHERE id = ?"
-            print(f"Проверка существования записи: {check_query} с ID={result_id}")
+            logger.debug("Проверка существования записи: %s с ID=%s", check_query, result_id)
             result_exists = db.fetch_one(check_query, (result_id,))
             
             if not result_exists:
-                print(f"Результат с ID {result_id} не найден в БД")
+                logger.warning("Результат с ID %s не найден в БД", result_id)
                 error_dialog = ErrorDialog(
                     dialog or self,
                     f"Результат анализа не найден в базе данных",
@@ -2135,10 +2273,10 @@ class AnalysisResultsWidget(QWidget):
                 error_dialog.exec()
                 return
                 
-            print(f"Результат существует: {result_exists}")
+            logger.debug("Результат существует: %s", result_exists)
             
         except (ValueError, TypeError) as e:
-            print(f"Ошибка при преобразовании ID: {e}")
+            logger.error("Ошибка при преобразовании ID: %s", e)
             error_dialog = ErrorDialog(
                 dialog or self,
                 "Ошибка при обработке данных анализа",
@@ -2156,8 +2294,8 @@ class AnalysisResultsWidget(QWidget):
         filters = {}
         
         # Получаем ID пациента, если выбран
-        if self.patient_combo.currentData():
-            filters['patient_id'] = self.patient_combo.currentData()
+        if self.patient_picker.patient_id():
+            filters['patient_id'] = self.patient_picker.patient_id()
         
         # Получаем ID типа анализа, если выбран
         if self.analysis_type_combo.currentData():
@@ -2358,8 +2496,8 @@ class AnalysisResultsWidget(QWidget):
         
         # Тип отчета
         report_type = "Список результатов анализов"
-        if self.patient_combo.currentData():
-            report_type += f" пациента {self.patient_combo.currentText()}"
+        if self.patient_picker.patient_id():
+            report_type += f" пациента {self.patient_picker.patient_name()}"
         if self.analysis_type_combo.currentData():
             report_type += f" (тип: {self.analysis_type_combo.currentText()})"
         
@@ -2445,8 +2583,8 @@ class AnalysisResultsWidget(QWidget):
         try:
             # Получение параметров для имени файла
             patient_name = "Общий_список_пациентов"
-            if self.patient_combo.currentData():
-                patient_name = self.patient_combo.currentText().replace(" ", "_")
+            if self.patient_picker.patient_id():
+                patient_name = self.patient_picker.patient_name().replace(" ", "_")
             
             analysis_type = ""
             if self.analysis_type_combo.currentData():
@@ -2460,49 +2598,25 @@ class AnalysisResultsWidget(QWidget):
             
             # Создание Excel файла
             workbook = xlwt.Workbook()
-            sheet = workbook.add_sheet("Результаты анализов")
             
             # Стили
             header_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center')
             normal_style = xlwt.easyxf('align: wrap on, vert centre, horiz left')
             date_style = xlwt.easyxf('align: wrap on, vert centre, horiz left', num_format_str='DD.MM.YYYY')
             
-            # Заголовки
-            headers = ["ID", "Дата", "Пациент", "Дата рождения", "Тип анализа", "Статус", "Лаборант"]
-            for col, header in enumerate(headers):
-                sheet.write(0, col, header, header_style)
-                sheet.col(col).width = 256 * 20  # Ширина столбца
-            
-            # Данные
-            for row in range(self.results_table.rowCount()):
-                # ID берем из скрытого свойства кнопки просмотра
-                doc_widget = self.results_table.cellWidget(row, 5)
-                view_button = doc_widget.layout().itemAt(0).widget()
-                result_id = view_button.property("result_id")
-                
-                sheet.write(row + 1, 0, result_id, normal_style)
-                
-                # Дата
-                date_text = self.results_table.item(row, 0).text()
-                sheet.write(row + 1, 1, date_text, normal_style)
-                
-                # Пациент с датой рождения
-                patient_text = self.results_table.item(row, 1).text()
-                patient_parts = patient_text.split(" (")
-                patient_name = patient_parts[0]
-                birth_date = patient_parts[1].rstrip(")") if len(patient_parts) > 1 else ""
-                
-                sheet.write(row + 1, 2, patient_name, normal_style)
-                sheet.write(row + 1, 3, birth_date, normal_style)
-                
-                # Тип анализа
-                sheet.write(row + 1, 4, self.results_table.item(row, 2).text(), normal_style)
-                
-                # Статус
-                sheet.write(row + 1, 5, self.results_table.item(row, 3).text(), normal_style)
-                
-                # Лаборант
-                sheet.write(row + 1, 6, self.results_table.item(row, 4).text(), normal_style)
+            # Данные: все строки по текущим фильтрам (таблица содержит только загруженные страницы),
+            # читаются из базы потоком
+            query, params = self._analysis_results_query()
+            results = db.iter_rows(query + " ORDER BY ar.result_date DESC, ar.id DESC", params)
+            write_xls_rows(
+                workbook, "Результаты анализов",
+                ["ID", "Дата", "Пациент", "Дата рождения", "Тип анализа", "Статус", "Лаборант"],
+                ((result['id'], result['result_date'] or '', result['patient_name'] or '',
+                  result['birth_date'] or '', result['analysis_type'] or '',
+                  self.translate_status(result['status']), result['lab_technician'] or '')
+                 for result in results),
+                header_style=header_style, cell_style=normal_style, column_width=256 * 20
+            )
             
             # Сохранение файла
             workbook.save(filepath)
@@ -2523,10 +2637,28 @@ class AnalysisResultsWidget(QWidget):
             return None
 
 
+class AppointmentsTableModel(PagedTableModel):
+    """Модель таблицы записей на прием: статус выделяется цветом"""
+
+    STATUS_COLUMN = 3
+    STATUS_COLORS = {
+        'completed': QColor(0, 128, 0),  # Зеленый для завершенных
+        'cancelled': QColor(255, 0, 0),  # Красный для отмененных
+    }
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.ForegroundRole and index.column() == self.STATUS_COLUMN:
+            return self.STATUS_COLORS.get(self.row(index.row())['status'])
+        return super().data(index, role)
+
+
 class AdminWindow(QMainWindow):
     """Главное окно интерфейса администратора"""
     logout_signal = Signal()
 
+    # Действия смены статуса записи на прием и устанавливаемый статус
+    STATUS_ACTIONS = {'complete': 'completed', 'cancel': 'cancelled'}
+
     def __init__(self, user_data):
         super().__init__()
         self.user_data = user_data
@@ -2563,6 +2695,11 @@ class AdminWindow(QMainWindow):
 
         top_panel.addStretch()
 
+        # Глобальный поиск по пациентам, записям на прием и результатам анализов
+        self.global_search = GlobalSearchBox(parent=self)
+        self.global_search.result_activated.connect(self.open_search_result)
+        top_panel.addWidget(self.global_search)
+
         logout_button = QPushButton("Выйти")
         logout_button.setObjectName("danger")
         logout_button.clicked.connect(self.logout)
@@ -2599,7 +2736,41 @@ class AdminWindow(QMainWindow):
         self.statistics_tab = SystemStatisticsWidget()
         self.tab_widget.addTab(self.statistics_tab, "Статистика")
 
+        # Скрытая вкладка диагностики запросов: Ctrl+Shift+D или MED_CENTER_DIAGNOSTICS=1
+        self.diagnostics_tab = None
+        diagnostics_shortcut = QShortcut(QKeySequence("Ctrl+Shift+D"), self)
+        diagnostics_shortcut.activated.connect(self.toggle_diagnostics_tab)
+        if os.environ.get('MED_CENTER_DIAGNOSTICS') == '1':
+            self.toggle_diagnostics_tab()
+
         main_layout.addWidget(self.tab_widget)
+
+    def open_search_result(self, result):
+        """Открытие записи, найденной глобальным поиском"""
+        if result['scope'] == 'patients':
+            self.tab_widget.setCurrentWidget(self.patients_tab)
+            patient = db.get_patient(result['id'])
+            if not patient:
+                QMessageBox.warning(self, "Ошибка", "Пациент не найден")
+                return
+            self.patients_tab.edit_patient(patient)
+        elif result['scope'] == 'appointments':
+            self.tab_widget.setCurrentWidget(self.appointments_tab)
+            self.edit_appointment(result['id'])
+        elif result['scope'] == 'analysis_results':
+            self.tab_widget.setCurrentWidget(self.analysis_tab)
+            self.analysis_tab.view_analysis_result(result['id'])
+
+    def toggle_diagnostics_tab(self):
+        """Показ или скрытие вкладки диагностики запросов"""
+        if self.diagnostics_tab is None:
+            self.diagnostics_tab = QueryDiagnosticsWidget()
+            index = self.tab_widget.addTab(self.diagnostics_tab, "Диагностика")
+            self.tab_widget.setCurrentIndex(index)
+        else:
+            self.tab_widget.removeTab(self.tab_widget.indexOf(self.diagnostics_tab))
+            self.diagnostics_tab.deleteLater()
+            self.diagnostics_tab = None
         
     def create_appointments_tab(self):
         """Создание вкладки для работы с записями на прием"""
@@ -2619,12 +2790,7 @@ class AdminWindow(QMainWindow):
         self.doctor_combo.addItem("Все врачи", None)
         
         # Загружаем список врачей
-        doctors = db.fetch_all("""
-            SELECT d.id, d.user_id, u.full_name, d.specialization
-            FROM doctors d
-            JOIN users u ON d.user_id = u.id
-            ORDER BY u.full_name
-        """)
+        doctors = db.get_doctors()
         
         for doctor in doctors:
             self.doctor_combo.addItem(
@@ -2634,19 +2800,8 @@ class AdminWindow(QMainWindow):
         
         # Выбор пациента
         patient_label = QLabel("Пациент:")
-        self.appointment_patient_combo = QComboBox()
-        self.appointment_patient_combo.setMinimumWidth(200)
-        
-        # Добавляем опцию "Все пациенты"
-        self.appointment_patient_combo.addItem("Все пациенты", None)
-        
-        # Загружаем список пациентов
-        patients = db.get_all_patients()
-        for patient in patients:
-            self.appointment_patient_combo.addItem(
-                f"{patient.get('full_name', '')}",
-                patient.get('id')
-            )
+        self.appointment_patient_picker = PatientPicker("Все пациенты")
+        self.appointment_patient_picker.setMinimumWidth(200)
         
         # Выбор периода дат
         date_from_label = QLabel("С:")
@@ -2686,7 +2841,7 @@ class AdminWindow(QMainWindow):
         filters_layout.addWidget(doctor_label)
         filters_layout.addWidget(self.doctor_combo)
         filters_layout.addWidget(patient_label)
-        filters_layout.addWidget(self.appointment_patient_combo)
+        filters_layout.addWidget(self.appointment_patient_picker)
         filters_layout.addWidget(date_from_label)
         filters_layout.addWidget(self.appointment_date_from)
         filters_layout.addWidget(date_to_label)
@@ -2700,20 +2855,49 @@ class AdminWindow(QMainWindow):
         filters_group.setLayout(filters_layout)
         layout.addWidget(filters_group)
         
-        # Таблица записей на прием
-        self.appointments_table = QTableWidget()
-        self.appointments_table.setColumnCount(7)
-        self.appointments_table.setHorizontalHeaderLabels([
-            "Дата и время", "Пациент", "Врач", "Статус", "Примечания", "Действия", ""
-        ])
-        self.appointments_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.appointments_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        # Устанавливаем фиксированную ширину для столбца "Действия"
-        self.appointments_table.setColumnWidth(5, 200)  # 200 пикселей для кнопок "Завершить" и "Отменить"
-        # Устанавливаем ширину для столбца с кнопками "Изменить" и "Удалить"
-        self.appointments_table.setColumnWidth(6, 200)  # 200 пикселей для кнопок редактирования
-        self.appointments_table.setSortingEnabled(True)
-        
+        # Таблица записей на прием: строки загружаются страницами по мере прокрутки
+        # (порядок - по дате приема), кнопки действий рисуются делегатами
+        self.appointments_model = AppointmentsTableModel([
+            ("Дата и время", 'appointment_date'),
+            ("Пациент", 'patient_name'),
+            ("Врач", lambda appointment: (f"{appointment['doctor_name']} ({appointment['specialization']})"
+                                          if appointment['specialization'] else appointment['doctor_name'])),
+            ("Статус", lambda appointment: self.translate_appointment_status(appointment['status'])),
+            ("Примечания", 'notes'),
+            ("Действия", None),
+            ("", None),
+        ], parent=self)
+
+        self.appointments_table = QTableView()
+        self.appointments_table.setSelectionBehavior(QTableView.SelectRows)
+        self.appointments_model.attach_view(self.appointments_table)
+        self.appointments_model.watch_changes({
+            'appointments': 'id',
+            'patients': 'patient_id',
+            'doctors': 'doctor_id',
+        })
+        header = self.appointments_table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Stretch)
+        # Фиксированная ширина столбцов с кнопками "Завершить"/"Отменить" и "Изменить"
+        for col in (5, 6):
+            header.setSectionResizeMode(col, QHeaderView.Fixed)
+            self.appointments_table.setColumnWidth(col, 200)
+        vertical_header = self.appointments_table.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.Fixed)
+        vertical_header.setDefaultSectionSize(44)
+
+        # Завершенную запись нельзя завершить, отмененную - отменить
+        self.status_actions_delegate = ActionButtonsDelegate(
+            [('complete', "Завершить", 'successS'), ('cancel', "Отменить", 'dangerS')],
+            self.appointments_table,
+            available=lambda appointment: [action for action, status in self.STATUS_ACTIONS.items()
+                                           if appointment['status'] != status]
+        )
+        self.edit_action_delegate = ActionButtonsDelegate([('edit', "Изменить", 'primary')], self.appointments_table)
+        for col, delegate in ((5, self.status_actions_delegate), (6, self.edit_action_delegate)):
+            delegate.clicked.connect(self.on_appointment_action)
+            self.appointments_table.setItemDelegateForColumn(col, delegate)
+
         layout.addWidget(self.appointments_table)
         
         # Загрузка записей на прием
@@ -2725,9 +2909,10 @@ class AdminWindow(QMainWindow):
                            status, notes):
         """Обновление данных записи на прием"""
         # Отладочный вывод
-        print(f"update_appointment: appointment_id={appointment_id}, patient_id={patient_id}, doctor_id={doctor_id}")
-        print(
-            f"appointment_date={appointment_date}, appointment_time={appointment_time}, status={status}, notes={notes}")
+        logger.debug("update_appointment: appointment_id=%s, patient_id=%s, doctor_id=%s",
+                     appointment_id, patient_id, doctor_id)
+        logger.debug("appointment_date=%s, appointment_time=%s, status=%s, notes=%s",
+                     appointment_date, appointment_time, status, notes)
 
         # Валидация
         if not patient_id:
@@ -2740,7 +2925,7 @@ class AdminWindow(QMainWindow):
 
         # Формируем полную дату со временем
         datetime_str = f"{appointment_date} {appointment_time}"
-        print(f"Сформированная дата и время: {datetime_str}")
+        logger.debug("Сформированная дата и время: %s", datetime_str)
 
         try:
             # Обновляем запись в базе данных
@@ -2748,11 +2933,8 @@ class AdminWindow(QMainWindow):
                        SET doctor_id = ?, patient_id = ?, appointment_date = ?, status = ?, notes = ? 
                        WHERE id = ?"""
             params = (doctor_id, patient_id, datetime_str, status, notes, appointment_id)
-            print(f"SQL запрос: {query}")
-            print(f"Параметры: {params}")
-
             success = db.execute_query(query, params)
-            print(f"Результат выполнения запроса: success={success}")
+            logger.debug("Результат выполнения запроса: success=%s", success)
 
             # Обновляем таблицу
             self.refresh_appointments()
@@ -2764,7 +2946,7 @@ class AdminWindow(QMainWindow):
                 QMessageBox.warning(self, "Ошибка", "Не удалось обновить запись на прием")
 
         except Exception as e:
-            print(f"Ошибка при обновлении записи: {str(e)}")
+            logger.error("Ошибка при обновлении записи: %s", e)
             QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при обновлении записи: {str(e)}")
             # Обновляем таблицу на случай, если изменения все же произошли
             self.refresh_appointments()
@@ -2773,7 +2955,7 @@ class AdminWindow(QMainWindow):
         """Обновление списка записей на прием с учетом фильтров"""
         # Получение параметров фильтрации
         doctor_id = self.doctor_combo.currentData()
-        patient_id = self.appointment_patient_combo.currentData()
+        patient_id = self.appointment_patient_picker.patient_id()
         from_date = self.appointment_date_from.date().toString("yyyy-MM-dd")
         to_date = self.appointment_date_to.date().toString("yyyy-MM-dd")
         status = self.status_combo.currentData()
@@ -2794,8 +2976,9 @@ class AdminWindow(QMainWindow):
             conditions.append("a.status = ?")
             params.append(status)
         
-        conditions.append("date(a.appointment_date) BETWEEN ? AND ?")
-        params.extend([from_date, to_date])
+        # Полуинтервал по дате, чтобы фильтр использовал индекс по appointment_date
+        conditions.append("a.appointment_date >= ? AND a.appointment_date < ?")
+        params.extend(date_range_bounds(from_date, to_date))
         
         # Формирование и выполнение запроса
         query = f"""
@@ -2807,92 +2990,20 @@ class AdminWindow(QMainWindow):
             JOIN doctors d ON a.doctor_id = d.id
             JOIN users u ON d.user_id = u.id
             WHERE {' AND '.join(conditions)}
-            ORDER BY a.appointment_date
         """
-        appointments = db.fetch_all(query, params)
-        
-        # Обновление таблицы
-        self.appointments_table.setRowCount(len(appointments))
-        
-        for row, appointment in enumerate(appointments):
-            # Дата и время
-            appointment_datetime = appointment.get('appointment_date', '')
-            self.appointments_table.setItem(row, 0, QTableWidgetItem(appointment_datetime))
-            
-            # Пациент
-            patient_name = appointment.get('patient_name', '')
-            self.appointments_table.setItem(row, 1, QTableWidgetItem(patient_name))
-            
-            # Врач с специализацией
-            doctor_name = appointment.get('doctor_name', '')
-            specialization = appointment.get('specialization', '')
-            doctor_text = f"{doctor_name} ({specialization})" if specialization else doctor_name
-            self.appointments_table.setItem(row, 2, QTableWidgetItem(doctor_text))
-            
-            # Статус
-            status = appointment.get('status', '')
-            status_text = self.translate_appointment_status(status)
-            status_item = QTableWidgetItem(status_text)
-            
-            # Цвет для статуса
-            if status == 'completed':
-                status_item.setForeground(QColor(0, 128, 0))  # Зеленый для завершенных
-            elif status == 'cancelled':
-                status_item.setForeground(QColor(255, 0, 0))  # Красный для отмененных
-            
-            self.appointments_table.setItem(row, 3, status_item)
-            
-            # Примечания
-            notes = appointment.get('notes', '')
-            self.appointments_table.setItem(row, 4, QTableWidgetItem(notes))
-            
-            # Кнопки действий
-            actions_widget = QWidget()
-            actions_layout = QHBoxLayout(actions_widget)
-            actions_layout.setContentsMargins(0, 0, 0, 0)
-            
-            # Кнопка изменения статуса
-            if status != 'completed':
-                complete_button = QPushButton("Завершить")
-                complete_button.setObjectName("successS")
-                complete_button.setProperty("appointment_id", appointment.get('id'))
-                complete_button.clicked.connect(self.complete_appointment)
-                complete_button.setMinimumWidth(90)  # Минимальная ширина кнопки
-                actions_layout.addWidget(complete_button)
-
-            if status != 'cancelled':
-                cancel_button = QPushButton("Отменить")
-                cancel_button.setObjectName("dangerS")
-                cancel_button.setProperty("appointment_id", appointment.get('id'))
-                cancel_button.clicked.connect(self.cancel_appointment)
-                cancel_button.setMinimumWidth(90)  # Минимальная ширина кнопки
-                actions_layout.addWidget(cancel_button)
-            
-            self.appointments_table.setCellWidget(row, 5, actions_widget)
-            
-            # Дополнительные действия
-            edit_delete_widget = QWidget()
-            edit_delete_layout = QHBoxLayout(edit_delete_widget)
-            edit_delete_layout.setContentsMargins(0, 0, 0, 0)
-
-            edit_button = QPushButton("Изменить")
-            edit_button.setObjectName("primary")
-            edit_button.setProperty("appointment_id", appointment.get('id'))
-            edit_button.clicked.connect(self.edit_appointment)
-            edit_button.setMinimumWidth(90)  # Минимальная ширина кнопки
-            edit_delete_layout.addWidget(edit_button)
+        self.appointments_model.load(query, ('appointment_date', 'id'), params)
 
-            
-            self.appointments_table.setCellWidget(row, 6, edit_delete_widget)
+    def on_appointment_action(self, row, action):
+        """Обработка кнопки действия в строке таблицы записей на прием"""
+        if action == 'edit':
+            self.edit_appointment(self.appointments_model.row(row)['id'])
+        else:
+            self.set_appointment_status(row, self.STATUS_ACTIONS[action])
 
-            # Установка высоты строк
-            for row in range(self.appointments_table.rowCount()):
-                self.appointments_table.setRowHeight(row, 60)  # Устанавливаем высоту 60 пикселей
-    
     def clear_appointment_filters(self):
         """Сброс фильтров записей на прием"""
         self.doctor_combo.setCurrentIndex(0)  # Все врачи
-        self.appointment_patient_combo.setCurrentIndex(0)  # Все пациенты
+        self.appointment_patient_picker.set_patient(None)  # Все пациенты
         self.appointment_date_from.setDate(QDate.currentDate().addDays(-30))
         self.appointment_date_to.setDate(QDate.currentDate().addDays(30))
         self.status_combo.setCurrentIndex(0)  # Все статусы
@@ -2911,7 +3022,7 @@ class AdminWindow(QMainWindow):
     
     def add_appointment_dialog(self, patient=None):
         """Диалог добавления новой записи на прием"""
-        print(f"Метод add_appointment_dialog вызван с пациентом: {patient}")
+        logger.debug("Метод add_appointment_dialog вызван с пациентом: %s", patient)
         
         dialog = QDialog(self)
         dialog.setWindowTitle("Запись на прием")
@@ -2924,38 +3035,12 @@ class AdminWindow(QMainWindow):
         form_layout = QFormLayout()
         
         # Выбор пациента
-        patient_combo = QComboBox()
-        patient_combo.setMinimumWidth(250)
+        patient_picker = PatientPicker()
         
-        try:
-            # Загружаем список пациентов
-            patients = db.get_all_patients()
-            
-            # Добавляем пациентов в комбобокс
-            for p in patients:
-                patient_id = p.get('id')
-                full_name = p.get('full_name', '')
-                patient_combo.addItem(f"{full_name}", patient_id)
-            
-            # Если передан конкретный пациент, выбираем его
-            selected_index = 0
-            if patient:
-                if isinstance(patient, dict) and 'id' in patient:
-                    patient_id = patient.get('id')
-                    print(f"Ищем пациента с ID: {patient_id}")
-                    for i in range(patient_combo.count()):
-                        if patient_combo.itemData(i) == patient_id:
-                            selected_index = i
-                            print(f"Найден пациент на позиции {i}")
-                            break
-            
-            # Устанавливаем выбранного пациента
-            if selected_index >= 0 and selected_index < patient_combo.count():
-                patient_combo.setCurrentIndex(selected_index)
-                print(f"Установлен пациент на позицию {selected_index}")
-        
-        except Exception as e:
-            print(f"Ошибка при загрузке списка пациентов: {str(e)}")
+        # Если передан конкретный пациент, выбираем его
+        if isinstance(patient, dict) and 'id' in patient:
+            patient_picker.set_patient(patient)
+            logger.debug("Установлен пациент с ID: %s", patient.get('id'))
         
         # Выбор врача
         doctor_combo = QComboBox()
@@ -2963,12 +3048,7 @@ class AdminWindow(QMainWindow):
         
         try:
             # Загружаем список врачей
-            doctors = db.fetch_all("""
-                SELECT d.id, d.user_id, u.full_name, d.specialization
-                FROM doctors d
-                JOIN users u ON d.user_id = u.id
-                ORDER BY u.full_name
-            """)
+            doctors = db.get_doctors()
             
             for doctor in doctors:
                 doctor_id = doctor.get('id')
@@ -2983,7 +3063,7 @@ class AdminWindow(QMainWindow):
                 return
             
         except Exception as e:
-            print(f"Ошибка при загрузке списка врачей: {str(e)}")
+            logger.error("Ошибка при загрузке списка врачей: %s", e)
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить список врачей: {str(e)}")
             return
         
@@ -3006,7 +3086,7 @@ class AdminWindow(QMainWindow):
         notes_edit = QLineEdit()
         
         # Добавление полей в форму
-        form_layout.addRow("Пациент:", patient_combo)
+        form_layout.addRow("Пациент:", patient_picker)
         form_layout.addRow("Врач:", doctor_combo)
         form_layout.addRow("Дата:", date_edit)
         form_layout.addRow("Время:", time_edit)
@@ -3032,10 +3112,10 @@ class AdminWindow(QMainWindow):
         # Обработчики событий
         save_button.clicked.connect(lambda: self.save_appointment(
             dialog,
-            patient_combo.currentData(),
+            patient_picker.patient_id(),
             doctor_combo.currentData(),
             date_edit.date().toString("yyyy-MM-dd"),
-            time_edit.time().toString("HH:mm"),
+            time_edit.time().toString("HH:mm:ss"),
             status_combo.currentData(),
             notes_edit.text()
         ))
@@ -3076,12 +3156,8 @@ class AdminWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
     
-    def edit_appointment(self):
+    def edit_appointment(self, appointment_id):
         """Редактирование существующей записи на прием"""
-        # Получаем ID записи
-        sender = self.sender()
-        appointment_id = sender.property("appointment_id")
-        
         # Получаем данные о записи
         appointment = db.fetch_one(
             """SELECT a.*, p.full_name as patient_name, d.user_id, u.full_name as doctor_name 
@@ -3109,30 +3185,17 @@ class AdminWindow(QMainWindow):
         form_layout = QFormLayout()
         
         # Выбор пациента
-        patient_combo = QComboBox()
-        patient_combo.setMinimumWidth(250)
-        
-        # Загружаем список пациентов
-        patients = db.get_all_patients()
-        for p in patients:
-            patient_combo.addItem(f"{p.get('full_name', '')}", p.get('id'))
+        patient_picker = PatientPicker()
         
         # Выбираем текущего пациента
-        patient_index = patient_combo.findData(appointment.get('patient_id'))
-        if patient_index >= 0:
-            patient_combo.setCurrentIndex(patient_index)
+        patient_picker.set_patient_id(appointment.get('patient_id'))
         
         # Выбор врача
         doctor_combo = QComboBox()
         doctor_combo.setMinimumWidth(250)
         
         # Загружаем список врачей
-        doctors = db.fetch_all("""
-            SELECT d.id, d.user_id, u.full_name, d.specialization
-            FROM doctors d
-            JOIN users u ON d.user_id = u.id
-            ORDER BY u.full_name
-        """)
+        doctors = db.get_doctors()
         
         for doctor in doctors:
             doctor_combo.addItem(
@@ -3158,7 +3221,7 @@ class AdminWindow(QMainWindow):
                 time_part = date_time_parts[1]
                 
                 appointment_date = QDate.fromString(date_part, "yyyy-MM-dd")
-                appointment_time = QTime.fromString(time_part, "HH:mm")
+                appointment_time = QTime.fromString(time_part[:5], "HH:mm")
             else:
                 appointment_date = QDate.currentDate()
                 appointment_time = QTime(9, 0)
@@ -3190,7 +3253,7 @@ class AdminWindow(QMainWindow):
         notes_edit = QLineEdit(appointment.get('notes', ''))
         
         # Добавление полей в форму
-        form_layout.addRow("Пациент:", patient_combo)
+        form_layout.addRow("Пациент:", patient_picker)
         form_layout.addRow("Врач:", doctor_combo)
         form_layout.addRow("Дата:", date_edit)
         form_layout.addRow("Время:", time_edit)
@@ -3217,74 +3280,47 @@ class AdminWindow(QMainWindow):
         save_button.clicked.connect(lambda: self.update_appointment(
             dialog,
             appointment_id,
-            patient_combo.currentData(),
+            patient_picker.patient_id(),
             doctor_combo.currentData(),
             date_edit.date().toString("yyyy-MM-dd"),
-            time_edit.time().toString("HH:mm"),
+            time_edit.time().toString("HH:mm:ss"),
             status_combo.currentData(),
             notes_edit.text()
         ))
         cancel_button.clicked.connect(dialog.reject)
 
         # Добавляем отладочный вывод для проверки значений
-        print(f"edit_appointment: appointment_id={appointment_id}")
-        print(f"patient_combo.currentData()={patient_combo.currentData()}")
-        print(f"doctor_combo.currentData()={doctor_combo.currentData()}")
-        print(f"date_edit.date()={date_edit.date().toString('yyyy-MM-dd')}")
-        print(f"time_edit.time()={time_edit.time().toString('HH:mm')}")
-        print(f"status_combo.currentData()={status_combo.currentData()}")
-        print(f"notes_edit.text()={notes_edit.text()}")
+        logger.debug("edit_appointment: appointment_id=%s", appointment_id)
+        logger.debug("patient_picker.patient_id()=%s", patient_picker.patient_id())
+        logger.debug("doctor_combo.currentData()=%s", doctor_combo.currentData())
+        logger.debug("date_edit.date()=%s", date_edit.date().toString('yyyy-MM-dd'))
+        logger.debug("time_edit.time()=%s", time_edit.time().toString('HH:mm'))
+        logger.debug("status_combo.currentData()=%s", status_combo.currentData())
+        logger.debug("notes_edit.text()=%s", notes_edit.text())
 
         # Показываем диалог
         dialog.exec()
         
-    def complete_appointment(self):
-        """Отметить запись на прием как завершенную"""
-        # Получаем ID записи
-        sender = self.sender()
-        appointment_id = sender.property("appointment_id")
-        
-        try:
-            # Обновляем статус записи
-            success = db.execute_query(
-                "UPDATE appointments SET status = ? WHERE id = ?",
-                ("completed", appointment_id)
-            )
-            
-            # Обновляем таблицу независимо от результата
-            self.refresh_appointments()
-            
-            if not success:
-                print("Предупреждение: Не удалось обновить статус записи, но операция могла быть выполнена")
-        
-        except Exception as e:
-            print(f"Ошибка при изменении статуса записи: {str(e)}")
-            # Обновляем таблицу в любом случае
-            self.refresh_appointments()
-    
-    def cancel_appointment(self):
-        """Отметить запись на прием как отмененную"""
-        # Получаем ID записи
-        sender = self.sender()
-        appointment_id = sender.property("appointment_id")
-        
-        try:
-            # Обновляем статус записи
-            success = db.execute_query(
-                "UPDATE appointments SET status = ? WHERE id = ?",
-                ("cancelled", appointment_id)
-            )
-            
-            # Обновляем таблицу независимо от результата
-            self.refresh_appointments()
-            
-            if not success:
-                print("Предупреждение: Не удалось обновить статус записи, но операция могла быть выполнена")
-        
-        except Exception as e:
-            print(f"Ошибка при изменении статуса записи: {str(e)}")
-            # Обновляем таблицу в любом случае
+    def set_appointment_status(self, row, status):
+        """
+        Изменение статуса записи на прием в строке row таблицы
+
+        Строка обновляется значениями из RETURNING, список заново не выбирается.
+        """
+        appointment_id = self.appointments_model.row(row)['id']
+        changed = db.update_appointment_status(appointment_id, status)
+        if changed is None:
+            # Запись могла быть удалена в другом окне - список перечитывается
+            logger.warning("Не удалось обновить статус записи %s", appointment_id)
             self.refresh_appointments()
+            return
+
+        status_filter = self.status_combo.currentData()
+        if status_filter and changed['status'] != status_filter:
+            # Запись больше не соответствует фильтру по статусу
+            self.appointments_model.remove_row(row)
+        else:
+            self.appointments_model.update_row(row, changed)
     
     def delete_appointment(self):
         """Удаление записи на прием"""
@@ -3320,7 +3356,7 @@ class AdminWindow(QMainWindow):
                 QMessageBox.warning(self, "Примечание", "Возникла ошибка при удалении записи, но операция могла быть выполнена")
         
         except Exception as e:
-            print(f"Ошибка при удалении записи: {str(e)}")
+            logger.error("Ошибка при удалении записи: %s", e)
             # Обновляем таблицу в любом случае
             self.refresh_appointments()
             QMessageBox.warning(self, "Примечание", f"Произошла ошибка при удалении, но операция могла быть выполнена: {str(e)}")
@@ -0,0 +1,151 @@
+import itertools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QCoreApplication, QObject, Signal
+
+from database_connection import db, ReadConnection
+
+
+logger = logging.getLogger('med_center.async_query')
+
+# Запросы списков выполняются в фоновом потоке базы данных;
+# MED_CENTER_ASYNC_QUERIES=0 - в потоке интерфейса (для отладки)
+ASYNC_QUERIES_ENABLED = os.environ.get('MED_CENTER_ASYNC_QUERIES', '1') != '0'
+
+
+class AsyncQueryExecutor(QObject):
+    """
+    Выполнение запросов на чтение в фоновом потоке базы данных
+
+    Поток один и владеет собственным соединением (ReadConnection), поэтому
+    задания выполняются по очереди и не используют соединение db потока интерфейса.
+    Задание - функция job(connection) с методами чтения db (fetch_all, fetch_page...);
+    ее результат передается в on_result уже в потоке интерфейса.
+
+    Каждый запрос относится к каналу (обычно таблице или вкладке): новый запрос
+    канала делает предыдущие устаревшими - их результат отбрасывается, а еще
+    не начатые задания не выполняются. Поэтому при быстрой смене фильтров
+    в таблицу попадает только результат последнего запроса.
+    """
+
+    # Результаты передаются в поток интерфейса через очередь событий Qt
+    _finished = Signal(int, object)
+    _failed = Signal(int, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._request_ids = itertools.count(1)
+        # Канал -> id последнего запроса
+        self._latest = {}
+        # id запроса -> (канал, on_result, on_error); устаревшие запросы удаляются
+        self._pending = {}
+        self._pool = None
+        # Соединение потока базы данных; используется только в этом потоке
+        self._reader = None
+
+        self._finished.connect(self._on_finished)
+        self._failed.connect(self._on_failed)
+
+    def submit(self, channel, job, on_result, on_error=None):
+        """
+        Постановка задания в очередь; возвращает id запроса
+
+        on_result(result) и on_error(message) вызываются в потоке интерфейса,
+        только если запрос к этому времени остался последним в канале.
+        """
+        request_id = next(self._request_ids)
+        self.cancel(channel)
+
+        if not ASYNC_QUERIES_ENABLED:
+            self._run_in_gui_thread(job, on_result, on_error)
+            return request_id
+
+        self._latest[channel] = request_id
+        self._pending[request_id] = (channel, on_result, on_error)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='med_center-db')
+        self._pool.submit(self._run, request_id, job)
+        return request_id
+
+    def cancel(self, channel):
+        """Отмена ожидаемого результата канала"""
+        request_id = self._latest.pop(channel, None)
+        if request_id is not None:
+            self._pending.pop(request_id, None)
+
+    def is_busy(self, channel):
+        """Ожидается ли результат запроса канала"""
+        return channel in self._latest
+
+    def shutdown(self):
+        """Остановка потока базы данных и закрытие его соединения"""
+        self._latest.clear()
+        self._pending.clear()
+        if self._pool is not None:
+            self._pool.submit(self._close_reader)
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _run(self, request_id, job):
+        # Выполняется в потоке базы данных. Задание, устаревшее за время
+        # ожидания в очереди, не выполняется
+        if request_id not in self._pending:
+            return
+        try:
+            if self._reader is None:
+                self._reader = ReadConnection(db)
+            result = job(self._reader)
+        except Exception as e:
+            logger.exception("Ошибка фонового запроса")
+            self._failed.emit(request_id, str(e))
+        else:
+            self._finished.emit(request_id, result)
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.disconnect()
+            self._reader = None
+
+    def _take(self, request_id):
+        """Обработчики запроса, если он остался последним в канале"""
+        entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return None
+        del self._latest[entry[0]]
+        return entry
+
+    def _on_finished(self, request_id, result):
+        entry = self._take(request_id)
+        if entry is not None:
+            entry[1](result)
+
+    def _on_failed(self, request_id, message):
+        entry = self._take(request_id)
+        if entry is not None and entry[2] is not None:
+            entry[2](message)
+
+    def _run_in_gui_thread(self, job, on_result, on_error):
+        try:
+            result = job(db)
+        except Exception as e:
+            logger.exception("Ошибка запроса")
+            if on_error is not None:
+                on_error(str(e))
+        else:
+            on_result(result)
+
+
+_executor = None
+
+
+def query_executor():
+    """Общий исполнитель фоновых запросов приложения (создается при первом обращении)"""
+    global _executor
+    if _executor is None:
+        _executor = AsyncQueryExecutor()
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(_executor.shutdown)
+    return _executor
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк одновременной работы: N процессов-читателей и один процесс-писатель
+выполняют запросы приложения к одной базе для каждого профиля подключения.
+
+Читатели выполняют запросы списков и статистики (как окна врача, лаборанта и
+администратора), писатель - запись на прием, результат анализа и смену статуса
+одной транзакцией. База - копия med_center.db, дополненная тестовыми данными.
+
+Запуск: python benchmarks/bench_concurrency.py [--readers 4] [--seconds 5] [--profiles shared wal]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_connection import db, CONNECTION_PROFILES  # noqa: E402
+
+# Объем дополнительных тестовых данных
+SEED_PATIENTS = 2000
+SEED_ANALYSES = 20000
+SEED_APPOINTMENTS = 5000
+
+
+class ErrorCounter(logging.Handler):
+    """Обработчик журнала, подсчитывающий ошибки запросов"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.error_count = 0
+        logging.getLogger('med_center.db').addHandler(self)
+
+    def emit(self, record):
+        self.error_count += 1
+
+
+def seed_database(path):
+    """Дополнение копии базы тестовыми пациентами, анализами и записями"""
+    db.db_path = path
+    db.connect(profile='bulk')
+    doctor_ids = [row['id'] for row in db.fetch_all("SELECT id FROM doctors")]
+    lab_ids = [row['id'] for row in db.fetch_all("SELECT id FROM users WHERE role = 'lab'")]
+    type_ids = [row['id'] for row in db.fetch_all("SELECT id FROM analysis_types")]
+    rnd = random.Random(1)
+
+    with db.transaction():
+        db.execute_many(
+            "INSERT INTO patients (full_name, birth_date, phone, created_at) VALUES (?, ?, ?, ?)",
+            [(f"Пациент {i}", f"19{rnd.randint(40, 99)}-01-01", f"+7 (900) {i:07d}",
+              f"20{rnd.randint(20, 25)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 10:00:00")
+             for i in range(SEED_PATIENTS)]
+        )
+        patient_ids = [row['id'] for row in db.fetch_all("SELECT id FROM patients")]
+        db.execute_many(
+            "INSERT INTO analysis_results (patient_id, analysis_type_id, lab_user_id, result_date, result_data, status) "
+            "VALUES (?, ?, ?, ?, '{}', 'completed')",
+            [(rnd.choice(patient_ids), rnd.choice(type_ids), rnd.choice(lab_ids),
+              f"20{rnd.randint(20, 25)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 09:00:00")
+             for _ in range(SEED_ANALYSES)]
+        )
+        db.execute_many(
+            "INSERT INTO appointments (doctor_id, patient_id, appointment_date, status) VALUES (?, ?, ?, 'completed')",
+            [(rnd.choice(doctor_ids), rnd.choice(patient_ids),
+              f"20{rnd.randint(20, 25)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 11:00:00")
+             for _ in range(SEED_APPOINTMENTS)]
+        )
+    # Копии для профилей начинают работу с базой в режиме журнала отката
+    db.checkpoint('TRUNCATE')
+    db._connection.execute("PRAGMA journal_mode = DELETE")
+    db.disconnect()
+    db.db_path = 'med_center.db'
+
+
+def reader(path, profile, seconds, start_event, results):
+    """Процесс-читатель: запросы окон врача, лаборанта и администратора"""
+    error_counter = ErrorCounter()
+    latencies = []
+    db.db_path = path
+    db.connect(profile=profile)
+    patient_ids = [row['id'] for row in db.fetch_all("SELECT id FROM patients")]
+    doctor_id = db.fetch_one("SELECT id FROM doctors")['id']
+    lab_user_id = db.fetch_one("SELECT id FROM users WHERE role = 'lab'")['id']
+    rnd = random.Random(os.getpid())
+    operations = [
+        lambda: db.get_patient_analysis_results(rnd.choice(patient_ids)),
+        lambda: db.get_doctor_schedule(doctor_id),
+        lambda: db.fetch_all(
+            "SELECT * FROM analysis_results WHERE lab_user_id = ? ORDER BY result_date DESC LIMIT 50",
+            (lab_user_id,)),
+        lambda: db.fetch_one(
+            "SELECT COUNT(*) as count FROM analysis_results WHERE result_date >= ? AND result_date < ?",
+            ('2024-01-01', '2024-02-01')),
+        lambda: db.fetch_all("""
+            SELECT status, COUNT(*) as count
+            FROM appointments
+            WHERE appointment_date >= ? AND appointment_date < ?
+            GROUP BY status
+        """, ('2024-01-01', '2024-07-01')),
+        lambda: db.get_patient(rnd.choice(patient_ids)),
+    ]
+    error_counter.error_count = 0
+
+    start_event.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        rnd.choice(operations)()
+        latencies.append(time.perf_counter() - started)
+    db.disconnect()
+    results.put(('reader', latencies, error_counter.error_count))
+
+
+def writer(path, profile, seconds, start_event, results):
+    """Процесс-писатель: запись на прием, результат анализа и смена статуса одной транзакцией"""
+    latencies = []
+    errors = 0
+    db.db_path = path
+    db.connect(profile=profile)
+    patient_ids = [row['id'] for row in db.fetch_all("SELECT id FROM patients")]
+    doctor_id = db.fetch_one("SELECT id FROM doctors")['id']
+    lab_user_id = db.fetch_one("SELECT id FROM users WHERE role = 'lab'")['id']
+    type_id = db.fetch_one("SELECT id FROM analysis_types")['id']
+    rnd = random.Random(0)
+
+    start_event.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        patient_id = rnd.choice(patient_ids)
+        try:
+            with db.transaction():
+                appointment_id = db.add_appointment(doctor_id, patient_id, '2024-03-01 10:00:00')
+                db.add_analysis_result(patient_id, type_id, lab_user_id, '{"Глюкоза": "5.1"}')
+                db.update_appointment_status(appointment_id, 'completed')
+        except sqlite3.Error:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+    db.disconnect()
+    results.put(('writer', latencies, errors))
+
+
+def percentile(values, fraction):
+    """Перцентиль выборки (значения в секундах, результат в мс)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+
+def run_profile(seed_path, profile, readers, seconds):
+    """Запуск читателей и писателя на отдельной копии базы для профиля"""
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'med_center.db')
+        shutil.copy(seed_path, path)
+
+        start_event = context.Event()
+        results = context.Queue()
+        processes = [context.Process(target=reader, args=(path, profile, seconds, start_event, results))
+                     for _ in range(readers)]
+        processes.append(context.Process(target=writer, args=(path, profile, seconds, start_event, results)))
+        for process in processes:
+            process.start()
+        # Даем процессам подключиться, затем стартуем одновременно
+        time.sleep(1.0)
+        start_event.set()
+
+        # Ожидание с запасом: упавший процесс не должен блокировать бенчмарк
+        collected = [results.get(timeout=seconds + 60) for _ in processes]
+        for process in processes:
+            process.join()
+
+    read_latencies = [value for kind, values, _ in collected if kind == 'reader' for value in values]
+    write_latencies = [value for kind, values, _ in collected if kind == 'writer' for value in values]
+    read_errors = sum(errors for kind, _, errors in collected if kind == 'reader')
+    write_errors = sum(errors for kind, _, errors in collected if kind == 'writer')
+
+    print(f"{profile:10} "
+          f"{len(read_latencies) / seconds:>10.0f} {percentile(read_latencies, 0.5):>8.2f} "
+          f"{percentile(read_latencies, 0.99):>8.2f} {max(read_latencies, default=0) * 1000:>9.1f} {read_errors:>6} | "
+          f"{len(write_latencies) / seconds:>8.1f} {statistics.median(write_latencies or [0]) * 1000:>8.2f} "
+          f"{max(write_latencies, default=0) * 1000:>9.1f} {write_errors:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк одновременного чтения и записи")
+    parser.add_argument('--readers', type=int, default=4, help="количество процессов-читателей")
+    parser.add_argument('--seconds', type=float, default=5.0, help="длительность прогона для профиля")
+    parser.add_argument('--profiles', nargs='+', default=['shared', 'wal', 'wal_full'],
+                        choices=sorted(CONNECTION_PROFILES), help="профили подключения")
+    args = parser.parse_args()
+
+    source_db = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'med_center.db')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        seed_path = os.path.join(temp_dir, 'seed.db')
+        shutil.copy(source_db, seed_path)
+        seed_database(seed_path)
+
+        print(f"Читателей: {args.readers}, писателей: 1, длительность: {args.seconds} с")
+        print()
+        print(f"{'Профиль':10} {'чтений/с':>10} {'p50, мс':>8} {'p99, мс':>8} {'max, мс':>9} {'ошибки':>6} | "
+              f"{'тр-ций/с':>8} {'p50, мс':>8} {'max, мс':>9} {'ошибки':>6}")
+        for profile in args.profiles:
+            run_profile(seed_path, profile, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: пиковая память и время экспорта списка пациентов в CSV
+при чтении всей выборки (fetch_all) и потоковом чтении (iter_rows).
+
+Каждый способ измеряется в отдельном процессе на копии med_center.db,
+дополненной тестовыми пациентами. Память - пик по tracemalloc.
+
+Запуск: python benchmarks/bench_export_memory.py [--rows 500000] [--batch-size 1000]
+"""
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_connection import db, DEFAULT_BATCH_SIZE  # noqa: E402
+
+QUERY = "SELECT id, full_name, birth_date, phone, email, address FROM patients"
+
+
+def seed_database(path, rows):
+    """Заполнение копии базы пациентами (всего rows строк)"""
+    db.db_path = path
+    db.connect(profile='bulk')
+    existing = db.fetch_one("SELECT COUNT(*) as count FROM patients")['count']
+    with db.transaction():
+        db.execute_many(
+            "INSERT INTO patients (full_name, birth_date, phone, email, address) VALUES (?, ?, ?, ?, ?)",
+            ((f"Пациент Тестовый {i}", f"19{40 + i % 60}-01-01", f"+7 (900) {i:07d}",
+              f"patient{i}@example.com", f"г. Москва, ул. Тестовая, {i % 300}-{i % 97}")
+             for i in range(max(rows - existing, 0)))
+        )
+    db.disconnect()
+
+
+def export(path, method, batch_size, output_path, results):
+    """Процесс экспорта одним способом: (время, пиковая память, строк)"""
+    logging.disable(logging.WARNING)
+    db.db_path = path
+    db.connect()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    if method == 'fetch_all':
+        rows = [(row['id'], row['full_name'], row['birth_date'], row['phone'], row['email'], row['address'])
+                for row in db.fetch_all(QUERY)]
+    else:
+        rows = db.iter_rows(QUERY, batch_size=batch_size, row_factory='tuple')
+    count = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    db.disconnect()
+    results.put((method, elapsed, peak, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк памяти при экспорте")
+    parser.add_argument('--rows', type=int, default=500000, help="количество пациентов")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="размер пачки iter_rows")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    source_db = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'med_center.db')
+    context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'med_center.db')
+        shutil.copy(source_db, path)
+        seed_database(path, args.rows)
+
+        print(f"Экспорт в CSV: {QUERY}")
+        print()
+        print(f"{'Способ':10} {'строк':>9} {'время, с':>9} {'пик памяти, МБ':>15}")
+        for method in ('fetch_all', 'iter_rows'):
+            results = context.Queue()
+            process = context.Process(target=export, args=(
+                path, method, args.batch_size, os.path.join(temp_dir, f'{method}.csv'), results))
+            process.start()
+            name, elapsed, peak, count = results.get()
+            process.join()
+            print(f"{name:10} {count:>9} {elapsed:>9.2f} {peak / 2 ** 20:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк: 100 000 вызовов db.fetch_one до и после удаления
+connect() и вывода в консоль из быстрого пути запроса.
+
+"До" - модуль database_connection.py из указанной ревизии git (по умолчанию
+первый коммит репозитория), "после" - текущий модуль. Вывод старой версии
+направляется в os.devnull, поэтому результат "до" - нижняя оценка: вывод
+в реальную консоль медленнее.
+
+Текущая версия измеряется в конфигурации по умолчанию, то есть вместе
+с постоянно включенным учетом статистики операторов (db.stats(),
+MED_CENTER_QUERY_STATS) и проверкой порога медленных запросов.
+
+Версии выполняются поочередно rounds раз на одной копии базы; для каждой
+берется лучший раунд, чтобы сгладить шум соседних процессов.
+
+Запуск: python benchmarks/bench_fetch_one.py [--calls 100000] [--rounds 5] [--rev <ревизия>]
+"""
+import argparse
+import contextlib
+import importlib.util
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from database_connection import db  # noqa: E402
+
+QUERY = "SELECT * FROM patients WHERE id = ?"
+
+
+def load_module_from_git(revision, temp_dir):
+    """Загрузка database_connection.py из ревизии git как отдельного модуля"""
+    source = subprocess.run(
+        ['git', 'show', f'{revision}:database_connection.py'],
+        cwd=ROOT_DIR, check=True, capture_output=True
+    ).stdout
+    path = os.path.join(temp_dir, 'database_connection_before.py')
+    with open(path, 'wb') as module_file:
+        module_file.write(source)
+
+    spec = importlib.util.spec_from_file_location('database_connection_before', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_calls(connection, calls):
+    """Выполнение calls вызовов fetch_one, возвращает время в секундах"""
+    started = time.perf_counter()
+    for index in range(calls):
+        connection.fetch_one(QUERY, (index % 5 + 1,))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк fetch_one")
+    parser.add_argument('--calls', type=int, default=100000, help="количество вызовов fetch_one")
+    parser.add_argument('--rounds', type=int, default=5, help="число поочередных раундов для каждой версии")
+    parser.add_argument('--rev', default=None, help="ревизия git с исходной версией модуля")
+    args = parser.parse_args()
+
+    revision = args.rev or subprocess.run(
+        ['git', 'rev-list', '--max-parents=0', 'HEAD'],
+        cwd=ROOT_DIR, check=True, capture_output=True, text=True
+    ).stdout.split()[0]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'med_center.db')
+        shutil.copy(os.path.join(ROOT_DIR, 'med_center.db'), db_path)
+
+        # Текущая версия: сначала открываем соединение (применяются миграции)
+        logging.disable(logging.INFO)
+        db.db_path = db_path
+        db.connect()
+
+        # Исходная версия на той же базе
+        before_module = load_module_from_git(revision, temp_dir)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            before_db = before_module.DatabaseConnection()
+            before_db.db_path = db_path
+            before_db.connect()
+
+            before = after = float('inf')
+            for _ in range(args.rounds):
+                before = min(before, run_calls(before_db, args.calls))
+                after = min(after, run_calls(db, args.calls))
+            before_db.disconnect()
+        db.disconnect()
+
+    print(f"Вызовов fetch_one: {args.calls}, лучший из {args.rounds} раундов")
+    print(f"До ({revision[:10]}):  {before:8.3f} с  {before / args.calls * 1e6:8.2f} мкс/вызов")
+    print(f"После:              {after:8.3f} с  {after / args.calls * 1e6:8.2f} мкс/вызов")
+    print(f"Ускорение: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк представлений строк результата: время fetch_all и память,
+занимаемая результатом, для выборки из 1 000 000 пациентов.
+
+Каждое представление измеряется в отдельном процессе, чтобы память
+предыдущего прогона не влияла на результат. Время - лучший из нескольких
+прогонов без трассировки памяти, память - прирост по tracemalloc после
+выборки (включая сами значения столбцов, одинаковые для всех представлений).
+
+Запуск: python benchmarks/bench_row_factories.py [--rows 1000000] [--repeat 3]
+"""
+import argparse
+import gc
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_connection import db  # noqa: E402
+from row_factories import ROW_FACTORY_NAMES  # noqa: E402
+
+QUERY = "SELECT * FROM patients"
+
+
+def seed_database(path, rows):
+    """Заполнение копии базы пациентами (всего rows строк)"""
+    db.db_path = path
+    db.connect(profile='bulk')
+    existing = db.fetch_one("SELECT COUNT(*) as count FROM patients")['count']
+    with db.transaction():
+        db.execute_many(
+            "INSERT INTO patients (full_name, birth_date, gender, phone, email, address) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((f"Пациент Тестовый {i}", f"19{40 + i % 60}-01-01", "М" if i % 2 else "Ж",
+              f"+7 (900) {i:07d}", f"patient{i}@example.com", f"г. Москва, ул. Тестовая, {i % 300}-{i % 97}")
+             for i in range(max(rows - existing, 0)))
+        )
+    db.disconnect()
+
+
+def measure(path, row_factory, repeat, results):
+    """Процесс измерения одного представления: (время, байт на результат, строк)"""
+    logging.disable(logging.WARNING)
+    db.db_path = path
+    db.connect(row_factory=row_factory)
+
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        rows = db.fetch_all(QUERY)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        count = len(rows)
+        del rows
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = db.fetch_all(QUERY)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    db.disconnect()
+    results.put((row_factory, best, memory, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк представлений строк результата")
+    parser.add_argument('--rows', type=int, default=1000000, help="количество строк в выборке")
+    parser.add_argument('--repeat', type=int, default=3, help="количество прогонов для измерения времени")
+    parser.add_argument('--factories', nargs='+', default=list(ROW_FACTORY_NAMES),
+                        choices=ROW_FACTORY_NAMES, help="представления строк")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    source_db = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'med_center.db')
+    context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'med_center.db')
+        shutil.copy(source_db, path)
+        seed_database(path, args.rows)
+
+        print(f"Запрос: {QUERY}")
+        print()
+        print(f"{'Представление':14} {'строк':>9} {'время, с':>9} {'мкс/строка':>11} {'память, МБ':>11} {'байт/строка':>12}")
+        baseline = None
+        for row_factory in args.factories:
+            results = context.Queue()
+            process = context.Process(target=measure, args=(path, row_factory, args.repeat, results))
+            process.start()
+            name, elapsed, memory, count = results.get()
+            process.join()
+
+            baseline = baseline or (elapsed, memory)
+            print(f"{name:14} {count:>9} {elapsed:>9.3f} {elapsed / count * 1e6:>11.2f} "
+                  f"{memory / 2 ** 20:>11.1f} {memory / count:>12.0f}"
+                  f"   ({elapsed / baseline[0]:.2f}x времени, {memory / baseline[1]:.2f}x памяти)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: количество фиксаций (COMMIT) и fsync на операцию
+до и после перехода на db.transaction() / db.execute_many().
+
+Операции выполняются на копии med_center.db во временном каталоге,
+рабочая база не изменяется.
+
+Запуск: python benchmarks/bench_transactions.py [количество_операций]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_connection import db  # noqa: E402
+
+# Лекарств в одном рецепте
+MEDICATIONS_PER_PRESCRIPTION = 5
+
+# Оценка числа fsync на одну фиксацию в режиме journal_mode=DELETE, synchronous=FULL:
+# журнал отката (содержимое и заголовок), файл базы и каталог при удалении журнала
+FSYNCS_PER_COMMIT = 4
+
+
+class CommitCounter:
+    """Подсчет фиксаций транзакций через trace callback соединения"""
+
+    def __init__(self, connection):
+        self.commits = 0
+        connection.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        if statement.strip().upper().startswith(("COMMIT", "END")):
+            self.commits += 1
+
+
+def prescription_before(doctor_id, patient_id, medications):
+    """Сохранение рецепта как раньше: отдельный COMMIT на каждый INSERT"""
+    prescription_id = db.add_prescription(doctor_id, patient_id, '2025-01-01')
+    for medication_id, dosage, instructions in medications:
+        db.add_prescription_medication(prescription_id, medication_id, dosage, instructions)
+
+
+def prescription_after(doctor_id, patient_id, medications):
+    """Сохранение рецепта одной транзакцией"""
+    db.add_prescription_with_medications(doctor_id, patient_id, '2025-01-01', medications)
+
+
+def user_before(index):
+    """Создание врача как раньше: пользователь и запись врача отдельными фиксациями"""
+    user_id = db.add_user(f"bench_before_{index}", "pwd", "Бенчмарк Врач", "doctor")
+    db.execute_query("INSERT INTO doctors (user_id, specialization) VALUES (?, ?)", (user_id, "Терапевт"))
+
+
+def user_after(index):
+    """Создание врача одной транзакцией"""
+    with db.transaction():
+        user_id = db.add_user(f"bench_after_{index}", "pwd", "Бенчмарк Врач", "doctor")
+        db.execute_query("INSERT INTO doctors (user_id, specialization) VALUES (?, ?)", (user_id, "Терапевт"))
+
+
+def measure(counter, operation, count):
+    """Выполнение операции count раз, возвращает (фиксаций на операцию, мс на операцию)"""
+    commits_before = counter.commits
+    started = time.perf_counter()
+    for index in range(count):
+        operation(index)
+    elapsed = time.perf_counter() - started
+    return (counter.commits - commits_before) / count, elapsed * 1000 / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    source_db = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'med_center.db')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'med_center.db')
+        shutil.copy(source_db, db.db_path)
+
+        db.connect()
+        doctor = db.fetch_one("SELECT id FROM doctors LIMIT 1")
+        patient = db.fetch_one("SELECT id FROM patients LIMIT 1")
+        medication_ids = [row['id'] for row in db.fetch_all("SELECT id FROM medications")]
+        counter = CommitCounter(db._connection)
+
+        medications = [
+            (medication_ids[i % len(medication_ids)], "1 таблетка", "после еды")
+            for i in range(MEDICATIONS_PER_PRESCRIPTION)
+        ]
+
+        scenarios = [
+            (f"Рецепт + {MEDICATIONS_PER_PRESCRIPTION} лекарств",
+             lambda i: prescription_before(doctor['id'], patient['id'], medications),
+             lambda i: prescription_after(doctor['id'], patient['id'], medications)),
+            ("Пользователь + запись врача", user_before, user_after),
+        ]
+
+        print(f"Операций в каждом сценарии: {count}")
+        print(f"Оценка fsync на фиксацию (journal_mode=DELETE, synchronous=FULL): {FSYNCS_PER_COMMIT}")
+        print()
+        print(f"{'Сценарий':32} {'':6} {'COMMIT/оп':>10} {'~fsync/оп':>10} {'мс/оп':>8}")
+        for name, before, after in scenarios:
+            for label, operation in (("до", before), ("после", after)):
+                commits, ms = measure(counter, operation, count)
+                print(f"{name:32} {label:6} {commits:>10.1f} {commits * FSYNCS_PER_COMMIT:>10.1f} {ms:>8.2f}")
+
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import logging
+import os
+
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, Signal
+
+from database_connection import db, CHANGE_BATCH_SIZE
+
+
+logger = logging.getLogger('med_center.change_feed')
+
+# Интервал опроса журнала изменений (мс); MED_CENTER_CHANGE_POLL_MS=0 - без опроса
+CHANGE_POLL_INTERVAL_MS = int(os.environ.get('MED_CENTER_CHANGE_POLL_MS', 2000))
+
+
+class ChangeFeed(QObject):
+    """
+    Изменения базы, сделанные на этом и на других рабочих местах
+
+    По таймеру проверяется db.change_counter() - один PRAGMA data_version, и только
+    если база изменилась, читаются новые записи журнала change_log (по первичному
+    ключу seq). Изменения за опрос передаются сигналом changes_received словарем
+    {таблица: {id записи: последняя операция}}, по нему открытые списки выбирают
+    заново только измененные строки.
+
+    Если журнал нельзя дочитать (записи удалены очисткой) или изменений больше
+    CHANGE_BATCH_SIZE, передается reset_required: списки загружаются заново.
+    """
+
+    changes_received = Signal(dict)
+    reset_required = Signal()
+
+    def __init__(self, interval_ms=CHANGE_POLL_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        # Изменения до создания журнала уже видны в загруженных списках
+        self._counter = db.change_counter()
+        self._last_seq = db.get_last_change_seq()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.poll)
+        if interval_ms > 0:
+            self.timer.start()
+
+    def poll(self):
+        """Проверка базы и передача изменений после предыдущего опроса"""
+        counter = db.change_counter()
+        if counter == self._counter:
+            return
+        self._counter = counter
+
+        changes, complete = db.get_changes(self._last_seq)
+        if not complete or len(changes) >= CHANGE_BATCH_SIZE:
+            logger.info("Журнал изменений пропущен (после записи %s), списки загружаются заново", self._last_seq)
+            self._last_seq = db.get_last_change_seq()
+            self.reset_required.emit()
+            return
+        if not changes:
+            return
+
+        self._last_seq = changes[-1]['seq']
+        grouped = {}
+        for change in changes:
+            grouped.setdefault(change['table_name'], {})[change['row_id']] = change['operation']
+        self.changes_received.emit(grouped)
+
+
+_feed = None
+
+
+def change_feed():
+    """Общий опрос журнала изменений приложения (создается при первом обращении)"""
+    global _feed
+    if _feed is None:
+        _feed = ChangeFeed()
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(_feed.timer.stop)
+    return _feed
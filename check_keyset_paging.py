@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка постраничной выборки по ключу (db.fetch_page) на ключах с NULL.
+
+Скрипт заполняет таблицу в памяти строками, у которых в столбцах ключа часто
+встречается NULL, проходит выборку по страницам в обоих направлениях
+для нескольких ключей и размеров страниц и сравнивает порядок строк
+с обычным ORDER BY. Строки, пропущенные или повторенные на границах страниц
+(см. keyset_page_parts), дают код возврата 1.
+
+Запуск: python check_keyset_paging.py [-v]
+"""
+import random
+import sqlite3
+import sys
+
+from database_connection import DatabaseConnection
+
+# Число строк и доли NULL в столбцах ключа
+ROW_COUNT = 300
+NULL_SHARE = {'a': 0.4, 'b': 0.5}
+
+# Ключи выборки: последний столбец уникален и NOT NULL, как требует fetch_page
+ORDER_KEYS = [
+    ('a', 'id'),
+    ('a', 'b', 'id'),
+    ('b', 'a', 'id'),
+]
+PAGE_SIZES = [1, 2, 3, 7, 50, ROW_COUNT]
+
+# Выборки: без условий и с условием WHERE (параметры идут раньше параметров ключа)
+QUERIES = [
+    ("SELECT id, a, b FROM keyset_check", ()),
+    ("SELECT id, a, b FROM keyset_check WHERE id % ? <> 0", (3,)),
+]
+
+
+def fill_table(connection):
+    """Таблица keyset_check с повторяющимися значениями и NULL в столбцах a и b"""
+    connection.execute("CREATE TABLE keyset_check (id INTEGER PRIMARY KEY, a TEXT, b INTEGER)")
+    generator = random.Random(12)
+    rows = []
+    for row_id in range(1, ROW_COUNT + 1):
+        a = None if generator.random() < NULL_SHARE['a'] else f"2025-01-{generator.randint(1, 5):02d}"
+        b = None if generator.random() < NULL_SHARE['b'] else generator.randint(1, 4)
+        rows.append((row_id, a, b))
+    # Порядок вставки не совпадает с порядком id
+    generator.shuffle(rows)
+    connection.executemany("INSERT INTO keyset_check (id, a, b) VALUES (?, ?, ?)", rows)
+    connection.commit()
+
+
+def paged_ids(db, query, params, order_key, descending, limit):
+    """id строк выборки, пройденной по страницам fetch_page"""
+    ids, after = [], None
+    while True:
+        rows, after = db.fetch_page(query, order_key, after=after, limit=limit,
+                                    params=params, descending=descending)
+        ids.extend(row['id'] for row in rows)
+        if after is None:
+            return ids
+        if len(ids) > ROW_COUNT:
+            # Страницы повторяются: выборка не заканчивается
+            return ids
+
+
+def expected_ids(connection, query, params, order_key, descending):
+    """id строк выборки с обычным ORDER BY"""
+    direction = "DESC" if descending else "ASC"
+    order_by = ', '.join(f'{key} {direction}' for key in order_key)
+    return [row['id'] for row in connection.execute(f"SELECT * FROM ({query}) ORDER BY {order_by}", params)]
+
+
+def main():
+    verbose = '-v' in sys.argv[1:]
+
+    # Выборка идет через методы db на отдельной базе в памяти
+    db = DatabaseConnection()
+    db._connection = sqlite3.connect(':memory:')
+    db.set_row_factory('dict')
+    connection = db._connection
+    fill_table(connection)
+
+    checks = 0
+    failures = []
+    for query, params in QUERIES:
+        for order_key in ORDER_KEYS:
+            for descending in (False, True):
+                expected = expected_ids(connection, query, params, order_key, descending)
+                for limit in PAGE_SIZES:
+                    checks += 1
+                    ids = paged_ids(db, query, params, order_key, descending, limit)
+                    location = (f"{' '.join(query.split())} | ключ {order_key} "
+                                f"{'по убыванию' if descending else 'по возрастанию'} | страница {limit}")
+                    if verbose:
+                        print(location)
+                    if ids != expected:
+                        failures.append((location, ids, expected))
+
+    print(f"\nПроверено выборок: {checks}")
+    if failures:
+        print(f"Выборки, порядок которых отличается от ORDER BY: {len(failures)}")
+        for location, ids, expected in failures:
+            missing = sorted(set(expected) - set(ids))
+            repeated = len(ids) - len(set(ids))
+            print(f"\n[!] {location}")
+            print(f"    строк: {len(ids)} из {len(expected)}, пропущено: {len(missing)}, повторов: {repeated}")
+            if missing:
+                print(f"    пропущенные id: {missing[:20]}")
+        return 1
+
+    print("Все выборки совпадают с ORDER BY")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка планов выполнения SQL-запросов приложения.
+
+Скрипт собирает все SQL-запросы из исходного кода, выполняет для каждого
+EXPLAIN QUERY PLAN на актуальной схеме (с примененными миграциями) и
+завершается с кодом 1, если хотя бы один запрос выполняет полный просмотр
+большой таблицы вместо поиска по индексу.
+
+Запуск: python check_query_plans.py [-v]
+"""
+import ast
+import os
+import re
+import sqlite3
+import sys
+
+from database_connection import DatabaseConnection, keyset_page_query, keyset_page_parts, _turnaround_select
+
+# Файлы, запросы из которых проверяются
+SOURCE_FILES = [
+    'database_connection.py',
+    'login_window.py',
+    'admin_window.py',
+    'doctor_window.py',
+    'lab_technician_window.py',
+    'report_generator.py',
+]
+
+# Справочные таблицы, которые остаются маленькими: полный просмотр допустим
+# (user_role_stats - по строке на роль пользователя)
+SMALL_TABLES = {'users', 'doctors', 'analysis_types', 'medications', 'user_role_stats'}
+
+# Запросы, которые собираются динамически (f-строки с условиями фильтров).
+# Здесь перечислены формы, в которых они реально выполняются.
+DYNAMIC_QUERIES = [
+    ("admin_window.py: AnalysisResultsWidget.refresh_analysis_results (фильтр по пациенту)", """
+        SELECT ar.id as id, p.full_name as patient_name, p.birth_date, at.name as analysis_type,
+               ar.result_date, u.full_name as lab_technician, ar.status,
+               p.id as patient_id, at.id as analysis_type_id, u.id as lab_user_id
+        FROM analysis_results ar INDEXED BY idx_analysis_results_patient_date
+        CROSS JOIN patients p ON ar.patient_id = p.id
+        CROSS JOIN analysis_types at ON ar.analysis_type_id = at.id
+        CROSS JOIN users u ON ar.lab_user_id = u.id
+        WHERE 1=1 AND ar.patient_id = ? AND ar.result_date >= ? AND ar.result_date < ?
+        ORDER BY ar.result_date DESC
+    """),
+    ("admin_window.py: AnalysisResultsWidget.refresh_analysis_results (только период)", """
+        SELECT ar.id as id, p.full_name as patient_name, p.birth_date, at.name as analysis_type,
+               ar.result_date, u.full_name as lab_technician, ar.status,
+               p.id as patient_id, at.id as analysis_type_id, u.id as lab_user_id
+        FROM analysis_results ar
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        JOIN users u ON ar.lab_user_id = u.id
+        WHERE 1=1 AND ar.result_date >= ? AND ar.result_date < ?
+        ORDER BY ar.result_date DESC
+    """),
+    ("admin_window.py: AdminWindow.refresh_appointments (фильтр по врачу)", """
+        SELECT a.id, a.appointment_date, a.status, a.notes,
+               p.id as patient_id, p.full_name as patient_name,
+               d.id as doctor_id, u.full_name as doctor_name, d.specialization
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        JOIN doctors d ON a.doctor_id = d.id
+        JOIN users u ON d.user_id = u.id
+        WHERE 1=1 AND a.doctor_id = ? AND a.appointment_date >= ? AND a.appointment_date < ?
+        ORDER BY a.appointment_date
+    """),
+    ("admin_window.py: AdminWindow.refresh_appointments (только период)", """
+        SELECT a.id, a.appointment_date, a.status, a.notes,
+               p.id as patient_id, p.full_name as patient_name,
+               d.id as doctor_id, u.full_name as doctor_name, d.specialization
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        JOIN doctors d ON a.doctor_id = d.id
+        JOIN users u ON d.user_id = u.id
+        WHERE 1=1 AND a.appointment_date >= ? AND a.appointment_date < ?
+        ORDER BY a.appointment_date
+    """),
+    ("doctor_window.py: DoctorWindow.load_analysis_results (фильтр по пациенту)", """
+        SELECT ar.*, at.name as analysis_name, p.full_name as patient_name, u.full_name as lab_technician_name
+        FROM analysis_results ar
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN users u ON ar.lab_user_id = u.id
+        WHERE ar.result_date >= ? AND ar.result_date < ? AND ar.patient_id = ?
+    """),
+    ("report_generator.py: export_all_analyses_to_word (период)", """
+        SELECT ar.id, ar.result_date as date, p.full_name as patient_name, p.birth_date,
+               p.gender, p.phone, at.name as analysis_type, ar.result_data,
+               ar.status, u.full_name as lab_technician
+        FROM analysis_results ar
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        JOIN users u ON ar.lab_user_id = u.id
+        WHERE 1=1 AND ar.result_date >= ? AND ar.result_date < ?
+    """),
+    ("database_connection.py: search (записи на прием врача)", """
+        SELECT s.id, CASE s.scope WHEN 1 THEN 'patients' WHEN 2 THEN 'appointments'
+                                  WHEN 3 THEN 'analysis_results' END as scope, s.snippet, s.rank,
+               p.id as patient_id, p.full_name as patient_name, p.birth_date,
+               a.appointment_date, a.notes, a.doctor_id, du.full_name as doctor_name,
+               at.name as analysis_name, ar.result_date, ar.result_data,
+               COALESCE(a.status, ar.status) as status
+        FROM (
+            SELECT search_index.rowid / 4 as id,
+                   search_index.rowid % 4 as scope,
+                   snippet(search_index, 0, '[', ']', '...', 12) as snippet, rank
+            FROM search_index
+            WHERE search_index MATCH ?
+              AND search_index.rowid % 4 IN (?, ?, ?)
+              AND (search_index.rowid % 4 <> 2
+                   OR EXISTS (SELECT 1 FROM appointments
+                              WHERE id = search_index.rowid / 4 AND doctor_id = ?))
+            ORDER BY rank
+            LIMIT ?
+        ) s
+        LEFT JOIN appointments a ON s.scope = 2 AND a.id = s.id
+        LEFT JOIN doctors d ON d.id = a.doctor_id
+        LEFT JOIN users du ON du.id = d.user_id
+        LEFT JOIN analysis_results ar ON s.scope = 3 AND ar.id = s.id
+        LEFT JOIN analysis_types at ON at.id = ar.analysis_type_id
+        LEFT JOIN patients p ON p.id = CASE s.scope WHEN 1 THEN s.id
+                                        ELSE COALESCE(a.patient_id, ar.patient_id) END
+        ORDER BY s.rank
+    """),
+    ("database_connection.py: fetch_changed_rows (история анализов лаборанта)", """
+        SELECT changed.* FROM json_each(?) AS changed_ids
+        CROSS JOIN (
+            SELECT ar.*, p.full_name as patient_name, at.name as analysis_name
+            FROM analysis_results ar
+            JOIN patients p ON ar.patient_id = p.id
+            JOIN analysis_types at ON ar.analysis_type_id = at.id
+            WHERE ar.lab_user_id = ?
+        ) AS changed ON changed.id = changed_ids.value
+    """),
+    ("database_connection.py: fetch_changed_rows (расписание врача, ScheduleDayCache)", """
+        SELECT changed.* FROM json_each(?) AS changed_ids
+        CROSS JOIN (
+            SELECT a.*, p.full_name as patient_name
+            FROM appointments a
+            JOIN patients p ON a.patient_id = p.id
+            WHERE a.doctor_id = ?
+        ) AS changed ON changed.id = changed_ids.value
+    """),
+    ("database_connection.py: _turnaround_select (триггеры срока выполнения анализа)",
+     _turnaround_select("r.id = ?")),
+]
+
+# Списки, загружаемые постранично (db.fetch_page): (место, индекс запроса в
+# DYNAMIC_QUERIES или сам запрос, ключ, по убыванию). Проверяются первая и
+# следующая страницы, в том числе отсутствие сортировки во временном B-дереве.
+PAGED_QUERIES = [
+    ("admin_window.py: PatientListWidget.load_patients", "SELECT * FROM patients", ('full_name', 'id'), False),
+    ("admin_window.py: PatientListWidget.load_patients (поиск)", """
+        SELECT s.rowid AS id, p.full_name, p.birth_date, p.gender, p.phone, p.email,
+               p.address, p.created_at, p.updated_at
+        FROM patients_search s
+        CROSS JOIN patients p ON p.id = s.rowid
+        WHERE patients_search MATCH ?
+    """, 'id', False),
+    ("admin_window.py: AnalysisResultsWidget.refresh_analysis_results (фильтр по пациенту)", 0,
+     ('result_date', 'id'), True),
+    ("admin_window.py: AnalysisResultsWidget.refresh_analysis_results (только период)", 1,
+     ('result_date', 'id'), True),
+    ("admin_window.py: AnalysisResultsWidget.refresh_analysis_results (сортировка по пациенту)", """
+        SELECT ar.id as id, p.full_name as patient_name, p.birth_date, at.name as analysis_type,
+               ar.result_date, u.full_name as lab_technician, ar.status,
+               p.id as patient_id, at.id as analysis_type_id, u.id as lab_user_id
+        FROM patients p
+        CROSS JOIN analysis_results ar INDEXED BY idx_analysis_results_patient_date ON ar.patient_id = p.id
+        CROSS JOIN analysis_types at ON ar.analysis_type_id = at.id
+        CROSS JOIN users u ON ar.lab_user_id = u.id
+        WHERE 1=1 AND ar.result_date >= ? AND ar.result_date < ?
+    """, ('patient_name', 'patient_id', 'result_date', 'id'), False),
+    ("admin_window.py: AnalysisResultsWidget.refresh_analysis_results (сортировка по типу анализа)", """
+        SELECT ar.id as id, p.full_name as patient_name, p.birth_date, at.name as analysis_type,
+               ar.result_date, u.full_name as lab_technician, ar.status,
+               p.id as patient_id, at.id as analysis_type_id, u.id as lab_user_id
+        FROM analysis_types at
+        CROSS JOIN analysis_results ar INDEXED BY idx_analysis_results_type_date ON ar.analysis_type_id = at.id
+        CROSS JOIN patients p ON ar.patient_id = p.id
+        CROSS JOIN users u ON ar.lab_user_id = u.id
+        WHERE 1=1 AND ar.analysis_type_id = ? AND ar.result_date >= ? AND ar.result_date < ?
+    """, ('analysis_type', 'analysis_type_id', 'result_date', 'id'), True),
+    ("admin_window.py: AnalysisResultsWidget.refresh_analysis_results (сортировка по статусу)", """
+        SELECT ar.id as id, p.full_name as patient_name, p.birth_date, at.name as analysis_type,
+               ar.result_date, u.full_name as lab_technician, ar.status,
+               p.id as patient_id, at.id as analysis_type_id, u.id as lab_user_id
+        FROM analysis_results ar INDEXED BY idx_analysis_results_status_date
+        CROSS JOIN patients p ON ar.patient_id = p.id
+        CROSS JOIN analysis_types at ON ar.analysis_type_id = at.id
+        CROSS JOIN users u ON ar.lab_user_id = u.id
+        WHERE 1=1 AND ar.result_date >= ? AND ar.result_date < ?
+    """, ('status', 'result_date', 'id'), False),
+    ("admin_window.py: AnalysisResultsWidget.refresh_analysis_results (сортировка по лаборанту)", """
+        SELECT ar.id as id, p.full_name as patient_name, p.birth_date, at.name as analysis_type,
+               ar.result_date, u.full_name as lab_technician, ar.status,
+               p.id as patient_id, at.id as analysis_type_id, u.id as lab_user_id
+        FROM users u
+        CROSS JOIN analysis_results ar INDEXED BY idx_analysis_results_lab_user_date ON ar.lab_user_id = u.id
+        CROSS JOIN patients p ON ar.patient_id = p.id
+        CROSS JOIN analysis_types at ON ar.analysis_type_id = at.id
+        WHERE 1=1 AND ar.result_date >= ? AND ar.result_date < ?
+    """, ('lab_technician', 'lab_user_id', 'result_date', 'id'), True),
+    ("admin_window.py: AdminWindow.refresh_appointments (фильтр по врачу)", 2, ('appointment_date', 'id'), False),
+    ("admin_window.py: AdminWindow.refresh_appointments (только период)", 3, ('appointment_date', 'id'), False),
+    ("doctor_window.py: DoctorWindow.load_analysis_results (фильтр по пациенту)", 4, ('result_date', 'id'), True),
+    ("doctor_window.py: DoctorWindow.load_analysis_results (только период)", """
+        SELECT ar.*, at.name as analysis_name, p.full_name as patient_name, u.full_name as lab_technician_name
+        FROM analysis_results ar
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN users u ON ar.lab_user_id = u.id
+        WHERE ar.result_date >= ? AND ar.result_date < ?
+    """, ('result_date', 'id'), True),
+    ("database_connection.py: get_doctor_prescriptions_page", """
+        SELECT p.*, pt.full_name as patient_name, pt.birth_date as patient_birth_date
+        FROM prescriptions p
+        JOIN patients pt ON p.patient_id = pt.id
+        WHERE p.doctor_id = ?
+    """, ('issue_date', 'id'), True),
+    ("lab_technician_window.py: LabTechnicianWindow.load_analysis_history", """
+        SELECT ar.*, p.full_name as patient_name, at.name as analysis_name
+        FROM analysis_results ar
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        WHERE ar.lab_user_id = ?
+    """, ('result_date', 'id'), True),
+]
+
+SQL_START_RE = re.compile(r'^\s*(SELECT|WITH|UPDATE|DELETE)\s+\S', re.IGNORECASE)
+TABLE_SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS (\w+))?$')
+WHERE_RE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+NO_FILTER_RE = re.compile(r'\bWHERE\s+1\s*=\s*1\s*(ORDER\b|GROUP\b|LIMIT\b|$)', re.IGNORECASE)
+# Подзапрос во FROM: просмотр его результата не является просмотром таблицы
+SUBQUERY_RE = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\w+)$')
+TEMP_SORT_RE = re.compile(r'^USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY$')
+
+
+def collect_queries(base_dir):
+    """Сбор строковых констант с SQL-запросами из исходных файлов"""
+    queries = []
+    skipped = []
+
+    for file_name in SOURCE_FILES:
+        path = os.path.join(base_dir, file_name)
+        with open(path, encoding='utf-8') as source:
+            tree = ast.parse(source.read(), filename=file_name)
+
+        # Части f-строк не являются самостоятельными запросами
+        fstring_parts = {id(part) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr)
+                         for part in node.values}
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                if id(node) in fstring_parts:
+                    continue
+                if SQL_START_RE.match(node.value):
+                    queries.append((f"{file_name}:{node.lineno}", node.value))
+            elif isinstance(node, ast.JoinedStr):
+                # f-строки с подстановкой условий проверяются через DYNAMIC_QUERIES
+                literal = ''.join(part.value for part in node.values
+                                  if isinstance(part, ast.Constant) and isinstance(part.value, str))
+                if SQL_START_RE.match(literal):
+                    skipped.append(f"{file_name}:{node.lineno}")
+
+    return queries, skipped
+
+
+def table_aliases(query):
+    """Соответствие псевдонимов таблиц их именам (FROM/JOIN таблица [AS] псевдоним)"""
+    aliases = {}
+    for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', query, re.IGNORECASE):
+        aliases[table] = table
+        if alias and alias.upper() not in ('WHERE', 'JOIN', 'ON', 'ORDER', 'GROUP', 'LEFT', 'INNER',
+                                           'LIMIT', 'SET', 'CROSS'):
+            aliases[alias] = table
+    return aliases
+
+
+def explain(connection, query):
+    """Получение плана выполнения запроса (параметры заменяются на NULL)"""
+    params = [None] * query.count('?')
+    cursor = connection.cursor()
+    cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+    return [row['detail'] for row in cursor.fetchall()]
+
+
+# Части следующей страницы со строками, где столбец ключа NULL: сортируются только
+# такие строки (обычно их нет), поэтому сортировка во временном B-дереве допустима
+NULL_PART_SUFFIX = " (NULL в ключе)"
+
+
+def paged_queries():
+    """Первая и следующая страницы списков, загружаемых через db.fetch_page"""
+    queries = []
+    for location, query, order_key, descending in PAGED_QUERIES:
+        if isinstance(query, int):
+            query = DYNAMIC_QUERIES[query][1]
+        queries.append((f"{location}, первая страница", keyset_page_query(query, order_key, descending)))
+        # Следующая страница: части после ключа без NULL (сравнение ключа и NULL в столбцах ключа)
+        keys = (order_key,) if isinstance(order_key, str) else order_key
+        for number, (condition, _) in enumerate(keyset_page_parts(keys, ('',) * len(keys), descending), 1):
+            part = f"{location}, следующая страница, часть {number}"
+            if condition.endswith(" IS NULL"):
+                part += NULL_PART_SUFFIX
+            queries.append((part, keyset_page_query(query, order_key, descending, condition)))
+    return queries
+
+
+def find_temp_sorts(plan):
+    """Сортировка результата во временном B-дереве (страница требует чтения всей выборки)"""
+    return [detail.strip() for detail in plan if TEMP_SORT_RE.match(detail.strip())]
+
+
+def find_table_scans(query, plan):
+    """Поиск полных просмотров больших таблиц в плане запроса"""
+    # Запрос без фильтров (полный список) просматривает таблицу по определению
+    if not WHERE_RE.search(query) or NO_FILTER_RE.search(query.strip()):
+        return []
+
+    aliases = table_aliases(query)
+    subqueries = {match.group(1) for match in (SUBQUERY_RE.match(detail.strip()) for detail in plan)
+                  if match}
+    scans = []
+    for detail in plan:
+        match = TABLE_SCAN_RE.match(detail.strip())
+        if not match:
+            continue
+        name = match.group(2) or match.group(1)
+        table = aliases.get(name, name)
+        if table in SMALL_TABLES or table.startswith('sqlite_') or name in subqueries:
+            continue
+        scans.append(detail.strip())
+    return scans
+
+
+def main():
+    verbose = '-v' in sys.argv[1:]
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
+    # Схема строится в памяти тем же кодом, что и рабочая база (таблицы + миграции)
+    db = DatabaseConnection()
+    db._connection = sqlite3.connect(':memory:')
+    db.set_row_factory('dict')
+    db._register_functions()
+    db._initialize_database()
+    connection = db._connection
+
+    queries, skipped = collect_queries(base_dir)
+    queries.extend(DYNAMIC_QUERIES)
+    paged = paged_queries()
+    queries.extend(paged)
+    paged_locations = {location for location, _ in paged if not location.endswith(NULL_PART_SUFFIX)}
+
+    failures = []
+    for location, query in queries:
+        try:
+            plan = explain(connection, query)
+        except Exception as e:
+            failures.append((location, query, [f"ошибка разбора запроса: {e}"]))
+            continue
+
+        scans = find_table_scans(query, plan)
+        if location in paged_locations:
+            # Страница по ключу должна читаться в порядке индекса, без сортировки всей выборки
+            scans += find_temp_sorts(plan)
+        if scans:
+            failures.append((location, query, scans))
+        if verbose:
+            print(f"\n{location}")
+            for detail in plan:
+                print(f"    {detail}")
+
+    print(f"\nПроверено запросов: {len(queries)}")
+    if skipped:
+        print(f"Пропущены f-строки (типичные формы заданы в DYNAMIC_QUERIES): {', '.join(skipped)}")
+
+    if failures:
+        print(f"Запросы с полным просмотром таблицы или сортировкой страницы: {len(failures)}")
+        for location, query, scans in failures:
+            print(f"\n[!] {location}")
+            print("    " + " ".join(query.split()))
+            for detail in scans:
+                print(f"    -> {detail}")
+        return 1
+
+    print("Все запросы используют индексы")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,970 @@
 import json
+import logging
 import os
+import random
+import re
 import sqlite3
-from datetime import datetime
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from query_stats import QueryStatistics, dump_stats_json
+from row_factories import ROW_FACTORY_NAMES, make_row_factory
+
+
+logger = logging.getLogger('med_center.db')
+# Отдельный логгер, чтобы журнал медленных запросов можно было направить в свой файл
+slow_query_logger = logging.getLogger('med_center.db.slow')
+
+# Запросы дольше порога (мс) попадают в журнал медленных запросов
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('MED_CENTER_SLOW_QUERY_MS', 100))
+# Доля повторных медленных запросов, которые записываются в журнал
+# (первое появление каждого запроса записывается всегда)
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('MED_CENTER_SLOW_QUERY_SAMPLE', 0.1))
+# Сбор статистики по операторам (db.stats()); MED_CENTER_QUERY_STATS=0 отключает
+QUERY_STATS_ENABLED = os.environ.get('MED_CENTER_QUERY_STATS', '1') != '0'
+# Представление строк результата по умолчанию (см. row_factories.ROW_FACTORY_NAMES)
+DEFAULT_ROW_FACTORY = os.environ.get('MED_CENTER_ROW_FACTORY', 'dict')
+# Размер страницы для постраничной выборки списков (fetch_page)
+DEFAULT_PAGE_SIZE = 100
+# Размер пачки строк для потоковой выборки (iter_rows)
+DEFAULT_BATCH_SIZE = 1000
+# Число результатов глобального поиска (search)
+DEFAULT_SEARCH_LIMIT = 50
+# Число пациентов-кандидатов при поиске пациента (find_patients)
+DEFAULT_PATIENT_MATCHES = 20
+# Кэш справочников (db.cached); MED_CENTER_REFERENCE_CACHE=0 отключает
+REFERENCE_CACHE_ENABLED = os.environ.get('MED_CENTER_REFERENCE_CACHE', '1') != '0'
+# Кэш результатов запросов (fetch_one/fetch_all с cache=True); MED_CENTER_QUERY_CACHE=0 отключает
+QUERY_CACHE_ENABLED = os.environ.get('MED_CENTER_QUERY_CACHE', '1') != '0'
+# Ограничения кэша результатов: число записей и оценка объема (МБ)
+QUERY_CACHE_MAX_ENTRIES = 512
+QUERY_CACHE_MAX_BYTES = int(float(os.environ.get('MED_CENTER_QUERY_CACHE_MB', 32)) * 2 ** 20)
+# Сколько последних записей журнала изменений хранится (очистка при подключении)
+CHANGE_LOG_MAX_ENTRIES = 100000
+# Записей журнала изменений за один опрос; больше - списки загружаются заново
+CHANGE_BATCH_SIZE = 1000
+# Ограничение на число запомненных текстов медленных запросов
+_SLOW_QUERY_SEEN_LIMIT = 1000
+_slow_queries_seen = set()
+
+
+def _compact_sql(query):
+    """SQL-текст в одну строку для журнала"""
+    return " ".join(query.split())
+
+
+def _params_for_log(query, params):
+    """Параметры запроса для журнала (значения запросов с паролями скрываются)"""
+    if params and 'password' in query.lower():
+        return '<скрыто>'
+    return params
+
+
+def _log_slow_query(query, params, elapsed_ms):
+    """Запись медленного запроса в журнал (повторы одного запроса - выборочно)"""
+    first_time = query not in _slow_queries_seen
+    if first_time and len(_slow_queries_seen) < _SLOW_QUERY_SEEN_LIMIT:
+        _slow_queries_seen.add(query)
+    if first_time or random.random() < SLOW_QUERY_SAMPLE_RATE:
+        slow_query_logger.warning("Медленный запрос (%.1f мс): %s; параметры: %s",
+                                  elapsed_ms, _compact_sql(query), _params_for_log(query, params))
+
+
+# Единый формат хранения даты и времени: ISO-строка, которая сравнивается
+# и сортируется как строка, поэтому диапазоны по ней используют индексы
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Столбцы с датой и временем, значения которых приводятся к DATETIME_FORMAT
+DATETIME_COLUMNS = [
+    ('patients', 'created_at'),
+    ('analysis_results', 'result_date'),
+    ('appointments', 'appointment_date'),
+]
+
+
+def _datetime_normalization_statements():
+    """SQL для приведения дат к DATETIME_FORMAT в существующих данных и при записи"""
+    statements = []
+    for table, column in DATETIME_COLUMNS:
+        # Значения, которые SQLite не распознает как дату, не изменяются
+        statements.append(
+            f"UPDATE {table} SET {column} = strftime('{DATETIME_FORMAT}', {column}) "
+            f"WHERE strftime('{DATETIME_FORMAT}', {column}) IS NOT NULL "
+            f"AND {column} <> strftime('{DATETIME_FORMAT}', {column})"
+        )
+
+        # Триггеры приводят к единому формату любые новые и измененные значения
+        for event, suffix in (("INSERT", "ins"), (f"UPDATE OF {column}", "upd")):
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{column}_{suffix} "
+                f"AFTER {event} ON {table} "
+                f"WHEN strftime('{DATETIME_FORMAT}', NEW.{column}) IS NOT NULL "
+                f"AND NEW.{column} <> strftime('{DATETIME_FORMAT}', NEW.{column}) "
+                f"BEGIN "
+                f"UPDATE {table} SET {column} = strftime('{DATETIME_FORMAT}', NEW.{column}) WHERE id = NEW.id; "
+                f"END"
+            )
+    return statements
+
+
+def _phone_digits_sql(column):
+    """
+    SQL-выражение: цифры телефона для поиска по цифрам без учета оформления номера
+
+    Номер из 11 цифр, начинающийся с 7 или 8, дает два слова: номер с кодом страны 7
+    и номер без него, поэтому "+7 (916) 123", "8916123" и "916123" находят один номер.
+    """
+    digits = f"coalesce({column}, '')"
+    for char in (' ', '+', '-', '(', ')', '.'):
+        digits = f"replace({digits}, '{char}', '')"
+    return (f"CASE WHEN length({digits}) = 11 AND substr({digits}, 1, 1) IN ('7', '8') "
+            f"THEN '7' || substr({digits}, 2) || ' ' || substr({digits}, 2) ELSE {digits} END")
+
+
+# Ключ нечеткого поиска по ФИО (name_key): строчные буквы, затем замены
+# букв, которые часто путают при записи фамилий, затем удвоенные буквы - одной
+# буквой. Одни и те же правила дают SQL-выражение для триггеров (_name_key_sql)
+# и ключ строки поиска (name_key), поэтому ключи совпадают.
+_CYRILLIC_UPPER = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+NAME_KEY_REPLACEMENTS = (
+    # Латинские буквы, похожие на кириллические (набраны в другой раскладке)
+    ('a', 'а'), ('b', 'в'), ('c', 'с'), ('e', 'е'), ('h', 'н'), ('k', 'к'),
+    ('m', 'м'), ('o', 'о'), ('p', 'р'), ('t', 'т'), ('x', 'х'), ('y', 'у'),
+    ('ё', 'е'), ('э', 'е'),
+    # Безударные е/и: Фёдоров - Фидоров
+    ('е', 'и'),
+    ('й', 'и'), ('ы', 'и'),
+    ('ъ', ''), ('ь', ''),
+    # Безударные о/а: Колесников - Калесников
+    ('о', 'а'),
+)
+_NAME_KEY_LETTERS = ''.join(
+    letter for letter in _CYRILLIC_UPPER.lower()
+    if letter not in {source for source, _ in NAME_KEY_REPLACEMENTS})
+_NAME_KEY_REPLACES_PER_QUERY = 12
+
+
+def name_key(text):
+    """Ключ нечеткого поиска для ФИО или строки поиска (см. NAME_KEY_REPLACEMENTS)"""
+    key = text.lower()
+    for source, target in NAME_KEY_REPLACEMENTS:
+        key = key.replace(source, target)
+    for letter in _NAME_KEY_LETTERS:
+        key = key.replace(letter * 2, letter)
+    return key
+
+
+def _name_key_sql(column):
+    """
+    SQL-выражение ключа name_key(column) без функций приложения
+
+    Встроенный lower() меняет регистр только латиницы, поэтому кириллица
+    приводится заменами. Замены разбиты на вложенные подзапросы: одно выражение
+    из десятков вложенных replace() не помещается в стек синтаксического анализатора.
+    """
+    replacements = ([(letter, letter.lower()) for letter in _CYRILLIC_UPPER]
+                    + list(NAME_KEY_REPLACEMENTS)
+                    + [(letter * 2, letter) for letter in _NAME_KEY_LETTERS])
+    key = f"(SELECT lower(coalesce({column}, '')) AS k)"
+    for start in range(0, len(replacements), _NAME_KEY_REPLACES_PER_QUERY):
+        expression = "k"
+        for source, target in replacements[start:start + _NAME_KEY_REPLACES_PER_QUERY]:
+            expression = f"replace({expression}, '{source}', '{target}')"
+        key = f"(SELECT {expression} AS k FROM {key})"
+    return key
+
+
+def _patients_search_statements(with_name_key=True):
+    """
+    SQL полнотекстового индекса поиска пациентов (patients_search) и триггеров его обновления
+
+    with_name_key - столбец name_key с ключами нечеткого поиска по ФИО (с миграции 7).
+    """
+    # Индекс без копии данных (content=''): строки удаляются командой 'delete'
+    # с прежними значениями, которые триггеры берут из OLD.
+    # prefix='1 2' - готовые списки для префиксов из 1-2 символов, иначе
+    # первые нажатия клавиш объединяют списки тысяч слов
+    indexed = [
+        ('full_name', lambda row: f"{row}.full_name"),
+        ('email', lambda row: f"{row}.email"),
+        ('phone_digits', lambda row: _phone_digits_sql(f"{row}.phone")),
+    ]
+    if with_name_key:
+        indexed.append(('name_key', lambda row: _name_key_sql(f"{row}.full_name")))
+    names = ', '.join(name for name, _ in indexed)
+    columns = f"rowid, {names}"
+
+    def values(row):
+        return ', '.join([f"{row}.id"] + [value(row) for _, value in indexed])
+
+    insert = f"INSERT INTO patients_search({columns}) VALUES ({values('NEW')}); "
+    delete = (f"INSERT INTO patients_search(patients_search, {columns}) "
+              f"VALUES ('delete', {values('OLD')}); ")
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS patients_search USING fts5("
+        f"{names}, content='', prefix='1 2', tokenize='unicode61')",
+        f"INSERT INTO patients_search({columns}) SELECT {values('patients')} FROM patients",
+        f"CREATE TRIGGER IF NOT EXISTS trg_patients_search_ins AFTER INSERT ON patients "
+        f"BEGIN {insert}END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_patients_search_del AFTER DELETE ON patients "
+        f"BEGIN {delete}END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_patients_search_upd "
+        f"AFTER UPDATE OF full_name, email, phone ON patients "
+        f"BEGIN {delete}{insert}END",
+    ]
+
+
+# Области глобального поиска (db.search); номер области - позиция в кортеже + 1
+SEARCH_SCOPES = ('patients', 'appointments', 'analysis_results')
+SEARCH_ROWID_BASE = 4
+
+
+def _rebuild_patients_search_statements():
+    """SQL пересоздания индекса patients_search (например, после изменения NAME_KEY_REPLACEMENTS)"""
+    # Индекс без копии данных пересоздается целиком
+    return [
+        "DROP TRIGGER IF EXISTS trg_patients_search_ins",
+        "DROP TRIGGER IF EXISTS trg_patients_search_del",
+        "DROP TRIGGER IF EXISTS trg_patients_search_upd",
+        "DROP TABLE IF EXISTS patients_search",
+    ] + _patients_search_statements()
+
+
+def _search_index_statements(with_digits_column=True):
+    """
+    SQL общего полнотекстового индекса search_index (глобальный поиск) и триггеров его обновления
+
+    with_digits_column - цифры телефона пациента в отдельном столбце digits (с миграции 11):
+    фрагмент с найденными словами (snippet) строится только по столбцу content.
+    """
+    # Строка индекса - одна запись источника: rowid = id записи * SEARCH_ROWID_BASE + номер
+    # области поиска, поэтому триггеры изменяют строку индекса поиском по rowid
+    sources = {
+        # Пациент: ФИО, телефон (как записан и цифрами), email и адрес
+        'patients': (
+            "full_name, phone, email, address",
+            lambda row: (f"coalesce({row}.full_name, '') || ' ' || coalesce({row}.phone, '') || ' ' || "
+                         f"coalesce({row}.email, '') || ' ' || coalesce({row}.address, '')"),
+            lambda row: _phone_digits_sql(f'{row}.phone'),
+        ),
+        # Запись на прием: примечания
+        'appointments': (
+            "notes",
+            lambda row: f"coalesce({row}.notes, '')",
+            None,
+        ),
+        # Результат анализа: значения показателей из JSON (не JSON - строка целиком)
+        'analysis_results': (
+            "result_data",
+            lambda row: (f"CASE WHEN json_valid({row}.result_data) "
+                         f"THEN (SELECT group_concat(value, ' ') FROM json_each({row}.result_data)) "
+                         f"ELSE coalesce({row}.result_data, '') END"),
+            None,
+        ),
+    }
+
+    index_columns = "content, digits" if with_digits_column else "content"
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        f"{index_columns}, prefix='2 3', tokenize='unicode61')",
+    ]
+    for table, (columns, content, digits) in sources.items():
+        scope = SEARCH_SCOPES.index(table) + 1
+
+        def indexed_rows(row, source=""):
+            # Записи без текста в индекс не попадают
+            if with_digits_column:
+                phone_digits = digits(row) if digits else "''"
+                return (f"INSERT INTO search_index(rowid, content, digits) SELECT * FROM ("
+                        f"SELECT {row}.id * {SEARCH_ROWID_BASE} + {scope}, {content(row)} AS content, "
+                        f"{phone_digits} AS digits{source}"
+                        f") WHERE content <> '' OR digits <> ''")
+            if digits:
+                text = f"{content(row)} || ' ' || {digits(row)}"
+            else:
+                text = content(row)
+            return (f"INSERT INTO search_index(rowid, content) SELECT * FROM ("
+                    f"SELECT {row}.id * {SEARCH_ROWID_BASE} + {scope}, {text} AS content{source}"
+                    f") WHERE content <> ''")
+
+        insert = indexed_rows('NEW') + "; "
+        delete = f"DELETE FROM search_index WHERE rowid = OLD.id * {SEARCH_ROWID_BASE} + {scope}; "
+        statements += [
+            indexed_rows(table, f" FROM {table}"),
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_index_ins AFTER INSERT ON {table} "
+            f"BEGIN {insert}END",
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_index_del AFTER DELETE ON {table} "
+            f"BEGIN {delete}END",
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_index_upd "
+            f"AFTER UPDATE OF {columns} ON {table} "
+            f"BEGIN {delete}{insert}END",
+        ]
+    return statements
+
+
+# Таблицы, изменения которых записываются в журнал change_log
+CHANGE_LOG_TABLES = ('patients', 'appointments', 'analysis_results', 'prescriptions',
+                     'users', 'doctors', 'analysis_types', 'medications')
+
+
+def _change_log_statements():
+    """SQL журнала изменений change_log и триггеров, которые его заполняют"""
+    # seq с AUTOINCREMENT не используется повторно и после удаления старых записей,
+    # поэтому номер последней прочитанной записи однозначно задает место в журнале
+    statements = [
+        "CREATE TABLE IF NOT EXISTS change_log ("
+        "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "table_name TEXT NOT NULL, "
+        "row_id INTEGER NOT NULL, "
+        "operation TEXT NOT NULL CHECK(operation IN ('insert', 'update', 'delete')), "
+        "changed_at TEXT DEFAULT CURRENT_TIMESTAMP)",
+    ]
+    for table in CHANGE_LOG_TABLES:
+        for operation, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_change_log_{operation[:3]} "
+                f"AFTER {operation.upper()} ON {table} "
+                f"BEGIN INSERT INTO change_log(table_name, row_id, operation) "
+                f"VALUES ('{table}', {row}.id, '{operation}'); END"
+            )
+    return statements
+
+
+def _day_sql(column):
+    """День 'YYYY-MM-DD' даты column для ежедневных сводок ('' - дата не задана)"""
+    return f"coalesce(substr({column}, 1, 10), '')"
+
+
+# Сводки для статистики администратора: имя таблицы сводки -> (исходная таблица,
+# [(столбец сводки, тип, выражение для строки исходной таблицы)], столбцы, при изменении
+# которых строка переходит в другую группу). Сводки поддерживают триггеры,
+# поэтому статистика за период - сумма по дням периода, а не подсчет записей.
+STATS_ROLLUPS = {
+    'daily_patient_stats': ('patients', [
+        ('day', 'TEXT', lambda row: _day_sql(f"{row}.created_at")),
+    ], 'created_at'),
+    'daily_analysis_stats': ('analysis_results', [
+        ('day', 'TEXT', lambda row: _day_sql(f"{row}.result_date")),
+        ('analysis_type_id', 'INTEGER', lambda row: f"{row}.analysis_type_id"),
+    ], 'result_date, analysis_type_id'),
+    'daily_appointment_stats': ('appointments', [
+        ('day', 'TEXT', lambda row: _day_sql(f"{row}.appointment_date")),
+        ('status', 'TEXT', lambda row: f"coalesce({row}.status, '')"),
+    ], 'appointment_date, status'),
+    'user_role_stats': ('users', [
+        ('role', 'TEXT', lambda row: f"{row}.role"),
+    ], 'role'),
+    # Нагрузка врачей и лаборантов по дням (графики динамики, workload_trends)
+    'daily_doctor_appointment_stats': ('appointments', [
+        ('day', 'TEXT', lambda row: _day_sql(f"{row}.appointment_date")),
+        ('doctor_id', 'INTEGER', lambda row: f"{row}.doctor_id"),
+        ('status', 'TEXT', lambda row: f"coalesce({row}.status, '')"),
+    ], 'appointment_date, doctor_id, status'),
+    'daily_lab_stats': ('analysis_results', [
+        ('day', 'TEXT', lambda row: _day_sql(f"{row}.result_date")),
+        ('lab_user_id', 'INTEGER', lambda row: f"{row}.lab_user_id"),
+    ], 'result_date, lab_user_id'),
+}
+
+
+def _stats_rollup_statements(rollups):
+    """SQL таблиц сводок rollups (имена из STATS_ROLLUPS), их начального заполнения и триггеров обновления"""
+    statements = []
+    for rollup in rollups:
+        table, groups, group_columns = STATS_ROLLUPS[rollup]
+        names = ', '.join(name for name, _, _ in groups)
+
+        def add(row):
+            values = ', '.join(value(row) for _, _, value in groups)
+            return (f"INSERT INTO {rollup}({names}, count) VALUES ({values}, 1) "
+                    f"ON CONFLICT({names}) DO UPDATE SET count = count + 1; ")
+
+        def remove(row):
+            condition = ' AND '.join(f"{name} = {value(row)}" for name, _, value in groups)
+            return f"UPDATE {rollup} SET count = count - 1 WHERE {condition}; "
+
+        statements += [
+            # WITHOUT ROWID: строки хранятся в порядке ключа (день, разрез)
+            f"CREATE TABLE IF NOT EXISTS {rollup} ("
+            f"{', '.join(f'{name} {column_type} NOT NULL' for name, column_type, _ in groups)}, "
+            f"count INTEGER NOT NULL, PRIMARY KEY ({names})) WITHOUT ROWID",
+            f"INSERT INTO {rollup}({names}, count) "
+            f"SELECT {', '.join(f'{value(table)} AS {name}' for name, _, value in groups)}, COUNT(*) "
+            f"FROM {table} GROUP BY {', '.join(str(number) for number in range(1, len(groups) + 1))}",
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{rollup}_ins AFTER INSERT ON {table} "
+            f"BEGIN {add('NEW')}END",
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{rollup}_del AFTER DELETE ON {table} "
+            f"BEGIN {remove('OLD')}END",
+            f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{rollup}_upd AFTER UPDATE OF {group_columns} ON {table} "
+            f"BEGIN {remove('OLD')}{add('NEW')}END",
+        ]
+    return statements
+
+
+# Окно (дней) поиска записи на прием, после которой получен результат анализа
+TURNAROUND_MAX_DAYS = 30
+
+
+def _turnaround_select(condition=None):
+    """
+    Запрос строк result_turnaround для результатов анализов, отобранных condition:
+    минуты от последней неотмененной записи пациента на прием (не раньше
+    TURNAROUND_MAX_DAYS дней до результата) до даты результата
+    """
+    return (
+        f"SELECT id, day, minutes FROM ("
+        f"SELECT r.id, substr(r.result_date, 1, 10) AS day, "
+        f"CAST(round((julianday(r.result_date) - julianday(("
+        f"SELECT MAX(a.appointment_date) FROM appointments a "
+        f"WHERE a.patient_id = r.patient_id AND a.appointment_date <= r.result_date "
+        f"AND a.appointment_date >= datetime(r.result_date, '-{TURNAROUND_MAX_DAYS} days') "
+        f"AND coalesce(a.status, '') <> 'cancelled'"
+        f"))) * 1440) AS INTEGER) AS minutes "
+        f"FROM analysis_results r{f' WHERE {condition}' if condition else ''}"
+        f") WHERE minutes IS NOT NULL"
+    )
+
+
+def _turnaround_statements():
+    """
+    SQL срока выполнения анализов: result_turnaround (минуты для каждого результата,
+    у которого есть предшествующая запись на прием) и сводка daily_turnaround_stats
+    (число результатов и сумма минут по дню результата)
+
+    Срок вычисляется триггерами при добавлении результата и изменении его даты или
+    пациента; при удалении из сводки вычитается сохраненное значение, поэтому сводка
+    всегда равна сумме result_turnaround. Последующие изменения записей на прием
+    сроки уже полученных результатов не пересчитывают.
+    """
+    def remove(row_id):
+        return (f"UPDATE daily_turnaround_stats SET count = count - 1, minutes = minutes - "
+                f"(SELECT minutes FROM result_turnaround WHERE result_id = {row_id}) "
+                f"WHERE day = (SELECT day FROM result_turnaround WHERE result_id = {row_id}); "
+                f"DELETE FROM result_turnaround WHERE result_id = {row_id}; ")
+
+    # Пересчет по текущей строке результата: порядок срабатывания триггера
+    # нормализации даты и этого триггера не важен
+    recompute = (
+        remove('NEW.id')
+        + f"INSERT INTO result_turnaround(result_id, day, minutes) {_turnaround_select('r.id = NEW.id')}; "
+        + "INSERT INTO daily_turnaround_stats(day, count, minutes) "
+          "SELECT day, 1, minutes FROM result_turnaround WHERE result_id = NEW.id "
+          "ON CONFLICT(day) DO UPDATE SET count = count + 1, minutes = minutes + excluded.minutes; "
+    )
+    return [
+        "CREATE TABLE IF NOT EXISTS result_turnaround ("
+        "result_id INTEGER PRIMARY KEY, day TEXT NOT NULL, minutes INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS daily_turnaround_stats ("
+        "day TEXT PRIMARY KEY, count INTEGER NOT NULL, minutes INTEGER NOT NULL) WITHOUT ROWID",
+        f"INSERT INTO result_turnaround(result_id, day, minutes) {_turnaround_select()}",
+        "INSERT INTO daily_turnaround_stats(day, count, minutes) "
+        "SELECT day, COUNT(*), SUM(minutes) FROM result_turnaround GROUP BY day",
+        f"CREATE TRIGGER IF NOT EXISTS trg_analysis_results_turnaround_ins AFTER INSERT ON analysis_results "
+        f"BEGIN {recompute}END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_analysis_results_turnaround_upd "
+        f"AFTER UPDATE OF result_date, patient_id ON analysis_results "
+        f"BEGIN {recompute}END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_analysis_results_turnaround_del AFTER DELETE ON analysis_results "
+        f"BEGIN {remove('OLD.id')}END",
+    ]
+
+
+# Строка поиска из одних цифр и знаков оформления телефона ищется по цифрам номера
+_PHONE_QUERY_RE = re.compile(r'^[\d\s()+\-.]*\d[\d\s()+\-.]*$')
+_SEARCH_WORD_RE = re.compile(r'\w+')
+
+
+def search_match(text, phone_column=None, name_key_column=None):
+    """
+    Выражение MATCH полнотекстового индекса для строки поиска (None, если в строке нет слов)
+
+    Каждое слово ищется как начало слова без учета регистра, в том числе
+    для кириллицы, а если задан name_key_column - еще и как начало ключа
+    нечеткого поиска (name_key) в этом столбце; строка, похожая на номер
+    телефона, ищется как начало номера без учета оформления (в столбце
+    phone_column, если он задан).
+    """
+    if _PHONE_QUERY_RE.match(text):
+        digits = re.sub(r'\D', '', text)
+        prefixes = [digits]
+        if len(digits) > 1 and digits[0] == '8':
+            # 8 и +7 перед кодом - один и тот же номер
+            prefixes.append('7' + digits[1:])
+        terms = ' OR '.join(f'"{prefix}"*' for prefix in prefixes)
+        return f"{phone_column} : ({terms})" if phone_column else f"({terms})"
+
+    words = _SEARCH_WORD_RE.findall(text.casefold())
+    if not words:
+        return None
+    if name_key_column is None:
+        return ' '.join(f'"{word}"*' for word in words)
+
+    terms = []
+    for word in words:
+        key = name_key(word)
+        if key:
+            terms.append(f'("{word}"* OR {name_key_column} : "{key}"*)')
+        else:
+            terms.append(f'"{word}"*')
+    return ' AND '.join(terms)
+
+
+def patient_search_match(text):
+    """
+    Выражение MATCH индекса patients_search для строки поиска пациента:
+    начала слов ФИО и email, цифры телефона и ключи нечеткого поиска по ФИО
+    (Федоров находит Фёдорова, Ильин - Ильина, Кирил - Кирилла)
+    """
+    return search_match(text, phone_column='phone_digits', name_key_column='name_key')
+
+
+def _casefold(value):
+    """SQL-функция casefold(): встроенные lower() и LIKE не учитывают регистр кириллицы"""
+    return value.casefold() if isinstance(value, str) else value
+
+
+# Имена столбцов ключа постраничной выборки подставляются в SQL
+_ORDER_KEY_RE = re.compile(r'^[A-Za-z_]\w*$')
+
+
+def _page_keys(order_key):
+    """Столбцы ключа постраничной выборки (имена подставляются в SQL)"""
+    keys = (order_key,) if isinstance(order_key, str) else tuple(order_key)
+    for key in keys:
+        if not _ORDER_KEY_RE.match(key):
+            raise ValueError(f"Недопустимое имя столбца ключа: {key}")
+    return keys
+
+
+def keyset_page_query(query, order_key, descending=False, condition=None):
+    """
+    SQL страницы выборки по ключу: query оборачивается подзапросом с условием
+    condition (см. keyset_page_parts, None - первая страница), ORDER BY по ключу и LIMIT.
+    Параметры: параметры query, затем параметры условия, затем LIMIT.
+    """
+    keys = _page_keys(order_key)
+    page_query = f"SELECT * FROM ({query}) AS page"
+    if condition:
+        page_query += f" WHERE {condition}"
+    direction = "DESC" if descending else "ASC"
+    return page_query + f" ORDER BY {', '.join(f'{key} {direction}' for key in keys)} LIMIT ?"
+
+
+def keyset_page_parts(order_key, after, descending=False):
+    """
+    Условия строк после ключа after по частям в порядке выборки: [(SQL, параметры)]
+
+    NULL в столбцах ключа (кроме последнего, уникального) упорядочены как в ORDER BY
+    SQLite - раньше любых значений. Сравнение ключей (a, b) > (?, ?) такие строки
+    пропускает, поэтому они выбираются отдельными частями: "a IS NULL" при убывании
+    и "a IS NOT NULL", если NULL в самом ключе after. Части без NULL объединяются
+    в одно сравнение ключей, каждая часть начинается поиском по индексу.
+    """
+    keys = _page_keys(order_key)
+    operator = '<' if descending else '>'
+    parts = []
+
+    def equal(position):
+        """Условие "столбцы ключа до position равны after" и его параметры"""
+        conditions, params = [], []
+        for key, value in zip(keys[:position], after[:position]):
+            if value is None:
+                conditions.append(f"{key} IS NULL")
+            else:
+                conditions.append(f"{key} = ?")
+                params.append(value)
+        return conditions, params
+
+    def add(position, condition, values=()):
+        conditions, params = equal(position)
+        parts.append((' AND '.join(conditions + [condition]), params + list(values)))
+
+    # Столбцы с позиции run_start до run_end сравниваются одним условием
+    run_end = None
+
+    def add_run(run_start):
+        run = keys[run_start:run_end + 1]
+        if len(run) == 1:
+            condition = f"{run[0]} {operator} ?"
+        else:
+            condition = f"({', '.join(run)}) {operator} ({', '.join('?' * len(run))})"
+        add(run_start, condition, after[run_start:run_end + 1])
+
+    for position in range(len(keys) - 1, -1, -1):
+        if after[position] is None:
+            if run_end is not None:
+                add_run(position + 1)
+                run_end = None
+            # После NULL при убывании в этом столбце строк нет
+            if not descending:
+                add(position, f"{keys[position]} IS NOT NULL")
+            continue
+        if run_end is None:
+            run_end = position
+        if descending and position < len(keys) - 1:
+            add_run(position)
+            run_end = None
+            add(position, f"{keys[position]} IS NULL")
+    if run_end is not None:
+        add_run(0)
+    return parts
+
+
+def date_range_bounds(start_date, end_date):
+    """Границы полуинтервала [start_date, end_date + 1 день) для фильтра по датам 'YYYY-MM-DD'"""
+    end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+    return start_date, end.strftime('%Y-%m-%d')
+
+
+# Версионированные миграции схемы.
+# Текущая версия хранится в PRAGMA user_version, каждая миграция применяется
+# один раз и только если версия базы меньше номера миграции.
+# Формат записи: (версия, описание, список SQL-инструкций)
+SCHEMA_MIGRATIONS = [
+    (1, "Составные индексы для частых запросов", [
+        # Результаты анализов пациента (get_patient_analysis_results, фильтр по пациенту)
+        "CREATE INDEX IF NOT EXISTS idx_analysis_results_patient_date "
+        "ON analysis_results(patient_id, result_date)",
+        # История анализов лаборанта (LabTechnicianWindow.load_analysis_history)
+        "CREATE INDEX IF NOT EXISTS idx_analysis_results_lab_user_date "
+        "ON analysis_results(lab_user_id, result_date)",
+        # Фильтр по типу анализа и выборка пациентов без анализа определенного типа
+        "CREATE INDEX IF NOT EXISTS idx_analysis_results_type_patient "
+        "ON analysis_results(analysis_type_id, patient_id)",
+        # Расписание врача (get_doctor_schedule, DoctorWindow.load_schedule)
+        "CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date "
+        "ON appointments(doctor_id, appointment_date)",
+        # Записи пациента на прием (фильтр по пациенту в AdminWindow)
+        "CREATE INDEX IF NOT EXISTS idx_appointments_patient_date "
+        "ON appointments(patient_id, appointment_date)",
+        # Рецепты врача (DoctorWindow.load_prescriptions)
+        "CREATE INDEX IF NOT EXISTS idx_prescriptions_doctor_issue_date "
+        "ON prescriptions(doctor_id, issue_date)",
+        # Лекарства рецепта (get_prescription_medications)
+        "CREATE INDEX IF NOT EXISTS idx_prescription_medications_prescription "
+        "ON prescription_medications(prescription_id)",
+        # Поиск врача по пользователю (get_doctor_by_user_id, удаление пользователя)
+        "CREATE INDEX IF NOT EXISTS idx_doctors_user "
+        "ON doctors(user_id)",
+        # Списки пациентов, отсортированные по ФИО
+        "CREATE INDEX IF NOT EXISTS idx_patients_full_name "
+        "ON patients(full_name)",
+    ]),
+    (2, "Единый формат даты и времени, индексы для фильтров по периоду",
+     _datetime_normalization_statements() + [
+        # Фильтр по периоду без пациента/врача (списки и статистика администратора)
+        "CREATE INDEX IF NOT EXISTS idx_analysis_results_result_date "
+        "ON analysis_results(result_date)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_appointment_date "
+        "ON appointments(appointment_date)",
+        # Новые пациенты за период (статистика)
+        "CREATE INDEX IF NOT EXISTS idx_patients_created_at "
+        "ON patients(created_at)",
+    ]),
+    (3, "Индекс рецептов пациента", [
+        "CREATE INDEX IF NOT EXISTS idx_prescriptions_patient "
+        "ON prescriptions(patient_id)",
+    ]),
+    (4, "Индексы для сортировки списка результатов анализов", [
+        # Сортировка по типу анализа и по статусу (AnalysisResultsWidget):
+        # внутри значения строки идут по дате, как в ключе постраничной выборки
+        "CREATE INDEX IF NOT EXISTS idx_analysis_results_type_date "
+        "ON analysis_results(analysis_type_id, result_date)",
+        "CREATE INDEX IF NOT EXISTS idx_analysis_results_status_date "
+        "ON analysis_results(status, result_date)",
+        # Сортировка по названию типа анализа и по ФИО лаборанта
+        "CREATE INDEX IF NOT EXISTS idx_analysis_types_name "
+        "ON analysis_types(name)",
+        "CREATE INDEX IF NOT EXISTS idx_users_full_name "
+        "ON users(full_name)",
+    ]),
+    (5, "Полнотекстовый индекс поиска пациентов", _patients_search_statements(with_name_key=False)),
+    (6, "Общий полнотекстовый индекс: пациенты, примечания записей, результаты анализов",
+     _search_index_statements(with_digits_column=False)),
+    (7, "Ключи нечеткого поиска по ФИО в индексе поиска пациентов", _rebuild_patients_search_statements()),
+    (8, "Журнал изменений для обновления открытых списков на других рабочих местах",
+     _change_log_statements()),
+    (9, "Ежедневные сводки для статистики администратора", _stats_rollup_statements([
+        'daily_patient_stats', 'daily_analysis_stats', 'daily_appointment_stats', 'user_role_stats',
+    ])),
+    (10, "Сводки нагрузки врачей и лаборантов и срока выполнения анализов",
+     _stats_rollup_statements(['daily_doctor_appointment_stats', 'daily_lab_stats'])
+     + _turnaround_statements()),
+    (11, "Цифры телефона пациента в отдельном столбце индекса глобального поиска", [
+        # Индекс пересоздается целиком и заполняется заново из таблиц
+        f"DROP TRIGGER IF EXISTS trg_{table}_search_index_{suffix}"
+        for table in SEARCH_SCOPES for suffix in ('ins', 'del', 'upd')
+    ] + ["DROP TABLE IF EXISTS search_index"] + _search_index_statements()),
+    (12, "Замена безударных е/и в ключах нечеткого поиска по ФИО", _rebuild_patients_search_statements()),
+]
+
+# Последняя версия схемы, известная приложению
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+
+# Профили подключения: набор PRAGMA, применяемых сразу после открытия соединения,
+# и политика контрольных точек WAL. Профиль выбирается параметром connect(profile=...)
+# или переменной окружения MED_CENTER_DB_PROFILE.
+#   pragmas             - (имя, значение) в порядке применения
+#   checkpoint_on_close - режим PRAGMA wal_checkpoint при закрытии соединения (None - не выполнять)
+#   durability          - компромисс между надежностью и скоростью
+CONNECTION_PROFILES = {
+    'shared': {
+        'description': "Журнал отката; для базы на сетевом диске, к которой подключаются несколько рабочих мест",
+        'durability': "Зафиксированная транзакция переживает сбой питания и ОС. "
+                      "Во время фиксации читатели ждут (до busy_timeout), WAL не используется, "
+                      "так как он не работает через сетевые файловые системы.",
+        'pragmas': [
+            ('journal_mode', 'DELETE'),
+            ('synchronous', 'FULL'),
+            ('cache_size', -8000),       # ~8 МБ
+            ('mmap_size', 0),            # mmap небезопасен для файлов на сетевом диске
+            ('temp_store', 'MEMORY'),
+            ('busy_timeout', 10000),
+        ],
+        'checkpoint_on_close': None,
+    },
+    'wal': {
+        'description': "WAL; все процессы работают с базой на одном компьютере (локальный диск или терминальный сервер)",
+        'durability': "Читатели не блокируются пишущим. При synchronous=NORMAL сбой питания или ОС "
+                      "может отменить последние зафиксированные транзакции, но база остается целостной. "
+                      "Сбой самого приложения данных не теряет.",
+        'pragmas': [
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'NORMAL'),
+            ('cache_size', -16000),      # ~16 МБ
+            ('mmap_size', 64 * 1024 * 1024),
+            ('temp_store', 'MEMORY'),
+            ('busy_timeout', 5000),
+            ('wal_autocheckpoint', 1000),  # контрольная точка каждые ~1000 страниц WAL
+        ],
+        'checkpoint_on_close': 'TRUNCATE',
+    },
+    'wal_full': {
+        'description': "WAL с полной синхронизацией каждой фиксации",
+        'durability': "Как 'wal', но зафиксированная транзакция переживает сбой питания и ОС "
+                      "ценой fsync файла WAL на каждой фиксации.",
+        'pragmas': [
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'FULL'),
+            ('cache_size', -16000),
+            ('mmap_size', 64 * 1024 * 1024),
+            ('temp_store', 'MEMORY'),
+            ('busy_timeout', 5000),
+            ('wal_autocheckpoint', 1000),
+        ],
+        'checkpoint_on_close': 'TRUNCATE',
+    },
+    'bulk': {
+        'description': "Массовая загрузка и бенчмарки на локальной копии базы, один процесс",
+        'durability': "synchronous=OFF: сбой питания или ОС может повредить базу. "
+                      "Не использовать для рабочей базы.",
+        'pragmas': [
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'OFF'),
+            ('cache_size', -64000),      # ~64 МБ
+            ('mmap_size', 256 * 1024 * 1024),
+            ('temp_store', 'MEMORY'),
+            ('busy_timeout', 5000),
+            ('wal_autocheckpoint', 10000),
+        ],
+        'checkpoint_on_close': 'TRUNCATE',
+    },
+}
+
+# Профиль по умолчанию подходит для общей базы на сетевом диске
+DEFAULT_PROFILE = 'shared'
+
+
+_WRITTEN_TABLE_RE = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)'
+    r'\s+["`\[]?(\w+)',
+    re.IGNORECASE,
+)
+_READ_STATEMENT_RE = re.compile(r'^\s*(?:SELECT|EXPLAIN)\b', re.IGNORECASE)
+_READ_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+["`\[]?([A-Za-z_]\w*)', re.IGNORECASE)
+
+# Таблицы, которые триггеры изменяют вместе с таблицей (индексы поиска, журнал изменений, сводки)
+TRIGGER_WRITES = {
+    'patients': ('patients_search', 'search_index', 'change_log', 'daily_patient_stats'),
+    'appointments': ('search_index', 'change_log', 'daily_appointment_stats', 'daily_doctor_appointment_stats'),
+    'analysis_results': ('search_index', 'change_log', 'daily_analysis_stats', 'daily_lab_stats',
+                         'result_turnaround', 'daily_turnaround_stats'),
+    'prescriptions': ('change_log',),
+    'users': ('change_log', 'user_role_stats'),
+    'doctors': ('change_log',),
+    'analysis_types': ('change_log',),
+    'medications': ('change_log',),
+}
+
+
+def written_tables(query):
+    """
+    Таблицы, которые изменяет оператор, вместе с изменяемыми его триггерами:
+    кортеж имен (пустой для чтения) или None, если таблицы определить нельзя
+    (DDL, PRAGMA, WITH ... INSERT)
+    """
+    match = _WRITTEN_TABLE_RE.match(query)
+    if match:
+        table = match.group(1).lower()
+        return (table,) + TRIGGER_WRITES.get(table, ())
+    if _READ_STATEMENT_RE.match(query):
+        return ()
+    return None
+
+
+def read_tables(query):
+    """Таблицы, из которых читает запрос (имена после FROM и JOIN)"""
+    return frozenset(table.lower() for table in _READ_TABLE_RE.findall(query))
+
+
+def _params_key(params):
+    """Параметры запроса в виде, пригодном для ключа кэша"""
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return tuple(sorted(params.items()))
+    return tuple(params)
+
+
+def _result_size(result):
+    """Оценка объема результата запроса в байтах (строки и значения)"""
+    rows = result if isinstance(result, list) else [result]
+    size = sys.getsizeof(rows)
+    for row in rows:
+        if row is None:
+            continue
+        values = row.values() if isinstance(row, dict) else row
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+    return size
+
+
+class ReferenceCache:
+    """
+    Кэш справочных данных процесса (врачи, типы анализов, лекарства)
+
+    Запись помнит версии таблиц, из которых она прочитана, и считается
+    устаревшей, как только версия любой из них изменилась. Версию таблицы
+    увеличивает запись в нее через execute_query, execute_returning или
+    execute_many (см. written_tables); изменения из других процессов
+    обнаруживаются по PRAGMA data_version и сбрасывают весь кэш.
+    Кэш общий для процесса, доступ к нему защищен блокировкой.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Таблица -> номер версии; при полном сбросе увеличивается поколение
+        self._versions = {}
+        self._generation = 0
+        # Ключ -> (версии таблиц при чтении, значение)
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, tables, load):
+        """Значение по ключу; при отсутствии или устаревании - load() с сохранением"""
+        with self._lock:
+            versions = self._current_versions(tables)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self.hits += 1
+                self._touch(key)
+                return entry[1]
+            self.misses += 1
+
+        # Версии взяты до чтения: запись во время load() сделает значение устаревшим
+        value = load()
+        with self._lock:
+            self._store(key, tables, versions, value)
+        return value
+
+    def invalidate(self, tables=None):
+        """Устаревание записей, прочитанных из tables (None - всех записей)"""
+        with self._lock:
+            if tables is None:
+                self._generation += 1
+                self._entries.clear()
+                return
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def stats(self):
+        """Число записей, попаданий и промахов"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _current_versions(self, tables):
+        return (self._generation,) + tuple(self._versions.get(table, 0) for table in tables)
+
+    def _touch(self, key):
+        """Обращение к записи (вызывается под блокировкой)"""
+
+    def _store(self, key, tables, versions, value):
+        """Сохранение записи (вызывается под блокировкой)"""
+        self._entries[key] = (versions, value)
+
+
+class QueryResultCache(ReferenceCache):
+    """
+    Кэш результатов запросов fetch_one/fetch_all (параметр cache=True)
+
+    Ключ - нормализованный текст запроса, параметры и представление строк;
+    таблицы запроса определяются по тексту (read_tables). Запись в любую
+    из них удаляет зависящие записи. Объем ограничен числом записей
+    и оценкой размера в байтах: при превышении вытесняются давно
+    использованные записи (LRU). Результат больше всего кэша не сохраняется.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, max_bytes=QUERY_CACHE_MAX_BYTES):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Ключ -> (версии таблиц, значение, таблицы, размер); порядок - от давно использованных
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    def invalidate(self, tables=None):
+        super().invalidate(tables)
+        with self._lock:
+            if tables is None:
+                self._bytes = 0
+                return
+            # Память устаревших записей освобождается сразу
+            changed = set(tables)
+            for key in [key for key, entry in self._entries.items() if not changed.isdisjoint(entry[2])]:
+                self._bytes -= self._entries.pop(key)[3]
+
+    def stats(self):
+        """Число записей, объем, попадания, промахи и вытеснения"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+    def _touch(self, key):
+        self._entries.move_to_end(key)
+
+    def _store(self, key, tables, versions, value):
+        size = _result_size(value)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[3]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (versions, value, tables, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted[3]
+            self.evictions += 1
+
+
+reference_cache = ReferenceCache()
+query_cache = QueryResultCache()
 
 
 class DatabaseConnection:
@@ -13,14 +976,30 @@ class DatabaseConnection:
         """Реализация паттерна Singleton для подключения к БД"""
         if cls._instance is None:
             cls._instance = super(DatabaseConnection, cls).__new__(cls)
-            cls._instance._connection = None
+            cls._instance._init_state()
         return cls._instance
 
-    def __init__(self):
-        """Инициализация подключения к БД"""
+    def _init_state(self):
+        """Начальное состояние соединения (общее для db и ReadConnection)"""
+        self._connection = None
+        # Глубина вложенности transaction(): фиксация только на внешнем уровне
+        self._transaction_depth = 0
+        # Таблицы, измененные в текущей транзакции (None - неизвестные таблицы)
+        self._transaction_tables = set()
+        # Имя профиля, примененного к текущему соединению
+        self._profile_name = None
+        self._query_stats = QueryStatistics() if QUERY_STATS_ENABLED else None
+        # Фабрики строк по имени представления и имя фабрики соединения
+        self._row_factories = {}
+        self._row_factory_name = None
+        # Последнее прочитанное PRAGMA data_version (изменения других процессов)
+        self._data_version = None
+        # Счетчик изменений базы для опроса журнала изменений (см. change_counter)
+        self._change_counter = 0
+        # Путь и статус задаются один раз: повторный вызов DatabaseConnection()
+        # в других модулях не должен сбрасывать db_path открытого соединения
         self.db_path = 'med_center.db'
         self.authorized = False
-
         # Статус подключения
         self.connected = False
 
@@ -28,8 +1007,13 @@ class DatabaseConnection:
         """Проверка пароля для доступа к базе данных"""
         return password == self._db_password
 
-    def connect(self, password=None):
-        """Установка соединения с базой данных"""
+    def connect(self, password=None, profile=None, row_factory=None):
+        """Установка соединения с базой данных.
+
+        profile - имя профиля из CONNECTION_PROFILES, применяется при открытии соединения.
+        row_factory - представление строк результата из ROW_FACTORY_NAMES
+        (по умолчанию DEFAULT_ROW_FACTORY).
+        """
         # Если пароль не передан, используем пароль по умолчанию
         if password is None:
             password = self._db_password
@@ -37,45 +1021,104 @@ class DatabaseConnection:
         # Проверка пароля при первом подключении
         if not self.authorized:
             if not self.verify_password(password):
-                print("Неверный пароль для доступа к базе данных")
+                logger.warning("Неверный пароль для доступа к базе данных")
                 return False
             self.authorized = True
 
-        # Если уже авторизованы или пароль верный
-        if self.authorized:
-            try:
-                # Проверка существования файла базы данных
-                db_exists = os.path.exists(self.db_path)
-                print(f"Файл базы данных {'существует' if db_exists else 'не существует'}")
-
-                if self._connection is None:
-                    self._connection = sqlite3.connect(self.db_path)
-                    self._connection.row_factory = self._dict_factory
-                    self.connected = True
-                    print("Подключение к базе данных установлено")
-
-                    # Создаем таблицы если они не существуют
-                    self._initialize_database()
-
-                    # Если файл базы данных не существовал, то создаем тестовые данные
-                    if not db_exists:
-                        print("Создание тестовых данных...")
-                        self._create_test_data(force=True)
-                return True
-            except sqlite3.Error as e:
-                self.connected = False
-                print(f"Ошибка подключения к базе данных: {e}")
-                return False
-        else:
-            print("Необходима авторизация для доступа к базе данных")
+        # Соединение уже открыто
+        if self._connection is not None:
+            return True
+
+        try:
+            # Проверка существования файла базы данных
+            db_exists = os.path.exists(self.db_path)
+            logger.info("Файл базы данных %s %s", self.db_path, 'существует' if db_exists else 'не существует')
+
+            self._connection = sqlite3.connect(self.db_path)
+            self.set_row_factory(row_factory or DEFAULT_ROW_FACTORY)
+            self._register_functions()
+            self.connected = True
+            logger.info("Подключение к базе данных установлено")
+
+            # Настройки соединения применяются до любых записей в базу
+            self._apply_profile(profile)
+
+            # Создаем таблицы если они не существуют
+            self._initialize_database()
+            self._prune_change_log()
+
+            # Если файл базы данных не существовал, то создаем тестовые данные
+            if not db_exists:
+                logger.info("Создание тестовых данных")
+                self._create_test_data(force=True)
+            return True
+        except sqlite3.Error as e:
+            self.connected = False
+            logger.error("Ошибка подключения к базе данных: %s", e)
             return False
 
-    def _dict_factory(self, cursor, row):
-        """Конвертирует строку результата в словарь"""
-        d = {}
-        for idx, col in enumerate(cursor.description):
-            d[col[0]] = row[idx]
-        return d
+    def _apply_profile(self, profile=None):
+        """Применение профиля подключения (PRAGMA-настройки соединения)"""
+        name = profile or os.environ.get('MED_CENTER_DB_PROFILE') or DEFAULT_PROFILE
+        if name not in CONNECTION_PROFILES:
+            logger.warning("Неизвестный профиль подключения '%s', используется '%s'", name, DEFAULT_PROFILE)
+            name = DEFAULT_PROFILE
+
+        for pragma, value in CONNECTION_PROFILES[name]['pragmas']:
+            try:
+                # Имена и значения PRAGMA берутся только из CONNECTION_PROFILES
+                self._connection.execute(f"PRAGMA {pragma} = {value}")
+            except sqlite3.Error as e:
+                # Например, journal_mode нельзя сменить, пока базу держат другие процессы
+                logger.warning("Не удалось применить PRAGMA %s = %s: %s", pragma, value, e)
+
+        self._profile_name = name
+        logger.info("Профиль подключения: %s (journal_mode=%s)", name, self.get_pragma('journal_mode'))
+
+    def get_pragma(self, name):
+        """Текущее значение PRAGMA для открытого соединения"""
+        row = self._connection.execute(f"PRAGMA {name}").fetchone()
+        # Имя столбца результата не всегда совпадает с именем PRAGMA (busy_timeout -> timeout)
+        return next(iter(row.values())) if row else None
+
+    def get_connection_settings(self):
+        """Профиль и фактические значения PRAGMA текущего соединения"""
+        if self._connection is None:
+            return {}
+        settings = {'profile': self._profile_name, 'row_factory': self._row_factory_name}
+        for pragma, _ in CONNECTION_PROFILES[self._profile_name]['pragmas']:
+            settings[pragma] = self.get_pragma(pragma)
+        return settings
+
+    def checkpoint(self, mode='PASSIVE'):
+        """Контрольная точка WAL: перенос страниц из журнала WAL в файл базы"""
+        if self._connection is None or self.get_pragma('journal_mode') != 'wal':
+            return None
+        if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"Неизвестный режим контрольной точки: {mode}")
+        # busy, страниц в WAL, страниц перенесено
+        return tuple(self._connection.execute(f"PRAGMA wal_checkpoint({mode})").fetchone().values())
+
+    def _register_functions(self):
+        """Регистрация SQL-функций приложения в соединении"""
+        self._connection.create_function('casefold', 1, _casefold, deterministic=True)
+
+    def _get_row_factory(self, name):
+        """Фабрика строк результата по имени представления (создается один раз)"""
+        factory = self._row_factories.get(name)
+        if factory is None:
+            if name not in ROW_FACTORY_NAMES:
+                raise ValueError(f"Неизвестное представление строк: {name}")
+            factory = self._row_factories[name] = make_row_factory(name)
+        return factory
+
+    def set_row_factory(self, name):
+        """Выбор представления строк результата для всех запросов соединения"""
+        if name not in ROW_FACTORY_NAMES:
+            logger.warning("Неизвестное представление строк '%s', используется 'dict'", name)
+            name = 'dict'
+        self._connection.row_factory = self._get_row_factory(name)
+        self._row_factory_name = name
 
     def _initialize_database(self):
         """Инициализация базы данных (создание таблиц)"""
@@ -197,15 +1240,55 @@ class DatabaseConnection:
             )
             ''')
 
+            self._connection.commit()
+
+            # Приводим схему к актуальной версии (индексы и т.д.)
+            self._apply_migrations()
+
             # Создаем тестовые данные, если таблицы были пустыми
             self._create_test_data()
 
             self._connection.commit()
 
         except sqlite3.Error as e:
-            print(f"Ошибка при инициализации базы данных: {e}")
+            logger.error("Ошибка при инициализации базы данных: %s", e)
             self._connection.rollback()
 
+    def get_schema_version(self):
+        """Получение текущей версии схемы базы данных (PRAGMA user_version)"""
+        cursor = self._connection.cursor()
+        cursor.execute("PRAGMA user_version")
+        return cursor.fetchone()['user_version']
+
+    def _apply_migrations(self):
+        """Применение миграций схемы, версия которых больше текущей версии базы"""
+        current_version = self.get_schema_version()
+
+        if current_version > SCHEMA_VERSION:
+            logger.warning("Версия схемы базы данных (%s) новее версии приложения (%s)",
+                           current_version, SCHEMA_VERSION)
+            return
+
+        cursor = self._connection.cursor()
+        for version, description, statements in SCHEMA_MIGRATIONS:
+            if version <= current_version:
+                continue
+
+            logger.info("Применение миграции %s: %s", version, description)
+            try:
+                # Каждая миграция выполняется атомарно вместе с обновлением версии
+                cursor.execute("BEGIN")
+                for statement in statements:
+                    cursor.execute(statement)
+                # PRAGMA не поддерживает параметры, версия - целое число из кода
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                self._connection.commit()
+            except sqlite3.Error:
+                self._connection.rollback()
+                raise
+
+            current_version = version
+
     def _create_test_data(self, force=False):
         """Создание тестовых данных, если они не существуют"""
         # Проверяем, есть ли пользователи
@@ -415,22 +1498,244 @@ class DatabaseConnection:
     def disconnect(self):
         """Закрытие соединения с базой данных"""
         if self._connection:
+            try:
+                # Обновление статистики планировщика для индексов, которые использовались в сессии
+                self._connection.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                logger.warning("Не удалось обновить статистику индексов: %s", e)
+
+            checkpoint_mode = CONNECTION_PROFILES.get(self._profile_name, {}).get('checkpoint_on_close')
+            if checkpoint_mode:
+                try:
+                    # Перенос WAL в основной файл, чтобы журнал не рос между сеансами
+                    self.checkpoint(checkpoint_mode)
+                except sqlite3.Error as e:
+                    logger.warning("Не удалось выполнить контрольную точку WAL: %s", e)
             self._connection.close()
             self._connection = None
             self.connected = False
-            print("Соединение с базой данных закрыто")
+            self._data_version = None
+            reference_cache.invalidate()
+            query_cache.invalidate()
+            logger.info("Соединение с базой данных закрыто")
+
+    def in_transaction(self):
+        """Выполняется ли сейчас блок transaction()"""
+        return self._transaction_depth > 0
+
+    @contextmanager
+    def transaction(self):
+        """Единица работы: все запросы внутри блока фиксируются одним COMMIT.
+
+        При исключении внутри блока все изменения откатываются, а исключение
+        передается дальше. Вложенные блоки входят во внешнюю транзакцию.
+        """
+        if self._transaction_depth == 0:
+            connection = self._get_connection()
+            if connection is None:
+                raise sqlite3.OperationalError("Нет подключения к базе данных")
+            # IMMEDIATE сразу берет блокировку на запись, чтобы транзакция
+            # не завершилась ошибкой SQLITE_BUSY на середине
+            connection.execute("BEGIN IMMEDIATE")
+            self._transaction_tables = set()
+
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._connection.rollback()
+                # Внутри транзакции в кэши могли попасть отмененные изменения
+                reference_cache.invalidate()
+                query_cache.invalidate()
+                logger.warning("Транзакция отменена")
+            raise
+        else:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._connection.commit()
+                # До COMMIT другие соединения (ReadConnection) еще читали прежние
+                # данные и могли сохранить их в кэше под новыми версиями таблиц
+                tables = self._transaction_tables
+                if tables is None or tables:
+                    reference_cache.invalidate(tables)
+                    query_cache.invalidate(tables)
+
+    def _get_connection(self):
+        """Открытое соединение; быстрый путь - только проверка сохраненного объекта"""
+        connection = self._connection
+        if connection is None and self.connect():
+            connection = self._connection
+        return connection
+
+    def _record_query(self, query, params, started, rows):
+        """Учет выполненного запроса: статистика оператора, журнал медленных запросов и план"""
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = self._query_stats.record(query, elapsed_ms, rows) if self._query_stats else None
+
+        if elapsed_ms >= SLOW_QUERY_THRESHOLD_MS:
+            _log_slow_query(query, params, elapsed_ms)
+            # План медленного оператора сохраняется один раз
+            if stats is not None and stats.plan is None:
+                self._capture_plan(stats, query, params)
+
+    def _capture_plan(self, stats, query, params):
+        """Сохранение EXPLAIN QUERY PLAN оператора в статистике"""
+        if query.lstrip().split(None, 1)[0].upper() not in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE'):
+            return
+        try:
+            rows = self._connection.execute(f"EXPLAIN QUERY PLAN {query}", params or ()).fetchall()
+            self._query_stats.set_plan(stats, [row['detail'] for row in rows])
+        except sqlite3.Error as e:
+            logger.debug("Не удалось получить план запроса: %s", e)
+
+    def stats(self):
+        """Статистика выполнения SQL-операторов с момента запуска или сброса"""
+        return {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'since': self._query_stats.started_at if self._query_stats else None,
+            'slow_query_threshold_ms': SLOW_QUERY_THRESHOLD_MS,
+            'db_path': self.db_path,
+            'connection': self.get_connection_settings(),
+            'statements': self._query_stats.snapshot() if self._query_stats else [],
+            'reference_cache': reference_cache.stats(),
+            'query_cache': query_cache.stats(),
+        }
+
+    def reset_stats(self):
+        """Сброс статистики выполнения SQL-операторов"""
+        if self._query_stats:
+            self._query_stats.reset()
+
+    def dump_stats(self, path):
+        """Сохранение статистики выполнения запросов в JSON-файл"""
+        dump_stats_json(self.stats(), path)
+        logger.info("Статистика запросов сохранена в %s", path)
+
+    def cached(self, key, tables, load):
+        """
+        Справочные данные из кэша процесса (reference_cache)
+
+        key - ключ записи, tables - таблицы, из которых читает load().
+        load() выполняется, если записи нет или эти таблицы изменились
+        после чтения - в этом процессе или другими процессами.
+        Возвращаемые строки общие для всех вызовов и не должны изменяться.
+        """
+        if not REFERENCE_CACHE_ENABLED:
+            return load()
+        self._check_data_version()
+        return reference_cache.get(key, tables, load)
+
+    def cached_result(self, key, tables, load):
+        """
+        Результат вычисления load() по таблицам tables из кэша результатов
+        запросов (query_cache): для данных, которые строятся из нескольких
+        запросов (например, ряды графиков). Устаревает так же, как результаты
+        fetch_one/fetch_all с cache=True; возвращаемое значение не должно изменяться.
+        """
+        if not QUERY_CACHE_ENABLED:
+            return load()
+        self._check_data_version()
+        return query_cache.get(key, frozenset(tables), load)
+
+    def _data_version_changed(self):
+        """Изменило ли базу другое соединение после предыдущей проверки (PRAGMA data_version)"""
+        connection = self._connection or self._get_connection()
+        if connection is None:
+            return False
+        try:
+            version = self._execute_read(connection, "PRAGMA data_version", None, 'tuple').fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning("Не удалось прочитать PRAGMA data_version: %s", e)
+            version = None
+        # data_version меняется только после фиксации изменений другими соединениями
+        changed = version is None or version != self._data_version
+        self._data_version = version
+        return changed
+
+    def _check_data_version(self):
+        """Сброс кэшей, если базу изменило другое соединение"""
+        if self._data_version_changed():
+            self._change_counter += 1
+            reference_cache.invalidate()
+            query_cache.invalidate()
+
+    def _tables_written(self, query):
+        """Устаревание записей кэшей после записи в таблицы запроса"""
+        tables = written_tables(query)
+        if tables != ():
+            self._change_counter += 1
+            reference_cache.invalidate(tables)
+            query_cache.invalidate(tables)
+            # Внутри transaction() записи кэшей сбрасываются еще раз после COMMIT
+            if self._transaction_depth and self._transaction_tables is not None:
+                if tables is None:
+                    self._transaction_tables = None
+                else:
+                    self._transaction_tables.update(tables)
+
+    def change_counter(self):
+        """
+        Счетчик изменений базы: растет после записи через это соединение и после
+        фиксации изменений другими соединениями и процессами (PRAGMA data_version)
+
+        Проверка стоит одного PRAGMA, поэтому журнал изменений имеет смысл читать,
+        только когда значение счетчика изменилось.
+        """
+        self._check_data_version()
+        return self._change_counter
+
+    def _prune_change_log(self):
+        """Удаление записей журнала изменений, кроме последних CHANGE_LOG_MAX_ENTRIES"""
+        try:
+            last_seq = self.get_last_change_seq()
+            if last_seq > CHANGE_LOG_MAX_ENTRIES:
+                # Условие по первичному ключу: удаляется только начало журнала
+                self._connection.execute("DELETE FROM change_log WHERE seq <= ?",
+                                         (last_seq - CHANGE_LOG_MAX_ENTRIES,))
+                self._connection.commit()
+        except sqlite3.Error as e:
+            # Например, база занята другим рабочим местом: очистка будет при следующем подключении
+            logger.warning("Не удалось очистить журнал изменений: %s", e)
+
+    def get_last_change_seq(self):
+        """Номер последней записи журнала изменений (0 - записей еще не было)"""
+        # Последний выданный номер хранится в sqlite_sequence и после очистки журнала
+        row = self.fetch_one("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+        return row['seq'] if row else 0
+
+    def get_changes(self, after_seq, limit=CHANGE_BATCH_SIZE):
+        """
+        Записи журнала изменений после after_seq по порядку (не более limit)
+
+        Возвращает (записи, complete): complete=False, если записи после after_seq
+        уже удалены очисткой журнала и изменения нельзя восстановить по журналу.
+        """
+        changes = self.fetch_all(
+            "SELECT seq, table_name, row_id, operation FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+            (after_seq, limit)
+        )
+        first = self.fetch_one("SELECT MIN(seq) AS seq FROM change_log")
+        complete = first is None or first['seq'] is None or first['seq'] <= after_seq + 1
+        return changes, complete
 
     def execute_query(self, query, params=None):
         """Выполнение SQL-запроса"""
-        if not self.connect():
+        connection = self._get_connection()
+        if connection is None:
             return None
 
+        logger.debug("Выполнение запроса: %s", query)
         try:
-            cursor = self._connection.cursor()
-            print(f"Выполнение запроса: {query}")
-            print(f"Параметры: {params}")
+            started = time.perf_counter()
+            cursor = connection.cursor()
             cursor.execute(query, params or ())
-            self._connection.commit()
+            # Внутри transaction() фиксация выполняется при выходе из блока
+            if not self._transaction_depth:
+                connection.commit()
+            self._record_query(query, params, started, max(cursor.rowcount, 0))
+            self._tables_written(query)
             # Для INSERT возвращаем lastrowid, для UPDATE/DELETE возвращаем rowcount
             cmd = query.strip().split()[0].lower()
             if cmd == 'insert':
@@ -438,16 +1743,70 @@ class DatabaseConnection:
             else:
                 return cursor.rowcount
         except sqlite3.Error as e:
-            self._connection.rollback()
-            print(f"Ошибка выполнения запроса: {e}")
-            print(f"Запрос: {query}")
-            print(f"Параметры: {params}")
+            logger.error("Ошибка выполнения запроса: %s; запрос: %s; параметры: %s",
+                         e, _compact_sql(query), _params_for_log(query, params))
+            if self._transaction_depth:
+                # Ошибка прерывает всю транзакцию, откат выполнит transaction()
+                raise
+            connection.rollback()
+            return None
+
+    def execute_returning(self, query, params=None):
+        """
+        Выполнение INSERT/UPDATE/DELETE ... RETURNING
+
+        Возвращает строки RETURNING (пустой список, если запрос не затронул строк)
+        или None при ошибке. Строки читаются до фиксации, поэтому измененные
+        значения не нужно выбирать отдельным запросом.
+        """
+        connection = self._get_connection()
+        if connection is None:
+            return None
+
+        logger.debug("Выполнение запроса: %s", query)
+        try:
+            started = time.perf_counter()
+            rows = connection.execute(query, params or ()).fetchall()
+            if not self._transaction_depth:
+                connection.commit()
+            self._record_query(query, params, started, len(rows))
+            self._tables_written(query)
+            return rows
+        except sqlite3.Error as e:
+            logger.error("Ошибка выполнения запроса: %s; запрос: %s; параметры: %s",
+                         e, _compact_sql(query), _params_for_log(query, params))
+            if self._transaction_depth:
+                raise
+            connection.rollback()
+            return None
+
+    def execute_many(self, query, params_list):
+        """Выполнение одного SQL-запроса для набора параметров (пакетная запись)"""
+        connection = self._get_connection()
+        if connection is None:
+            return None
+
+        logger.debug("Пакетное выполнение запроса: %s", query)
+        try:
+            started = time.perf_counter()
+            cursor = connection.cursor()
+            cursor.executemany(query, params_list)
+            if not self._transaction_depth:
+                connection.commit()
+            self._record_query(query, None, started, max(cursor.rowcount, 0))
+            self._tables_written(query)
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error("Ошибка пакетного выполнения запроса: %s; запрос: %s", e, _compact_sql(query))
+            if self._transaction_depth:
+                raise
+            connection.rollback()
             return None
 
     def get_all_medications(self):
-        """Получение всех лекарств"""
+        """Получение всех лекарств (из кэша справочников)"""
         query = "SELECT * FROM medications"
-        return self.fetch_all(query)
+        return self.cached('medications', ('medications',), lambda: self.fetch_all(query))
 
     def add_medication(self, name, description=None):
         """Добавление нового лекарства"""
@@ -470,6 +1829,24 @@ class DatabaseConnection:
         """
         return self.execute_query(query, (prescription_id, medication_id, dosage, instructions))
 
+    def add_prescription_with_medications(self, doctor_id, patient_id, issue_date, medications):
+        """Добавление рецепта вместе с лекарствами одной транзакцией.
+
+        medications - список кортежей (medication_id, dosage, instructions).
+        Возвращает ID рецепта; при ошибке ничего не сохраняется и исключение передается дальше.
+        """
+        with self.transaction():
+            prescription_id = self.add_prescription(doctor_id, patient_id, issue_date)
+            self.execute_many(
+                """
+                INSERT INTO prescription_medications (prescription_id, medication_id, dosage, instructions)
+                VALUES (?, ?, ?, ?)
+                """,
+                [(prescription_id, medication_id, dosage, instructions)
+                 for medication_id, dosage, instructions in medications]
+            )
+        return prescription_id
+
     def get_prescription_medications(self, prescription_id):
         """Получение всех лекарств для рецепта"""
         query = """
@@ -480,56 +1857,235 @@ class DatabaseConnection:
         """
         return self.fetch_all(query, (prescription_id,))
 
-    def fetch_one(self, query, params=None):
-        """Получение одной записи из базы данных"""
-        if not self.connect():
+    def get_medications_by_prescription(self, prescription_ids):
+        """
+        Лекарства нескольких рецептов одним запросом: {id рецепта: [лекарства]}
+
+        Заменяет вызов get_prescription_medications для каждого рецепта списка.
+        Идентификаторы передаются одним параметром (JSON-массив), поэтому текст
+        запроса не зависит от их количества.
+        """
+        prescription_ids = list(prescription_ids)
+        medications = {prescription_id: [] for prescription_id in prescription_ids}
+        if not prescription_ids:
+            return medications
+
+        query = """
+        SELECT pm.*, m.name as medication_name
+        FROM prescription_medications pm
+        JOIN medications m ON pm.medication_id = m.id
+        WHERE pm.prescription_id IN (SELECT value FROM json_each(?))
+        ORDER BY pm.prescription_id, pm.id
+        """
+        for medication in self.fetch_all(query, (json.dumps(prescription_ids),)):
+            medications[medication['prescription_id']].append(medication)
+        return medications
+
+    def get_doctor_prescriptions_page(self, doctor_id, after=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Страница рецептов врача (новые сверху) вместе с пациентом и лекарствами
+
+        Два запроса на страницу вместо запроса лекарств для каждого рецепта.
+        Возвращает (рецепты, ключ следующей страницы) как fetch_page; рецепт -
+        словарь со списком лекарств в 'medications'.
+        """
+        query = """
+        SELECT p.*, pt.full_name as patient_name, pt.birth_date as patient_birth_date
+        FROM prescriptions p
+        JOIN patients pt ON p.patient_id = pt.id
+        WHERE p.doctor_id = ?
+        """
+        prescriptions, next_after = self.fetch_page(query, ('issue_date', 'id'), after=after, limit=limit,
+                                                    params=(doctor_id,), descending=True)
+        medications = self.get_medications_by_prescription(prescription['id'] for prescription in prescriptions)
+        rows = []
+        for prescription in prescriptions:
+            row = dict(prescription.items())
+            row['medications'] = medications[prescription['id']]
+            rows.append(row)
+        return rows, next_after
+
+    def _execute_read(self, connection, query, params, row_factory):
+        """Выполнение запроса на чтение; row_factory переопределяет представление строк соединения"""
+        if row_factory is None:
+            return connection.execute(query, params or ())
+        cursor = connection.cursor()
+        cursor.row_factory = self._get_row_factory(row_factory)
+        return cursor.execute(query, params or ())
+
+    def fetch_one(self, query, params=None, row_factory=None, cache=False):
+        """
+        Получение одной записи из базы данных
+
+        cache=True - результат запоминается в кэше результатов запросов (query_cache)
+        и берется из него, пока таблицы запроса не изменялись.
+        """
+        connection = self._connection or self._get_connection()
+        if connection is None:
             return None
 
         try:
-            cursor = self._connection.cursor()
-            cursor.execute(query, params or ())
-            return cursor.fetchone()
+            if cache:
+                return self._cached_read(self._read_one, connection, query, params, row_factory)
+            return self._read_one(connection, query, params, row_factory)
         except sqlite3.Error as e:
-            print(f"Ошибка выполнения запроса: {e}")
+            logger.error("Ошибка выполнения запроса: %s; запрос: %s", e, _compact_sql(query))
             return None
 
-    def fetch_all(self, query, params=None):
-        """Получение всех записей из базы данных"""
-        if not self.connect():
+    def fetch_all(self, query, params=None, row_factory=None, cache=False):
+        """
+        Получение всех записей из базы данных
+
+        row_factory - представление строк для этого запроса ('dict', 'row', 'namedtuple',
+        'tuple'); для больших выборок компактные представления экономят память и время.
+        cache=True - как у fetch_one; строки результата общие для всех вызовов
+        и не должны изменяться.
+        """
+        connection = self._connection or self._get_connection()
+        if connection is None:
             return []
 
         try:
-            cursor = self._connection.cursor()
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
+            if cache:
+                return list(self._cached_read(self._read_all, connection, query, params, row_factory))
+            return self._read_all(connection, query, params, row_factory)
         except sqlite3.Error as e:
-            print(f"Ошибка выполнения запроса: {e}")
+            logger.error("Ошибка выполнения запроса: %s; запрос: %s", e, _compact_sql(query))
             return []
 
+    def _read_one(self, connection, query, params, row_factory):
+        started = time.perf_counter()
+        row = self._execute_read(connection, query, params, row_factory).fetchone()
+        self._record_query(query, params, started, 0 if row is None else 1)
+        return row
+
+    def _read_all(self, connection, query, params, row_factory):
+        started = time.perf_counter()
+        rows = self._execute_read(connection, query, params, row_factory).fetchall()
+        self._record_query(query, params, started, len(rows))
+        return rows
+
+    def _cached_read(self, read, connection, query, params, row_factory):
+        """Результат read() из кэша результатов запросов; ошибка чтения не кэшируется"""
+        key = (read.__name__, _compact_sql(query), _params_key(params), row_factory or self._row_factory_name)
+        if not QUERY_CACHE_ENABLED:
+            return read(connection, query, params, row_factory)
+        try:
+            hash(key)
+        except TypeError:
+            return read(connection, query, params, row_factory)
+        self._check_data_version()
+        return query_cache.get(key, read_tables(query),
+                               lambda: read(connection, query, params, row_factory))
+
+    def fetch_page(self, query, order_key, after=None, limit=DEFAULT_PAGE_SIZE, params=None,
+                   descending=False, row_factory=None, cache=False):
+        """
+        Постраничная выборка по ключу (keyset pagination)
+
+        query - SELECT без ORDER BY и LIMIT (условия WHERE допускаются);
+        order_key - имя столбца результата или кортеж имен, последний столбец уникален
+        и NOT NULL (обычно id); NULL в остальных столбцах идут раньше любых значений,
+        как в ORDER BY (см. keyset_page_parts);
+        after - ключ последней строки предыдущей страницы (None - первая страница).
+
+        Возвращает (строки, ключ для следующей страницы или None, если страница последняя).
+        Следующая страница начинается поиском по индексу, поэтому время выборки
+        не зависит от номера страницы и размера таблицы.
+        cache=True - страницы запоминаются в кэше результатов запросов (см. fetch_all).
+        """
+        keys = (order_key,) if isinstance(order_key, str) else tuple(order_key)
+        parts = [(None, [])] if after is None else keyset_page_parts(keys, after, descending)
+        rows = []
+        for condition, condition_params in parts:
+            # Лишняя строка показывает, есть ли следующая страница
+            page_params = [*(params or ()), *condition_params, limit + 1 - len(rows)]
+            rows += self.fetch_all(keyset_page_query(query, keys, descending, condition), page_params,
+                                   row_factory, cache=cache)
+            if len(rows) > limit:
+                break
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, tuple(rows[-1][key] for key in keys)
+
+    def fetch_changed_rows(self, query, column, ids, params=None, row_factory=None):
+        """
+        Строки выборки query (как у fetch_page), у которых столбец column входит в ids
+
+        Текущие версии измененных записей для обновления загруженного списка без
+        повторной выборки: удаленные и переставшие подходить под условия записи
+        в результат не попадают. Выборка начинается со списка ids, поэтому для
+        столбца с id записи каждая строка находится по первичному ключу.
+        """
+        if not _ORDER_KEY_RE.match(column):
+            raise ValueError(f"Недопустимое имя столбца: {column}")
+        changed_query = (f"SELECT changed.* FROM json_each(?) AS changed_ids "
+                         f"CROSS JOIN ({query}) AS changed ON changed.{column} = changed_ids.value")
+        return self.fetch_all(changed_query, [json.dumps(sorted(ids))] + list(params or ()), row_factory)
+
+    def iter_rows(self, query, params=None, batch_size=DEFAULT_BATCH_SIZE, row_factory=None):
+        """
+        Потоковая выборка для экспорта и пакетной обработки
+
+        Строки читаются из курсора пачками по batch_size (fetchmany), в памяти
+        одновременно находится не больше одной пачки. Пока итерация не завершена,
+        открыта транзакция чтения: в режиме журнала отката запись в базу ждет ее
+        окончания, поэтому результат следует обрабатывать сразу.
+        Ошибка базы данных записывается в журнал и передается вызывающему коду,
+        чтобы экспорт не завершился молча с неполными данными.
+        """
+        connection = self._connection or self._get_connection()
+        if connection is None:
+            return
+
+        # В статистику попадает время работы SQLite, без обработки строк вызывающим кодом
+        db_seconds = 0.0
+        rows_read = 0
+        cursor = None
+        try:
+            started = time.perf_counter()
+            cursor = self._execute_read(connection, query, params, row_factory)
+            db_seconds += time.perf_counter() - started
+            while True:
+                started = time.perf_counter()
+                batch = cursor.fetchmany(batch_size)
+                db_seconds += time.perf_counter() - started
+                if not batch:
+                    break
+                rows_read += len(batch)
+                yield from batch
+        except sqlite3.Error as e:
+            logger.error("Ошибка выполнения запроса: %s; запрос: %s", e, _compact_sql(query))
+            raise
+        finally:
+            if cursor is not None:
+                cursor.close()
+                self._record_query(query, params, time.perf_counter() - db_seconds, rows_read)
+
     # Методы для работы с пользователями
     def authenticate_user(self, username, password):
         """Аутентификация пользователя"""
-        print(f"Попытка аутентификации пользователя: {username}")
+        logger.info("Попытка аутентификации пользователя: %s", username)
         query = "SELECT * FROM users WHERE username = ? AND password = ? AND status = 'active'"
-        print(f"Выполнение запроса: {query} с параметрами: {username}, {password}")
 
         # Сначала проверим, есть ли такой пользователь вообще
         check_user = self.fetch_one("SELECT * FROM users WHERE username = ?", (username,))
         if not check_user:
-            print(f"Пользователь с логином {username} не найден в базе данных")
+            logger.info("Пользователь с логином %s не найден в базе данных", username)
             return None
 
         user = self.fetch_one(query, (username, password))
 
         if user:
-            print(f"Пользователь {username} успешно аутентифицирован")
+            logger.info("Пользователь %s успешно аутентифицирован", username)
             # Обновление времени последнего входа
             current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             update_query = "UPDATE users SET last_login = ? WHERE id = ?"
             self.execute_query(update_query, (current_time, user['id']))
             return user
         else:
-            print(f"Неверный пароль для пользователя {username}")
+            logger.info("Неверный пароль для пользователя %s", username)
             return None
 
     def get_all_users(self):
@@ -546,16 +2102,52 @@ class DatabaseConnection:
         return self.execute_query(query, (username, password, full_name, role, email))
 
     # Методы для работы с пациентами
-    def get_all_patients(self):
+    def get_all_patients(self, row_factory=None):
         """Получение всех пациентов"""
         query = "SELECT * FROM patients"
-        return self.fetch_all(query)
+        return self.fetch_all(query, row_factory=row_factory)
 
     def get_patient(self, patient_id):
         """Получение данных о конкретном пациенте"""
         query = "SELECT * FROM patients WHERE id = ?"
         return self.fetch_one(query, (patient_id,))
 
+    def find_patients(self, text, limit=DEFAULT_PATIENT_MATCHES, without_analysis_type_id=None):
+        """
+        Пациенты-кандидаты для строки поиска (не более limit)
+
+        Сначала идут точные совпадения (начала слов ФИО и email, цифры телефона),
+        затем найденные только по ключам нечеткого поиска ФИО (см. patient_search_match).
+        Обе выборки читаются из индекса patients_search по порядку id и
+        останавливаются на limit строках, поэтому время не зависит от того,
+        сколько всего пациентов подходит под строку. Результат - первые limit
+        подходящих пациентов по id, а не лучшие совпадения: пациенты не
+        ранжируются по близости к строке поиска.
+        without_analysis_type_id - только пациенты без анализов этого типа.
+        """
+        exact = search_match(text, phone_column='phone_digits')
+        if exact is None:
+            return []
+        query = """
+        SELECT p.*
+        FROM patients_search s
+        CROSS JOIN patients p ON p.id = s.rowid
+        WHERE patients_search MATCH ?
+          AND s.rowid NOT IN (SELECT value FROM json_each(?))
+          AND (? IS NULL OR NOT EXISTS (
+              SELECT 1 FROM analysis_results ar
+              WHERE ar.analysis_type_id = ? AND ar.patient_id = p.id))
+        ORDER BY s.rowid
+        LIMIT ?
+        """
+        type_id = without_analysis_type_id
+        patients = self.fetch_all(query, (exact, '[]', type_id, type_id, limit))
+        fuzzy = patient_search_match(text)
+        if len(patients) < limit and fuzzy != exact:
+            found = json.dumps([patient['id'] for patient in patients])
+            patients += self.fetch_all(query, (fuzzy, found, type_id, type_id, limit - len(patients)))
+        return patients
+
     def add_patient(self, full_name, birth_date, gender=None, phone=None, email=None, address=None):
         """Добавление нового пациента"""
         query = """
@@ -580,14 +2172,15 @@ class DatabaseConnection:
 
     # Методы для работы с анализами
     def get_all_analysis_types(self):
-        """Получение всех типов анализов"""
+        """Получение всех типов анализов (из кэша справочников)"""
         query = "SELECT * FROM analysis_types"
-        return self.fetch_all(query)
+        return self.cached('analysis_types', ('analysis_types',), lambda: self.fetch_all(query))
 
     def get_analysis_type(self, analysis_id):
-        """Получение информации о конкретном типе анализа"""
+        """Получение информации о конкретном типе анализа (из кэша справочников)"""
         query = "SELECT * FROM analysis_types WHERE id = ?"
-        return self.fetch_one(query, (analysis_id,))
+        return self.cached(('analysis_type', analysis_id), ('analysis_types',),
+                           lambda: self.fetch_one(query, (analysis_id,)))
 
     def get_analysis_parameters(self, analysis_id):
         """Получение параметров анализа"""
@@ -668,16 +2261,32 @@ class DatabaseConnection:
         return self.execute_query(query, (doctor_id, patient_id, appointment_date, notes))
 
     def update_appointment_status(self, appointment_id, status):
-        """Обновление статуса записи на прием"""
-        query = "UPDATE appointments SET status = ? WHERE id = ?"
-        return self.execute_query(query, (status, appointment_id))
+        """
+        Обновление статуса записи на прием
+
+        Возвращает измененные значения (id, status) для обновления строки в таблице
+        без повторной выборки списка или None, если запись не найдена или произошла ошибка.
+        """
+        query = "UPDATE appointments SET status = ? WHERE id = ? RETURNING id, status"
+        rows = self.execute_returning(query, (status, appointment_id))
+        return rows[0] if rows else None
+
+    def get_doctors(self):
+        """Врачи с ФИО и специализацией, по алфавиту (из кэша справочников)"""
+        query = """
+        SELECT d.id, d.user_id, u.full_name, d.specialization
+        FROM doctors d
+        JOIN users u ON d.user_id = u.id
+        ORDER BY u.full_name
+        """
+        return self.cached('doctors', ('doctors', 'users'), lambda: self.fetch_all(query))
 
     def get_doctor_by_user_id(self, user_id):
         """Получение информации о враче по ID пользователя"""
-        print(f"Получение информации о враче для пользователя с ID: {user_id}")
+        logger.debug("Получение информации о враче для пользователя с ID: %s", user_id)
         query = "SELECT * FROM doctors WHERE user_id = ?"
         result = self.fetch_one(query, (user_id,))
-        print(f"Результат запроса информации о враче: {result}")
+        logger.debug("Результат запроса информации о враче: %s", result)
         return result
 
     def get_patients_without_analysis(self, analysis_type_id=None):
@@ -727,7 +2336,8 @@ class DatabaseConnection:
             JOIN users u ON ar.lab_user_id = u.id
             WHERE ar.id = ?
             """
-            result = self.fetch_one(query, (result_id,))
+            # Диалог результата открывается повторно - запись берется из кэша
+            result = self.fetch_one(query, (result_id,), cache=True)
 
             if not result:
                 return None
@@ -817,9 +2427,212 @@ class DatabaseConnection:
             return result_details
 
         except Exception as e:
-            print(f"Ошибка при получении деталей результата анализа: {e}")
+            logger.error("Ошибка при получении деталей результата анализа: %s", e)
             return None
 
+    # Статистика
+    def get_statistics(self, start_date, end_date):
+        """
+        Статистика администратора за период [start_date, end_date) (даты 'YYYY-MM-DD',
+        см. date_range_bounds)
+
+        Считается по сводкам STATS_ROLLUPS: суммы по дням периода вместо подсчета
+        записей, поэтому время не зависит от объема истории. Сводки обновляются
+        триггерами в той же транзакции, что и данные, поэтому значения актуальны
+        на момент последней фиксации.
+        """
+        period = (start_date, end_date)
+        return {
+            'users_by_role': self.fetch_all(
+                "SELECT role, count FROM user_role_stats WHERE count > 0 ORDER BY role"
+            ),
+            'total_patients': self.fetch_one(
+                "SELECT COALESCE(SUM(count), 0) as count FROM daily_patient_stats"
+            ),
+            'new_patients': self.fetch_one(
+                "SELECT COALESCE(SUM(count), 0) as count FROM daily_patient_stats WHERE day >= ? AND day < ?",
+                period
+            ),
+            'total_analyses': self.fetch_one(
+                "SELECT COALESCE(SUM(count), 0) as count FROM daily_analysis_stats WHERE day >= ? AND day < ?",
+                period
+            ),
+            'analyses_by_type': self.fetch_all("""
+                SELECT at.name, SUM(s.count) as count
+                FROM daily_analysis_stats s
+                JOIN analysis_types at ON s.analysis_type_id = at.id
+                WHERE s.day >= ? AND s.day < ?
+                GROUP BY at.name
+                HAVING SUM(s.count) > 0
+                ORDER BY count DESC
+            """, period),
+            'total_appointments': self.fetch_one(
+                "SELECT COALESCE(SUM(count), 0) as count FROM daily_appointment_stats WHERE day >= ? AND day < ?",
+                period
+            ),
+            'appointments_by_status': self.fetch_all("""
+                SELECT status, SUM(count) as count
+                FROM daily_appointment_stats
+                WHERE day >= ? AND day < ?
+                GROUP BY status
+                HAVING SUM(count) > 0
+            """, period),
+        }
+
+    def get_workload_statistics(self, start_date, end_date, row_factory=None):
+        """
+        Ежедневные сводки нагрузки за период [start_date, end_date) для графиков
+        динамики (см. workload_trends): 'doctor_appointments' - day, doctor_id, status,
+        count; 'lab_results' - day, lab_user_id, count; 'turnaround' - day, count,
+        minutes; 'doctors' (id, full_name) и 'users' (id, full_name) - имена для подписей
+        """
+        period = (start_date, end_date)
+        return {
+            'doctor_appointments': self.fetch_all("""
+                SELECT day, doctor_id, status, count
+                FROM daily_doctor_appointment_stats
+                WHERE day >= ? AND day < ? AND count > 0
+            """, period, row_factory=row_factory),
+            'lab_results': self.fetch_all(
+                "SELECT day, lab_user_id, count FROM daily_lab_stats WHERE day >= ? AND day < ? AND count > 0",
+                period, row_factory=row_factory
+            ),
+            'turnaround': self.fetch_all(
+                "SELECT day, count, minutes FROM daily_turnaround_stats WHERE day >= ? AND day < ? AND count > 0",
+                period, row_factory=row_factory
+            ),
+            'doctors': self.fetch_all("""
+                SELECT d.id, u.full_name
+                FROM doctors d
+                JOIN users u ON d.user_id = u.id
+            """, row_factory=row_factory),
+            'users': self.fetch_all("SELECT id, full_name FROM users", row_factory=row_factory),
+        }
+
+    # Глобальный поиск
+    def search(self, text, scopes=None, doctor_id=None, limit=DEFAULT_SEARCH_LIMIT):
+        """
+        Поиск по общему полнотекстовому индексу search_index
+
+        scopes - области поиска из SEARCH_SCOPES (по умолчанию все): пациенты
+        (ФИО, телефон, email, адрес), записи на прием (примечания) и результаты
+        анализов (значения показателей); doctor_id - только записи на прием этого врача.
+        Возвращает до limit записей, лучшие совпадения (bm25) первыми: 'scope', 'id'
+        (id записи в ее таблице), 'snippet' - фрагмент текста с найденными словами
+        в квадратных скобках, пациент записи и поля записи на прием или анализа.
+        """
+        match = search_match(text)
+        if match is None:
+            return []
+        codes = [SEARCH_SCOPES.index(scope) + 1 for scope in (scopes or SEARCH_SCOPES)]
+        scope_names = ' '.join(f"WHEN {code} THEN '{scope}'" for code, scope in enumerate(SEARCH_SCOPES, 1))
+        appointments_code = SEARCH_SCOPES.index('appointments') + 1
+
+        doctor_condition = ""
+        params = [match, *codes]
+        if doctor_id is not None:
+            doctor_condition = f"""
+              AND (search_index.rowid % {SEARCH_ROWID_BASE} <> {appointments_code}
+                   OR EXISTS (SELECT 1 FROM appointments
+                              WHERE id = search_index.rowid / {SEARCH_ROWID_BASE} AND doctor_id = ?))"""
+            params.append(doctor_id)
+        params.append(limit)
+
+        # Сначала отбираются лучшие совпадения, затем к ним присоединяются записи.
+        # Фрагмент - из столбца content (без цифровой копии телефона из столбца digits)
+        query = f"""
+        SELECT s.id, CASE s.scope {scope_names} END as scope, s.snippet, s.rank,
+               p.id as patient_id, p.full_name as patient_name, p.birth_date,
+               a.appointment_date, a.notes, a.doctor_id, du.full_name as doctor_name,
+               at.name as analysis_name, ar.result_date, ar.result_data,
+               COALESCE(a.status, ar.status) as status
+        FROM (
+            SELECT search_index.rowid / {SEARCH_ROWID_BASE} as id,
+                   search_index.rowid % {SEARCH_ROWID_BASE} as scope,
+                   snippet(search_index, 0, '[', ']', '...', 12) as snippet, rank
+            FROM search_index
+            WHERE search_index MATCH ?
+              AND search_index.rowid % {SEARCH_ROWID_BASE} IN ({', '.join('?' * len(codes))}){doctor_condition}
+            ORDER BY rank
+            LIMIT ?
+        ) s
+        LEFT JOIN appointments a ON s.scope = {appointments_code} AND a.id = s.id
+        LEFT JOIN doctors d ON d.id = a.doctor_id
+        LEFT JOIN users du ON du.id = d.user_id
+        LEFT JOIN analysis_results ar ON s.scope = {SEARCH_SCOPES.index('analysis_results') + 1} AND ar.id = s.id
+        LEFT JOIN analysis_types at ON at.id = ar.analysis_type_id
+        LEFT JOIN patients p ON p.id = CASE s.scope WHEN {SEARCH_SCOPES.index('patients') + 1} THEN s.id
+                                        ELSE COALESCE(a.patient_id, ar.patient_id) END
+        ORDER BY s.rank
+        """
+        return self.fetch_all(query, params)
+
+
+class ReadConnection(DatabaseConnection):
+    """
+    Дополнительное соединение только для чтения (PRAGMA query_only) для фонового
+    потока, см. async_query.AsyncQueryExecutor
+
+    Методы чтения те же, что у db, статистика запросов общая с основным соединением.
+    Соединение открывается при первом запросе и должно использоваться и закрываться
+    в одном потоке.
+    """
+
+    def __new__(cls, source):
+        # В отличие от DatabaseConnection, экземпляров может быть несколько
+        return object.__new__(cls)
+
+    def __init__(self, source):
+        """source - основное соединение (db), от которого берутся путь и настройки"""
+        self._init_state()
+        self.db_path = source.db_path
+        self.authorized = True
+        self._profile_name = source._profile_name or DEFAULT_PROFILE
+        self._query_stats = source._query_stats
+        self._row_factory_name = source._row_factory_name or DEFAULT_ROW_FACTORY
+
+    def cached(self, key, tables, load):
+        """Чтение без кэша: кэш справочников проверяет и заполняет основное соединение"""
+        return load()
+
+    def _check_data_version(self):
+        """
+        Сброс кэша результатов запросов, если базу изменило другое соединение
+
+        Для этого соединения другим является и основное соединение процесса,
+        поэтому после записи из окон кэш сбрасывается целиком.
+        """
+        if self._data_version_changed():
+            query_cache.invalidate()
+
+    def connect(self, password=None, profile=None, row_factory=None):
+        """Открытие соединения; ошибка передается вызывающему коду"""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path)
+            self.set_row_factory(row_factory or self._row_factory_name)
+            self._register_functions()
+            self._apply_profile(profile)
+            self.connected = True
+        return True
+
+    def _apply_profile(self, profile=None):
+        """Настройки профиля основного соединения, кроме режима журнала"""
+        if profile:
+            self._profile_name = profile
+        for pragma, value in CONNECTION_PROFILES[self._profile_name]['pragmas']:
+            # Режим журнала и контрольные точки - забота основного соединения
+            if pragma in ('journal_mode', 'wal_autocheckpoint'):
+                continue
+            self._connection.execute(f"PRAGMA {pragma} = {value}")
+        self._connection.execute("PRAGMA query_only = 1")
+
+    def disconnect(self):
+        """Закрытие соединения (без PRAGMA optimize и контрольной точки)"""
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+            self.connected = False
+
 
 # Создание экземпляра для использования в других модулях
 db = DatabaseConnection()
\ No newline at end of file
@@ -8,12 +8,20 @@ from PySide6.QtCore import Qt, Signal, QDate
 from PySide6.QtGui import QFont, QIcon, QColor
 import sys
 import json
-from datetime import datetime
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
 import docx
 from docx.shared import Pt
 import os
 
-from database_connection import db
+from async_query import query_executor
+from change_feed import change_feed
+from database_connection import db, DATETIME_FORMAT, date_range_bounds
+from paged_table import TablePager, LoadingIndicator, changed_row_ids
+from global_search import GlobalSearchBox
+from patient_picker import PatientPicker
 
 # Единый стиль для всего приложения
 GLOBAL_STYLESHEET = """
@@ -186,6 +194,27 @@ GLOBAL_STYLESHEET = """
 """
 
 
+@lru_cache(maxsize=1024)
+def _format_date(date):
+    """'ГГГГ-ММ-ДД' -> 'ДД.ММ.ГГГГ'"""
+    return f"{date[8:10]}.{date[5:7]}.{date[:4]}"
+
+
+def format_datetime(value):
+    """
+    Дата и время из базы для таблиц: 'ДД.ММ.ГГГГ ЧЧ:ММ'
+
+    Значения в базе приведены к DATETIME_FORMAT, поэтому строка разбирается срезами
+    без strptime, а преобразование даты кэшируется: в странице таблицы даты повторяются.
+    Значение в другом формате возвращается как есть.
+    """
+    if isinstance(value, datetime):
+        return value.strftime('%d.%m.%Y %H:%M')
+    if isinstance(value, str) and len(value) >= 16 and value[4] == '-' and value[7] == '-' and value[10] == ' ':
+        return f"{_format_date(value[:10])} {value[11:16]}"
+    return '' if value is None else str(value)
+
+
 class AppointmentDetailsDialog(QDialog):
     """Диалоговое окно с деталями приема"""
 
@@ -465,9 +494,8 @@ class AnalysisDetailsDialog(QDialog):
 
 class PrescriptionDialog(QDialog):
     """Диалоговое окно для создания рецепта"""
-    def __init__(self, patients, doctor_info, parent=None):
+    def __init__(self, doctor_info, parent=None):
         super().__init__(parent)
-        self.patients = patients
         self.doctor_info = doctor_info
         self.medications = db.get_all_medications()  # Получаем список лекарств
         self.medication_rows = []  # Список для хранения строк с лекарствами
@@ -484,10 +512,8 @@ class PrescriptionDialog(QDialog):
         form_layout = QFormLayout()
 
         # Выбор пациента
-        self.patient_combo = QComboBox()
-        for patient in self.patients:
-            self.patient_combo.addItem(patient['full_name'], patient['id'])
-        form_layout.addRow("Пациент:", self.patient_combo)
+        self.patient_picker = PatientPicker()
+        form_layout.addRow("Пациент:", self.patient_picker)
 
         # Дата выдачи
         self.issue_date = QDateEdit()
@@ -576,7 +602,7 @@ class PrescriptionDialog(QDialog):
 
     def save_prescription(self):
         """Сохранение рецепта в базе данных"""
-        patient_id = self.patient_combo.currentData()
+        patient_id = self.patient_picker.patient_id()
         issue_date = self.issue_date.date().toString("yyyy-MM-dd")
 
         if not patient_id or not issue_date:
@@ -593,20 +619,21 @@ class PrescriptionDialog(QDialog):
                 return
 
         try:
-            # Создаем запись рецепта
-            prescription_id = db.add_prescription(
+            medications = [
+                (row['combo'].currentData(),
+                 row['dosage'].text().strip(),
+                 row['instructions'].text().strip() or None)
+                for row in self.medication_rows
+            ]
+
+            # Рецепт и его лекарства сохраняются одной транзакцией
+            db.add_prescription_with_medications(
                 self.doctor_info['id'],
                 patient_id,
-                issue_date
+                issue_date,
+                medications
             )
 
-            # Добавляем лекарства к рецепту
-            for row in self.medication_rows:
-                medication_id = row['combo'].currentData()
-                dosage = row['dosage'].text().strip()
-                instructions = row['instructions'].text().strip() or None
-                db.add_prescription_medication(prescription_id, medication_id, dosage, instructions)
-
             QMessageBox.information(self, "Успех", "Рецепт успешно сохранен")
             self.accept()
         except Exception as e:
@@ -615,9 +642,8 @@ class PrescriptionDialog(QDialog):
 class ScheduleAppointmentDialog(QDialog):
     """Диалоговое окно для планирования приема"""
 
-    def __init__(self, patients, doctor_info, parent=None):
+    def __init__(self, doctor_info, parent=None):
         super().__init__(parent)
-        self.patients = patients
         self.doctor_info = doctor_info
         self.setWindowTitle("Запланировать прием")
         self.setMinimumWidth(500)
@@ -632,10 +658,8 @@ class ScheduleAppointmentDialog(QDialog):
         form_layout = QFormLayout()
 
         # Выбор пациента
-        self.patient_combo = QComboBox()
-        for patient in self.patients:
-            self.patient_combo.addItem(patient['full_name'], patient['id'])
-        form_layout.addRow("Пациент:", self.patient_combo)
+        self.patient_picker = PatientPicker()
+        form_layout.addRow("Пациент:", self.patient_picker)
 
         # Дата приема
         self.appointment_date = QDateEdit()
@@ -687,7 +711,7 @@ class ScheduleAppointmentDialog(QDialog):
 
     def save_appointment(self):
         """Сохранение приема в базе данных"""
-        patient_id = self.patient_combo.currentData()
+        patient_id = self.patient_picker.patient_id()
         appointment_date = self.appointment_date.date()
         appointment_time = self.time_combo.currentData()
 
@@ -699,7 +723,7 @@ class ScheduleAppointmentDialog(QDialog):
             appointment_time.hour(),
             appointment_time.minute()
         )
-        appointment_str = appointment_datetime.strftime("%Y-%m-%d %H:%M")
+        appointment_str = appointment_datetime.strftime(DATETIME_FORMAT)
 
         notes = self.notes.toPlainText().strip()
 
@@ -720,6 +744,173 @@ class ScheduleAppointmentDialog(QDialog):
             QMessageBox.critical(self, "Ошибка", f"Не удалось запланировать прием: {str(e)}")
 
 
+class ScheduleDayCache:
+    """
+    Кэш расписания врача по дням с подгрузкой соседних дней
+
+    Приемы выбираются одним запросом по индексу (doctor_id, appointment_date) сразу
+    за неделю вокруг запрошенного дня, в фоновом потоке базы данных. Переход
+    по датам внутри недели показывает расписание из кэша без запроса к базе,
+    а недостающие дни вокруг показанного подгружаются заранее. Дни хранятся
+    не дольше TTL секунд (расписание могут менять администратор и другие окна),
+    изменения из этого окна сбрасывают кэш через invalidate().
+    Изменения из журнала (apply_changes) применяются к загруженным дням:
+    заново выбираются только измененные приемы врача.
+    """
+
+    QUERY = """
+        SELECT a.*, p.full_name as patient_name
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        WHERE a.doctor_id = ? AND a.appointment_date >= ? AND a.appointment_date < ?
+        ORDER BY a.appointment_date, a.id
+    """
+    # Приемы врача для выборки измененных записей (db.fetch_changed_rows)
+    CHANGES_QUERY = """
+        SELECT a.*, p.full_name as patient_name
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        WHERE a.doctor_id = ?
+    """
+    # Таблица журнала изменений -> столбец приема с id ее записи
+    CHANGE_COLUMNS = {'appointments': 'id', 'patients': 'patient_id'}
+    # Дней до и после запрошенного, которые загружаются вместе с ним
+    DAYS_AROUND = 3
+    MAX_DAYS = 62
+    TTL = 60
+
+    def __init__(self, doctor_id, executor=None, on_changed=None):
+        """on_changed(дни) - вызывается, когда apply_changes изменил загруженные дни"""
+        self.doctor_id = doctor_id
+        self.executor = executor or query_executor()
+        self.on_changed = on_changed
+        # День 'YYYY-MM-DD' -> (время загрузки, приемы); порядок - от давно использованных
+        self._days = OrderedDict()
+        # id измененных приемов, еще не выбранных из базы
+        self._changed = set()
+        # Каналы исполнителя: показ дня, подгрузка соседних дней, измененные приемы
+        self._prefetch_channel = (self, 'prefetch')
+        self._changes_channel = (self, 'changes')
+
+    def get(self, day, on_result, on_error=None):
+        """
+        Расписание дня day ('YYYY-MM-DD'): on_result(приемы) вызывается сразу,
+        если день есть в кэше (возвращается True), иначе - после загрузки недели в фоне
+        """
+        # Ожидаемый результат предыдущего дня больше не нужен
+        self.executor.cancel(self)
+        rows = self._cached(day)
+        if rows is not None:
+            on_result(rows)
+            self.prefetch(day)
+            return True
+
+        def loaded(days):
+            self._store(days)
+            on_result(days[day])
+            self.prefetch(day)
+
+        days = [day] + self._missing_around(day)
+        first, last = min(days), max(days)
+        self.executor.submit(self, lambda connection: self._fetch(connection, first, last), loaded, on_error)
+        return False
+
+    def prefetch(self, day):
+        """Фоновая загрузка дней вокруг day, которых нет в кэше"""
+        missing = self._missing_around(day)
+        if not missing or self.executor.is_busy(self._prefetch_channel):
+            return
+        first, last = min(missing), max(missing)
+        self.executor.submit(self._prefetch_channel,
+                             lambda connection: self._fetch(connection, first, last), self._store)
+
+    def invalidate(self):
+        """Сброс кэша после изменения расписания"""
+        self._days.clear()
+        self._changed = set()
+        self.executor.cancel(self._prefetch_channel)
+        self.executor.cancel(self._changes_channel)
+
+    def cancel(self):
+        """Отмена ожидаемых результатов (окно закрыто)"""
+        self.executor.cancel(self)
+        self.executor.cancel(self._prefetch_channel)
+        self.executor.cancel(self._changes_channel)
+
+    def apply_changes(self, changes):
+        """Обновление загруженных дней по изменениям из журнала ({таблица: {id: операция}})"""
+        if not self._days:
+            return
+        loaded = [appointment for _, appointments in self._days.values() for appointment in appointments]
+        self._changed |= changed_row_ids(loaded, 'id', self.CHANGE_COLUMNS, changes)
+        self._fetch_changed()
+
+    def _fetch_changed(self):
+        # Изменения, пришедшие во время выборки, выбираются следующим запросом
+        if not self._changed or self.executor.is_busy(self._changes_channel):
+            return
+        ids, self._changed = self._changed, set()
+        query, params = self.CHANGES_QUERY, (self.doctor_id,)
+        self.executor.submit(
+            self._changes_channel,
+            lambda connection: (ids, connection.fetch_changed_rows(query, 'id', ids, params)),
+            self._store_changed,
+        )
+
+    def _store_changed(self, result):
+        ids, rows = result
+        changed_days = set()
+        # Списки дней заменяются новыми: прежние могли уже передаваться в on_result
+        for day, (loaded_at, appointments) in list(self._days.items()):
+            kept = [appointment for appointment in appointments if appointment['id'] not in ids]
+            if len(kept) != len(appointments):
+                self._days[day] = (loaded_at, kept)
+                changed_days.add(day)
+        for row in rows:
+            day = row['appointment_date'][:10]
+            if day in self._days:
+                loaded_at, appointments = self._days[day]
+                self._days[day] = (loaded_at, sorted(
+                    appointments + [row], key=lambda appointment: (appointment['appointment_date'], appointment['id'])))
+                changed_days.add(day)
+        if changed_days and self.on_changed is not None:
+            self.on_changed(changed_days)
+        self._fetch_changed()
+
+    def _cached(self, day):
+        entry = self._days.get(day)
+        if entry is None or time.monotonic() - entry[0] > self.TTL:
+            return None
+        self._days.move_to_end(day)
+        return entry[1]
+
+    def _missing_around(self, day):
+        center = datetime.strptime(day, '%Y-%m-%d')
+        days = [(center + timedelta(days=offset)).strftime('%Y-%m-%d')
+                for offset in range(-self.DAYS_AROUND, self.DAYS_AROUND + 1)]
+        return [other for other in days if other != day and self._cached(other) is None]
+
+    def _fetch(self, connection, first, last):
+        """Выполняется в потоке базы данных: приемы с first по last, разложенные по дням"""
+        rows = connection.fetch_all(self.QUERY, (self.doctor_id, *date_range_bounds(first, last)))
+        days = {}
+        day = datetime.strptime(first, '%Y-%m-%d')
+        while day.strftime('%Y-%m-%d') <= last:
+            days[day.strftime('%Y-%m-%d')] = []
+            day += timedelta(days=1)
+        for row in rows:
+            days[row['appointment_date'][:10]].append(row)
+        return days
+
+    def _store(self, days):
+        loaded_at = time.monotonic()
+        for day, rows in days.items():
+            self._days[day] = (loaded_at, rows)
+            self._days.move_to_end(day)
+        while len(self._days) > self.MAX_DAYS:
+            self._days.popitem(last=False)
+
+
 class DoctorWindow(QMainWindow):
     """Главное окно интерфейса врача"""
     logout_signal = Signal()
@@ -762,6 +953,12 @@ class DoctorWindow(QMainWindow):
 
         top_panel.addStretch()
 
+        # Глобальный поиск: пациенты, анализы и только свои записи на прием
+        self.global_search = GlobalSearchBox(
+            doctor_id=self.doctor_info['id'] if self.doctor_info else None, parent=self)
+        self.global_search.result_activated.connect(self.open_search_result)
+        top_panel.addWidget(self.global_search)
+
         logout_button = QPushButton("Выйти")
         logout_button.setObjectName("danger")
         logout_button.clicked.connect(self.logout)
@@ -809,7 +1006,10 @@ class DoctorWindow(QMainWindow):
 
         apply_filter_button = QPushButton("Применить")
         apply_filter_button.setObjectName("primary")
-        apply_filter_button.clicked.connect(self.load_schedule)
+        # Явное обновление читает день из базы, а не из кэша
+        apply_filter_button.clicked.connect(self.refresh_schedule)
+        # Соседние дни обычно уже в кэше, поэтому расписание меняется сразу при выборе даты
+        self.date_filter.dateChanged.connect(self.load_schedule)
 
         schedule_button = QPushButton("Запланировать прием")
         schedule_button.setObjectName("success")
@@ -830,19 +1030,31 @@ class DoctorWindow(QMainWindow):
             "Дата Время", "Пациент", "Статус", "Примечания", "Действия"
         ])
         self.schedule_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.schedule_table.setSortingEnabled(True)
 
         layout.addWidget(self.schedule_table)
 
+        # Расписание дня берется из кэша по дням, неделя вокруг дня загружается в фоне
+        self.schedule_indicator = LoadingIndicator(self.schedule_table)
+        self.schedule_cache = None
+        if self.doctor_info:
+            self.schedule_cache = ScheduleDayCache(self.doctor_info['id'], on_changed=self._on_schedule_changed)
+            # Результат для закрытого окна не нужен
+            self.schedule_table.destroyed.connect(self.schedule_cache.cancel)
+            # Приемы, измененные администратором и на других рабочих местах
+            feed = change_feed()
+            feed.changes_received.connect(self.on_database_changed)
+            feed.reset_required.connect(self.on_database_reset)
+
         # Загрузка расписания
         self.load_schedule()
 
     def schedule_appointment(self):
         """Открытие диалога для планирования нового приема"""
-        patients = db.get_all_patients()
-        dialog = ScheduleAppointmentDialog(patients, self.doctor_info, self)
+        dialog = ScheduleAppointmentDialog(self.doctor_info, self)
         result = dialog.exec()
         if result == QDialog.Accepted:
+            if self.schedule_cache is not None:
+                self.schedule_cache.invalidate()
             self.load_schedule()
 
     def setup_analysis_tab(self):
@@ -853,13 +1065,7 @@ class DoctorWindow(QMainWindow):
         filter_layout = QHBoxLayout()
 
         patient_label = QLabel("Пациент:")
-        self.patient_filter = QComboBox()
-        self.patient_filter.addItem("Все пациенты", None)
-
-        # Загрузка списка пациентов
-        patients = db.get_all_patients()
-        for patient in patients:
-            self.patient_filter.addItem(patient['full_name'], patient['id'])
+        self.patient_filter = PatientPicker("Все пациенты")
 
         date_label = QLabel("Период:")
         self.start_date_filter = QDateEdit()
@@ -894,10 +1100,18 @@ class DoctorWindow(QMainWindow):
             "Дата", "Пациент", "Тип анализа", "Статус", "Лаборант", "Действия"
         ])
         self.analysis_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.analysis_table.setSortingEnabled(True)
 
         layout.addWidget(self.analysis_table)
 
+        # Результаты загружаются страницами по мере прокрутки, новые сверху
+        self.analysis_pager = TablePager(self.analysis_table, self._append_analysis_rows)
+        self.analysis_pager.watch_changes({
+            'analysis_results': 'id',
+            'patients': 'patient_id',
+            'analysis_types': 'analysis_type_id',
+            'users': 'lab_user_id',
+        })
+
         # Загрузка результатов анализов
         self.load_analysis_results()
 
@@ -924,14 +1138,15 @@ class DoctorWindow(QMainWindow):
         self.prescription_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         # Разрешаем пользователю изменять размеры строк
         self.prescription_table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
-        # Включаем сортировку
-        self.prescription_table.setSortingEnabled(True)
         # Разрешаем выбор только одной строки
         self.prescription_table.setSelectionMode(QTableWidget.SingleSelection)
         # Включаем отображение сетки для лучшей читаемости
         self.prescription_table.setShowGrid(True)
         layout.addWidget(self.prescription_table)
 
+        # Рецепты загружаются страницами по мере прокрутки, новые сверху
+        self.prescription_pager = TablePager(self.prescription_table, self._append_prescription_rows)
+
         # Загрузка рецептов
         self.load_prescriptions()
 
@@ -945,254 +1160,214 @@ class DoctorWindow(QMainWindow):
         # Получение даты из фильтра
         filter_date = self.date_filter.date().toString("yyyy-MM-dd")
 
-        # Получение расписания из базы данных
-        try:
-            appointments = db.fetch_all("""
-                SELECT a.*, p.full_name as patient_name 
-                FROM appointments a
-                JOIN patients p ON a.patient_id = p.id
-                WHERE a.doctor_id = ?
-                ORDER BY a.appointment_date
-            """, (self.doctor_info['id'],))
-
-            # Фильтрация по дате на стороне приложения
-            filtered_appointments = []
-            for appointment in appointments:
-                appointment_date = appointment['appointment_date'].split()[0]  # Получаем только дату без времени
-                if appointment_date == filter_date:
-                    filtered_appointments.append(appointment)
-
-            # Заполнение таблицы
-            self.schedule_table.setRowCount(len(filtered_appointments))
-
-            for row, appointment in enumerate(filtered_appointments):
-                # Дата и время
-                appointment_datetime = appointment['appointment_date']
-                try:
-                    if isinstance(appointment_datetime, str):
-                        date_time = datetime.strptime(appointment_datetime, "%Y-%m-%d %H:%M:%S")
-                        date_item = QTableWidgetItem(date_time.strftime("%d.%m.%Y %H:%M"))
-                    else:
-                        date_item = QTableWidgetItem(appointment_datetime.strftime("%d.%m.%Y %H:%M"))
-                except Exception as e:
-                    date_item = QTableWidgetItem(str(appointment_datetime))
-
-                self.schedule_table.setItem(row, 0, date_item)
-
-                # Пациент
-                patient_item = QTableWidgetItem(appointment['patient_name'])
-                self.schedule_table.setItem(row, 1, patient_item)
-
-                # Статус
-                status_text = {
-                    'scheduled': 'Запланирован',
-                    'completed': 'Завершен',
-                    'cancelled': 'Отменен'
-                }.get(appointment['status'], appointment['status'])
-
-                status_item = QTableWidgetItem(status_text)
-
-                # Цветовое выделение статуса
-                if appointment['status'] == 'scheduled':
-                    status_item.setBackground(QColor("#ffc107"))  # Желтый
-                elif appointment['status'] == 'completed':
-                    status_item.setBackground(QColor("#28a745"))  # Зеленый
-                elif appointment['status'] == 'cancelled':
-                    status_item.setBackground(QColor("#dc3545"))  # Красный
-
-                self.schedule_table.setItem(row, 2, status_item)
-
-                # Примечания
-                notes_item = QTableWidgetItem(appointment['notes'] if appointment['notes'] else "")
-                self.schedule_table.setItem(row, 3, notes_item)
-
-                # Кнопка действий
-                view_button = QPushButton("Просмотр")
-                view_button.setObjectName("primary")
-                view_button.clicked.connect(lambda checked, a=appointment: self.view_appointment_details(a))
-                self.schedule_table.setCellWidget(row, 4, view_button)
-
-            # Установка высоты строк
-            for row in range(self.schedule_table.rowCount()):
-                self.schedule_table.setRowHeight(row, 60)  # Увеличили высоту до 60 пикселей
-
-            self.schedule_table.resizeColumnsToContents()
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить расписание: {str(e)}")
+        # Расписание дня из кэша или запросом за неделю по индексу (doctor_id, appointment_date)
+        self.schedule_indicator.start()
+        self.schedule_cache.get(filter_date, self._show_schedule, self._on_schedule_failed)
+
+    def refresh_schedule(self):
+        """Загрузка расписания из базы мимо кэша дней (кнопка "Применить")"""
+        if self.schedule_cache is not None:
+            self.schedule_cache.invalidate()
+        self.load_schedule()
+
+    def _show_schedule(self, appointments):
+        """Заполнение таблицы расписания приемами дня"""
+        self.schedule_indicator.stop()
+        self.schedule_table.setRowCount(len(appointments))
+        self._append_schedule_rows(appointments, 0)
+        self.schedule_table.resizeColumnsToContents()
+
+    def _on_schedule_changed(self, days):
+        """Показанный день изменился по журналу изменений: таблица заполняется из кэша"""
+        if self.date_filter.date().toString("yyyy-MM-dd") in days:
+            self.load_schedule()
+
+    def on_database_changed(self, changes):
+        """Изменения из журнала (change_feed): расписание обновляется без полной перезагрузки"""
+        if self.schedule_cache is not None:
+            self.schedule_cache.apply_changes(changes)
+
+    def on_database_reset(self):
+        """Журнал изменений пропущен: расписание загружается заново"""
+        if self.schedule_cache is not None:
+            self.schedule_cache.invalidate()
+            self.load_schedule()
+
+    def _on_schedule_failed(self, message):
+        self.schedule_indicator.stop()
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить расписание: {message}")
+
+    def _append_schedule_rows(self, appointments, first_row):
+        """Заполнение строк таблицы расписания начиная с first_row"""
+        for row, appointment in enumerate(appointments, first_row):
+            # Дата и время
+            self.schedule_table.setItem(row, 0, QTableWidgetItem(format_datetime(appointment['appointment_date'])))
+
+            # Пациент
+            patient_item = QTableWidgetItem(appointment['patient_name'])
+            self.schedule_table.setItem(row, 1, patient_item)
+
+            # Статус
+            status_text = {
+                'scheduled': 'Запланирован',
+                'completed': 'Завершен',
+                'cancelled': 'Отменен'
+            }.get(appointment['status'], appointment['status'])
+
+            status_item = QTableWidgetItem(status_text)
+
+            # Цветовое выделение статуса
+            if appointment['status'] == 'scheduled':
+                status_item.setBackground(QColor("#ffc107"))  # Желтый
+            elif appointment['status'] == 'completed':
+                status_item.setBackground(QColor("#28a745"))  # Зеленый
+            elif appointment['status'] == 'cancelled':
+                status_item.setBackground(QColor("#dc3545"))  # Красный
+
+            self.schedule_table.setItem(row, 2, status_item)
+
+            # Примечания
+            notes_item = QTableWidgetItem(appointment['notes'] if appointment['notes'] else "")
+            self.schedule_table.setItem(row, 3, notes_item)
+
+            # Кнопка действий
+            view_button = QPushButton("Просмотр")
+            view_button.setObjectName("primary")
+            view_button.clicked.connect(lambda checked, a=appointment: self.view_appointment_details(a))
+            self.schedule_table.setCellWidget(row, 4, view_button)
+
+            # Установка высоты строки
+            self.schedule_table.setRowHeight(row, 60)  # Увеличили высоту до 60 пикселей
 
     def load_analysis_results(self):
         """Загрузка результатов анализов"""
         # Получение параметров фильтрации
-        patient_id = self.patient_filter.currentData()
+        patient_id = self.patient_filter.patient_id()
         start_date = self.start_date_filter.date().toString("yyyy-MM-dd")
         end_date = self.end_date_filter.date().toString("yyyy-MM-dd")
 
         try:
-            # Базовый запрос без фильтра по дате
+            # Фильтр по периоду - полуинтервал по индексу
             query = """
                 SELECT ar.*, at.name as analysis_name, p.full_name as patient_name, u.full_name as lab_technician_name
                 FROM analysis_results ar
                 JOIN analysis_types at ON ar.analysis_type_id = at.id
                 JOIN patients p ON ar.patient_id = p.id
                 JOIN users u ON ar.lab_user_id = u.id
+                WHERE ar.result_date >= ? AND ar.result_date < ?
             """
-            params = []
+            params = list(date_range_bounds(start_date, end_date))
 
             # Добавление фильтра по пациенту, если выбран
             if patient_id:
-                query += " WHERE ar.patient_id = ?"
+                query += " AND ar.patient_id = ?"
                 params.append(patient_id)
 
-            query += " ORDER BY ar.result_date DESC"
-
-            # Получение результатов анализов
-            all_analysis_results = db.fetch_all(query, params)
-
-            # Фильтрация по дате на стороне приложения
-            filtered_results = []
-            for result in all_analysis_results:
-                try:
-                    result_date_str = result['result_date']
-                    if isinstance(result_date_str, str):
-                        result_date = result_date_str.split()[0]  # Получаем только дату без времени
-                    else:
-                        result_date = result_date_str.strftime('%Y-%m-%d')
-
-                    if start_date <= result_date <= end_date:
-                        filtered_results.append(result)
-                except Exception as e:
-                    # Включаем результат, если не можем определить дату
-                    filtered_results.append(result)
-
-            # Заполнение таблицы
-            self.analysis_table.setRowCount(len(filtered_results))
-
-            for row, result in enumerate(filtered_results):
-                # Дата (столбец 0)
-                try:
-                    date_str = result['result_date']
-                    if isinstance(date_str, str):
-                        try:
-                            date_time = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
-                            date_item = QTableWidgetItem(date_time.strftime('%d.%m.%Y %H:%M'))
-                        except:
-                            date_item = QTableWidgetItem(date_str)
-                    else:
-                        date_item = QTableWidgetItem(date_str.strftime('%d.%m.%Y %H:%M'))
-                except Exception as e:
-                    date_item = QTableWidgetItem(str(result.get('result_date', '')))
-
-                self.analysis_table.setItem(row, 0, date_item)
-
-                # Пациент (столбец 1)
-                self.analysis_table.setItem(row, 1, QTableWidgetItem(result['patient_name']))
-
-                # Тип анализа (столбец 2)
-                self.analysis_table.setItem(row, 2, QTableWidgetItem(result['analysis_name']))
-
-                # Статус (столбец 3)
-                status_text = {
-                    'pending': 'В обработке',
-                    'completed': 'Выполнен',
-                    'sent': 'Отправлен'
-                }.get(result['status'], result['status'])
-
-                status_item = QTableWidgetItem(status_text)
-
-                # Цветовое выделение статуса
-                if result['status'] == 'completed':
-                    status_item.setBackground(QColor("#28a745"))  # Зеленый
-                elif result['status'] == 'pending':
-                    status_item.setBackground(QColor("#ffc107"))  # Желтый
-                elif result['status'] == 'sent':
-                    status_item.setBackground(QColor("#17a2b8"))  # Голубой
-
-                self.analysis_table.setItem(row, 3, status_item)
-
-                # Лаборант (столбец 4)
-                self.analysis_table.setItem(row, 4, QTableWidgetItem(result['lab_technician_name']))
-
-                # Кнопка действий (столбец 5)
-                view_button = QPushButton("Просмотр")
-                view_button.setObjectName("primary")
-                view_button.clicked.connect(lambda checked, r=result: self.view_analysis_details(r))
-                self.analysis_table.setCellWidget(row, 5, view_button)
-
-            # Установка высоты строк
-            for row in range(self.analysis_table.rowCount()):
-                self.analysis_table.setRowHeight(row, 60)  # Увеличили высоту до 60 пикселей
-
+            self.analysis_pager.load(query, ('result_date', 'id'), params, descending=True)
             self.analysis_table.resizeColumnsToContents()
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить результаты анализов: {str(e)}")
 
+    def _append_analysis_rows(self, results, first_row):
+        """Заполнение строк таблицы результатов анализов начиная с first_row"""
+        for row, result in enumerate(results, first_row):
+            # Дата (столбец 0)
+            self.analysis_table.setItem(row, 0, QTableWidgetItem(format_datetime(result['result_date'])))
+
+            # Пациент (столбец 1)
+            self.analysis_table.setItem(row, 1, QTableWidgetItem(result['patient_name']))
+
+            # Тип анализа (столбец 2)
+            self.analysis_table.setItem(row, 2, QTableWidgetItem(result['analysis_name']))
+
+            # Статус (столбец 3)
+            status_text = {
+                'pending': 'В обработке',
+                'completed': 'Выполнен',
+                'sent': 'Отправлен'
+            }.get(result['status'], result['status'])
+
+            status_item = QTableWidgetItem(status_text)
+
+            # Цветовое выделение статуса
+            if result['status'] == 'completed':
+                status_item.setBackground(QColor("#28a745"))  # Зеленый
+            elif result['status'] == 'pending':
+                status_item.setBackground(QColor("#ffc107"))  # Желтый
+            elif result['status'] == 'sent':
+                status_item.setBackground(QColor("#17a2b8"))  # Голубой
+
+            self.analysis_table.setItem(row, 3, status_item)
+
+            # Лаборант (столбец 4)
+            self.analysis_table.setItem(row, 4, QTableWidgetItem(result['lab_technician_name']))
+
+            # Кнопка действий (столбец 5)
+            view_button = QPushButton("Просмотр")
+            view_button.setObjectName("primary")
+            view_button.clicked.connect(lambda checked, r=result: self.view_analysis_details(r))
+            self.analysis_table.setCellWidget(row, 5, view_button)
+
+            # Установка высоты строки
+            self.analysis_table.setRowHeight(row, 60)  # Увеличили высоту до 60 пикселей
+
     def load_prescriptions(self):
         """Загрузка выписанных рецептов"""
         try:
-            prescriptions = db.fetch_all("""
-                SELECT p.*, pt.full_name as patient_name
-                FROM prescriptions p
-                JOIN patients pt ON p.patient_id = pt.id
-                WHERE p.doctor_id = ?
-                ORDER BY p.issue_date DESC
-            """, (self.doctor_info['id'],))
-
-            self.prescription_table.setRowCount(len(prescriptions))
-
-            for row, prescription in enumerate(prescriptions):
-                # Дата выдачи
-                date_str = prescription['issue_date']
-                if isinstance(date_str, str):
-                    try:
-                        date_time = datetime.strptime(date_str, "%Y-%m-%d")
-                        date_item = QTableWidgetItem(date_time.strftime('%d.%m.%Y'))
-                    except:
-                        date_item = QTableWidgetItem(date_str)
-                else:
-                    date_item = QTableWidgetItem(date_str.strftime('%d.%m.%Y'))
-                self.prescription_table.setItem(row, 0, date_item)
-
-                # Пациент
-                self.prescription_table.setItem(row, 1, QTableWidgetItem(prescription['patient_name']))
-
-                # Лекарства
-                medications = db.get_prescription_medications(prescription['id'])
-                medication_names = ", ".join([med['medication_name'] for med in medications])
-                self.prescription_table.setItem(row, 2, QTableWidgetItem(medication_names))
-
-                # Дозировки
-                dosages = ", ".join([med['dosage'] for med in medications])
-                self.prescription_table.setItem(row, 3, QTableWidgetItem(dosages))
-
-                # Инструкции
-                instructions = ", ".join([med['instructions'] or "" for med in medications])
-                instructions_item = QTableWidgetItem(instructions)
-                instructions_item.setToolTip(instructions)
-                self.prescription_table.setItem(row, 4, instructions_item)
-
-                # Кнопки действий
-                actions_layout = QHBoxLayout()
-                view_button = QPushButton("Word")
-                view_button.setObjectName("primary")
-                view_button.clicked.connect(lambda checked, pr=prescription: self.export_to_word(pr))
-                actions_layout.addWidget(view_button)
-
-                actions_widget = QWidget()
-                actions_widget.setLayout(actions_layout)
-                self.prescription_table.setCellWidget(row, 5, actions_widget)
-
-                # Устанавливаем высоту строки
-                self.prescription_table.setRowHeight(row, 60)
-
-            # Удаляем вызов resizeColumnsToContents, чтобы пользователь мог сам настраивать ширину столбцов
-            # self.prescription_table.resizeColumnsToContents()
+            # Рецепты страницы выбираются вместе с лекарствами (два запроса на страницу)
+            doctor_id = self.doctor_info['id']
+            self.prescription_pager.load_from(
+                lambda connection, after, limit: connection.get_doctor_prescriptions_page(doctor_id, after, limit))
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить рецепты: {str(e)}")
 
+    def _append_prescription_rows(self, prescriptions, first_row):
+        """Заполнение строк таблицы рецептов начиная с first_row"""
+        for row, prescription in enumerate(prescriptions, first_row):
+            # Дата выдачи
+            date_str = prescription['issue_date']
+            if isinstance(date_str, str):
+                if len(date_str) >= 10 and date_str[4] == '-' and date_str[7] == '-':
+                    date_str = _format_date(date_str[:10])
+            elif date_str is not None:
+                date_str = date_str.strftime('%d.%m.%Y')
+            self.prescription_table.setItem(row, 0, QTableWidgetItem(date_str or ''))
+
+            # Пациент
+            self.prescription_table.setItem(row, 1, QTableWidgetItem(prescription['patient_name']))
+
+            # Лекарства
+            medications = prescription['medications']
+            medication_names = ", ".join([med['medication_name'] for med in medications])
+            self.prescription_table.setItem(row, 2, QTableWidgetItem(medication_names))
+
+            # Дозировки
+            dosages = ", ".join([med['dosage'] for med in medications])
+            self.prescription_table.setItem(row, 3, QTableWidgetItem(dosages))
+
+            # Инструкции
+            instructions = ", ".join([med['instructions'] or "" for med in medications])
+            instructions_item = QTableWidgetItem(instructions)
+            instructions_item.setToolTip(instructions)
+            self.prescription_table.setItem(row, 4, instructions_item)
+
+            # Кнопки действий
+            actions_layout = QHBoxLayout()
+            view_button = QPushButton("Word")
+            view_button.setObjectName("primary")
+            view_button.clicked.connect(lambda checked, pr=prescription: self.export_to_word(pr))
+            actions_layout.addWidget(view_button)
+
+            actions_widget = QWidget()
+            actions_widget.setLayout(actions_layout)
+            self.prescription_table.setCellWidget(row, 5, actions_widget)
+
+            # Устанавливаем высоту строки
+            self.prescription_table.setRowHeight(row, 60)
+
     def create_prescription(self):
         """Открытие диалога для создания нового рецепта"""
-        patients = db.get_all_patients()
-        dialog = PrescriptionDialog(patients, self.doctor_info, self)
+        dialog = PrescriptionDialog(self.doctor_info, self)
         result = dialog.exec()
         if result == QDialog.Accepted:
             self.load_prescriptions()
@@ -1218,14 +1393,14 @@ class DoctorWindow(QMainWindow):
             doc.add_paragraph(f'Специализация: {self.doctor_info["specialization"]}', style='Normal')
 
             # Информация о пациенте
-            patient = db.get_patient(prescription['patient_id'])
-            doc.add_paragraph(f'Пациент: {patient["full_name"]}', style='Normal')
-            doc.add_paragraph(f'Дата рождения: {patient["birth_date"]}', style='Normal')
+            # Пациент и лекарства уже загружены вместе со страницей рецептов
+            doc.add_paragraph(f'Пациент: {prescription["patient_name"]}', style='Normal')
+            doc.add_paragraph(f'Дата рождения: {prescription["patient_birth_date"]}', style='Normal')
             doc.add_paragraph(f'Дата выдачи: {prescription["issue_date"]}', style='Normal')
             doc.add_paragraph()
 
             # Таблица с лекарствами
-            medications = db.get_prescription_medications(prescription['id'])
+            medications = prescription['medications']
             if medications:
                 table = doc.add_table(rows=len(medications) + 1, cols=3)
                 table.style = 'Table Grid'
@@ -1255,13 +1430,25 @@ class DoctorWindow(QMainWindow):
             doc.add_paragraph(f'Дата: {prescription["issue_date"]}', style='Normal').alignment = 2
 
             # Сохранение документа
-            filename = f"Рецепт_{patient['full_name']}_{prescription['issue_date']}.docx"
+            filename = f"Рецепт_{prescription['patient_name']}_{prescription['issue_date']}.docx"
             filename = filename.replace(" ", "_").replace(":", "-")
             doc.save(filename)
             QMessageBox.information(self, "Успех", f"Рецепт сохранен как {filename}")
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать рецепт в Word: {str(e)}")
 
+    def open_search_result(self, result):
+        """Открытие записи, найденной глобальным поиском"""
+        if result['scope'] == 'patients':
+            # Анализы пациента за выбранный период
+            self.patient_filter.set_patient_id(result['id'])
+            self.tab_widget.setCurrentWidget(self.analysis_tab)
+            self.load_analysis_results()
+        elif result['scope'] == 'appointments':
+            self.view_appointment_details(dict(result.items()))
+        elif result['scope'] == 'analysis_results':
+            self.view_analysis_details(dict(result.items()))
+
     def view_appointment_details(self, appointment):
         """Просмотр деталей приема"""
         dialog = AppointmentDetailsDialog(appointment, self)
@@ -1269,6 +1456,8 @@ class DoctorWindow(QMainWindow):
 
         # Обновление таблицы после изменения статуса
         if result == QDialog.Accepted:
+            if self.schedule_cache is not None:
+                self.schedule_cache.invalidate()
             self.load_schedule()
 
     def view_analysis_details(self, analysis):
@@ -0,0 +1,164 @@
+from PySide6.QtCore import Qt, QEvent, QPoint, QTimer, Signal
+from PySide6.QtWidgets import QLineEdit, QListWidget, QListWidgetItem
+
+from async_query import query_executor
+
+
+class GlobalSearchBox(QLineEdit):
+    """
+    Поле глобального поиска в верхней панели окна (db.search)
+
+    Поиск выполняется в фоновом потоке после паузы в наборе или по Enter,
+    найденные записи показываются списком под полем (лучшие совпадения первыми).
+    Выбор записи (Enter или щелчок) передается сигналом result_activated
+    со строкой результата db.search; что открыть, решает окно роли.
+    """
+
+    result_activated = Signal(object)
+
+    # Пауза в наборе (мс), после которой выполняется поиск
+    SEARCH_DELAY_MS = 400
+    # Число строк списка результатов без прокрутки
+    VISIBLE_RESULTS = 10
+
+    SCOPE_TITLES = {
+        'patients': "Пациент",
+        'appointments': "Запись на прием",
+        'analysis_results': "Анализ",
+    }
+
+    def __init__(self, scopes=None, doctor_id=None, parent=None):
+        """scopes и doctor_id - ограничения поиска для роли (см. db.search)"""
+        super().__init__(parent)
+        self.scopes = scopes
+        self.doctor_id = doctor_id
+        self.results = []
+        self.executor = query_executor()
+
+        self.setPlaceholderText("Поиск: " + ", ".join(
+            self.SCOPE_TITLES[scope].lower() for scope in (scopes or self.SCOPE_TITLES)))
+        self.setClearButtonEnabled(True)
+        self.setMinimumWidth(280)
+
+        # Список результатов - всплывающее окно, как у QCompleter: ввод с клавиатуры
+        # передается обратно в поле, стрелки и Enter обрабатывает список
+        self.popup = QListWidget()
+        self.popup.setWindowFlags(Qt.Popup)
+        self.popup.setFocusPolicy(Qt.NoFocus)
+        self.popup.setFocusProxy(self)
+        self.popup.setWordWrap(True)
+        self.popup.installEventFilter(self)
+        self.popup.itemClicked.connect(self._activate)
+
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.search)
+
+        self.textEdited.connect(self._on_text_edited)
+        self.returnPressed.connect(self.search)
+
+    def search(self):
+        """Запуск поиска по текущей строке"""
+        self.search_timer.stop()
+        text = self.text().strip()
+        if not text:
+            self.executor.cancel(self)
+            self.popup.hide()
+            return
+
+        scopes, doctor_id = self.scopes, self.doctor_id
+        self.executor.submit(
+            self,
+            lambda connection: connection.search(text, scopes=scopes, doctor_id=doctor_id),
+            self._show_results,
+            self._show_error,
+        )
+
+    def _on_text_edited(self, text):
+        if text.strip():
+            self.search_timer.start()
+        else:
+            self.search()
+
+    def _show_results(self, results):
+        self.results = results
+        self.popup.clear()
+        for row, result in enumerate(results):
+            item = QListWidgetItem(f"{self._title(result)}\n{result['snippet']}")
+            item.setData(Qt.UserRole, row)
+            self.popup.addItem(item)
+        if not results:
+            self._show_message("Ничего не найдено")
+            return
+        self.popup.setCurrentRow(0)
+        self._show_popup()
+
+    def _show_error(self, message):
+        self.results = []
+        self.popup.clear()
+        self._show_message(f"Ошибка поиска: {message}")
+
+    def _show_message(self, text):
+        item = QListWidgetItem(text)
+        item.setFlags(Qt.NoItemFlags)
+        self.popup.addItem(item)
+        self._show_popup()
+
+    def _title(self, result):
+        """Первая строка результата: область поиска, пациент и дата записи"""
+        scope = result['scope']
+        parts = [self.SCOPE_TITLES.get(scope, scope)]
+        if scope == 'analysis_results':
+            parts.append(result['analysis_name'] or '')
+        parts.append(result['patient_name'] or '')
+        if scope == 'patients':
+            parts.append(result['birth_date'] or '')
+        elif scope == 'appointments':
+            parts.append((result['appointment_date'] or '')[:16])
+            if result['doctor_name']:
+                parts.append(result['doctor_name'])
+        else:
+            parts.append((result['result_date'] or '')[:16])
+        return " · ".join(part for part in parts if part)
+
+    def _show_popup(self):
+        if not self.isVisible():
+            return
+        rows = min(self.popup.count(), self.VISIBLE_RESULTS)
+        height = sum(self.popup.sizeHintForRow(row) for row in range(rows)) + 2 * self.popup.frameWidth()
+        self.popup.setFixedSize(max(self.width(), 480), height)
+        self.popup.move(self.mapToGlobal(QPoint(0, self.height())))
+        self.popup.show()
+
+    def _activate(self, item):
+        row = item.data(Qt.UserRole)
+        if row is None:
+            return
+        self.popup.hide()
+        self.result_activated.emit(self.results[row])
+
+    def keyPressEvent(self, event):
+        # Стрелка вниз снова открывает список последнего поиска
+        if event.key() == Qt.Key_Down and self.results and not self.popup.isVisible():
+            self._show_popup()
+            return
+        super().keyPressEvent(event)
+
+    def eventFilter(self, obj, event):
+        if obj is self.popup and event.type() == QEvent.KeyPress:
+            key = event.key()
+            if key in (Qt.Key_Return, Qt.Key_Enter):
+                item = self.popup.currentItem()
+                if item is not None:
+                    self._activate(item)
+                return True
+            if key == Qt.Key_Escape:
+                self.popup.hide()
+                return True
+            if key in (Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown):
+                return False
+            # Остальные клавиши редактируют строку поиска
+            self.event(event)
+            return True
+        return super().eventFilter(obj, event)
@@ -5,11 +5,17 @@ from PySide6.QtWidgets import (QMainWindow, QWidget, QLabel, QComboBox, QPushBut
                                QScrollArea, QGridLayout, QGroupBox, QFrame, QSizePolicy)
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QFont, QIcon
+import logging
 import sys
 import json
 from datetime import datetime
 
 from database_connection import db
+from paged_table import TablePager
+from global_search import GlobalSearchBox
+from patient_picker import PatientPicker
+
+logger = logging.getLogger(__name__)
 
 # Единый стиль для всего приложения
 GLOBAL_STYLESHEET = """
@@ -364,7 +370,7 @@ class AnalysisResultDialog(QDialog):
                     value_item.setForeground(QBrush(QColor("red")))
 
         except Exception as e:
-            print(f"[!] Ошибка при анализе нормальности значения: {e}")
+            logger.warning("Ошибка при анализе нормальности значения: %s", e)
 
 
 class LabTechnicianWindow(QMainWindow):
@@ -383,7 +389,6 @@ class LabTechnicianWindow(QMainWindow):
         self.setStyleSheet(GLOBAL_STYLESHEET)
 
         # Загрузка данных для работы
-        self.patients = db.get_all_patients()
         self.analysis_types = db.get_all_analysis_types()
 
         self.setup_ui()
@@ -406,6 +411,11 @@ class LabTechnicianWindow(QMainWindow):
 
         top_panel.addStretch()
 
+        # Глобальный поиск по пациентам и результатам анализов
+        self.global_search = GlobalSearchBox(scopes=('patients', 'analysis_results'), parent=self)
+        self.global_search.result_activated.connect(self.open_search_result)
+        top_panel.addWidget(self.global_search)
+
         logout_button = QPushButton("Выйти")
         logout_button.setObjectName("danger")
         logout_button.clicked.connect(self.logout)
@@ -426,11 +436,8 @@ class LabTechnicianWindow(QMainWindow):
         patient_group = QGroupBox("Выбор пациента")
         patient_layout = QVBoxLayout()
 
-        self.patient_combo = QComboBox()
-        for patient in self.patients:
-            self.patient_combo.addItem(patient['full_name'], patient['id'])
-
-        patient_layout.addWidget(self.patient_combo)
+        self.patient_picker = PatientPicker()
+        patient_layout.addWidget(self.patient_picker)
 
         # Добавляем фильтр для отображения пациентов без анализов
         filter_layout = QHBoxLayout()
@@ -486,14 +493,21 @@ class LabTechnicianWindow(QMainWindow):
             "Дата", "Пациент", "Тип анализа", "Статус", "Действия"
         ])
 
-        # Включаем сортировку
-        self.history_table.setSortingEnabled(True)
         # Растягиваем таблицу на всю доступную ширину и высоту
         self.history_table.horizontalHeader().setStretchLastSection(True)
         self.history_table.verticalHeader().setStretchLastSection(False)
         self.history_table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
         history_layout.addWidget(self.history_table)
+
+        # История загружается страницами по мере прокрутки, новые анализы сверху
+        self.history_pager = TablePager(self.history_table, self._append_history_rows)
+        # Анализы, измененные в других окнах и на других рабочих местах, обновляются на месте
+        self.history_pager.watch_changes({
+            'analysis_results': 'id',
+            'patients': 'patient_id',
+            'analysis_types': 'analysis_type_id',
+        })
         history_group.setLayout(history_layout)
         main_layout.addWidget(history_group, 1)  # Добавляем stretch factor = 1 для растяжения
 
@@ -502,18 +516,20 @@ class LabTechnicianWindow(QMainWindow):
 
     def load_analysis_history(self):
         """Загрузка истории анализов, выполненных текущим лаборантом"""
-        analysis_results = db.fetch_all("""
+        self.history_pager.load("""
             SELECT ar.*, p.full_name as patient_name, at.name as analysis_name 
             FROM analysis_results ar
             JOIN patients p ON ar.patient_id = p.id
             JOIN analysis_types at ON ar.analysis_type_id = at.id
             WHERE ar.lab_user_id = ?
-            ORDER BY ar.result_date DESC
-        """, (self.user_data['id'],))
+        """, ('result_date', 'id'), (self.user_data['id'],), descending=True)
 
-        self.history_table.setRowCount(len(analysis_results))
+        # Автоматическое растягивание столбцов
+        self.history_table.resizeColumnsToContents()
 
-        for row, result in enumerate(analysis_results):
+    def _append_history_rows(self, analysis_results, first_row):
+        """Заполнение строк таблицы истории анализов начиная с first_row"""
+        for row, result in enumerate(analysis_results, first_row):
             # Дата (столбец 0)
             result_date = result['result_date']
             if result_date:
@@ -548,18 +564,17 @@ class LabTechnicianWindow(QMainWindow):
             view_button.clicked.connect(lambda checked, r=result: self.view_analysis_result(r))
             self.history_table.setCellWidget(row, 4, view_button)
 
-        # Установка высоты строк
-        for row in range(self.history_table.rowCount()):
+            # Установка высоты строки
             self.history_table.setRowHeight(row, 60)  # Увеличили высоту до 60 пикселей
 
-        # Автоматическое растягивание столбцов
-        self.history_table.resizeColumnsToContents()
-
     def start_analysis_entry(self):
         """Начало ввода результатов анализа"""
         # Получение выбранного пациента и типа анализа
-        patient_id = self.patient_combo.currentData()
-        patient_name = self.patient_combo.currentText()
+        patient_id = self.patient_picker.patient_id()
+        patient_name = self.patient_picker.patient_name()
+        if not patient_id:
+            QMessageBox.warning(self, "Ошибка", "Выберите пациента")
+            return
 
         analysis_id = self.analysis_combo.currentData()
         analysis_name = self.analysis_combo.currentText()
@@ -597,6 +612,13 @@ class LabTechnicianWindow(QMainWindow):
                     "Не удалось сохранить результаты анализа"
                 )
 
+    def open_search_result(self, result):
+        """Открытие записи, найденной глобальным поиском"""
+        if result['scope'] == 'patients':
+            self.patient_picker.set_patient_id(result['id'])
+        elif result['scope'] == 'analysis_results':
+            self.view_analysis_result(dict(result.items()))
+
     def view_analysis_result(self, result):
         """Просмотр результатов анализа в отдельном окне с таблицей"""
         dialog = AnalysisResultDialog(result, self)
@@ -616,36 +638,31 @@ class LabTechnicianWindow(QMainWindow):
             self.logout_signal.emit()
 
     def show_all_patients(self):
-        """Показать всех пациентов в выпадающем списке"""
-        self.patient_combo.clear()
-        self.patients = db.get_all_patients()
-        for patient in self.patients:
-            self.patient_combo.addItem(patient['full_name'], patient['id'])
+        """Подсказки выбора пациента - по всем пациентам"""
+        self.patient_picker.set_without_analysis_type(None)
+        self.patient_picker.setFocus()
 
         QMessageBox.information(
             self,
             "Информация",
-            f"Отображены все пациенты ({len(self.patients)})"
+            "Поиск по всем пациентам"
         )
 
     def show_patients_without_analysis(self):
-        """Показать только пациентов, у которых нет анализов выбранного типа"""
+        """Подсказки выбора пациента - только пациенты без анализов выбранного типа"""
         # Получаем ID выбранного типа анализа
         analysis_id = self.analysis_combo.currentData()
         analysis_name = self.analysis_combo.currentText()
 
-        # Получаем пациентов без анализов данного типа
-        patients_without_analysis = db.get_patients_without_analysis(analysis_id)
-
-        # Обновляем выпадающий список
-        self.patient_combo.clear()
-        for patient in patients_without_analysis:
-            self.patient_combo.addItem(patient['full_name'], patient['id'])
+        # Подсказки - только пациенты без анализов данного типа
+        self.patient_picker.set_without_analysis_type(analysis_id)
+        self.patient_picker.set_patient(None)
+        self.patient_picker.setFocus()
 
         QMessageBox.information(
             self,
             "Информация",
-            f"Отображены пациенты, у которых нет анализа '{analysis_name}' ({len(patients_without_analysis)})"
+            f"Поиск среди пациентов, у которых нет анализа '{analysis_name}'"
         )
 
 
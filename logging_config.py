@@ -0,0 +1,30 @@
+import logging
+import os
+
+
+# Формат записей журнала
+LOG_FORMAT = "%(asctime)s %(levelname)-7s [%(name)s] %(message)s"
+
+
+def setup_logging(level=None, log_file=None, slow_query_log_file=None):
+    """Настройка журналирования приложения.
+
+    Параметры по умолчанию берутся из переменных окружения:
+    MED_CENTER_LOG_LEVEL (уровень, по умолчанию INFO),
+    MED_CENTER_LOG_FILE (файл журнала, по умолчанию только консоль),
+    MED_CENTER_SLOW_QUERY_LOG (отдельный файл для журнала медленных запросов).
+    """
+    level = level or os.environ.get('MED_CENTER_LOG_LEVEL', 'INFO')
+    log_file = log_file or os.environ.get('MED_CENTER_LOG_FILE')
+    slow_query_log_file = slow_query_log_file or os.environ.get('MED_CENTER_SLOW_QUERY_LOG')
+
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    logging.basicConfig(level=level.upper() if isinstance(level, str) else level,
+                        format=LOG_FORMAT, handlers=handlers)
+
+    if slow_query_log_file:
+        slow_handler = logging.FileHandler(slow_query_log_file, encoding='utf-8')
+        slow_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logging.getLogger('med_center.db.slow').addHandler(slow_handler)
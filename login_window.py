@@ -2,11 +2,14 @@ from PySide6.QtWidgets import (QWidget, QLabel, QLineEdit, QPushButton,
                                QVBoxLayout, QHBoxLayout, QMessageBox)
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QFont, QIcon
+import logging
 import sys
 import os
 
 from database_connection import db
 
+logger = logging.getLogger(__name__)
+
 class LoginWindow(QWidget):
     """Окно авторизации пользователя"""
     # Сигнал для передачи данных о пользователе после успешной авторизации
@@ -95,24 +98,22 @@ class LoginWindow(QWidget):
             QMessageBox.warning(self, "Ошибка", "Введите логин и пароль")
             return
         
-        print(f"Попытка входа: логин={username}, пароль={password}")
-        
         # Проверка логина и пароля через базу данных
         user = db.authenticate_user(username, password)
         
         if user:
-            print(f"Успешная авторизация пользователя: {username}, роль: {user['role']}")
+            logger.info("Успешная авторизация пользователя: %s, роль: %s", username, user['role'])
             # Emit the signal with user data
             self.login_successful.emit(user)
         else:
             # Проверяем явно, если пользователь существует в базе данных
             check_user = db.fetch_one("SELECT * FROM users WHERE username = ?", (username,))
             if check_user:
-                print(f"Пользователь {username} существует, но пароль неверный. Ожидается: {check_user['password']}")
+                logger.info("Пользователь %s существует, но пароль неверный", username)
                 QMessageBox.critical(self, "Ошибка аутентификации", 
                                     "Неверный пароль.\nПроверьте введенные данные и попробуйте снова.")
             else:
-                print(f"Пользователь {username} не найден в базе данных")
+                logger.info("Пользователь %s не найден в базе данных", username)
                 QMessageBox.critical(self, "Ошибка аутентификации", 
                                     "Пользователь не найден.\nПроверьте введенные данные и попробуйте снова.")
             
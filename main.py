@@ -1,3 +1,4 @@
+import logging
 import sys
 from PySide6.QtWidgets import QApplication
 from PySide6.QtCore import QTimer
@@ -7,6 +8,9 @@ from lab_technician_window import LabTechnicianWindow
 from doctor_window import DoctorWindow
 from admin_window import AdminWindow
 from database_connection import db
+from logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
 
 
 class MedicalCenter:
@@ -27,10 +31,10 @@ class MedicalCenter:
         """Инициализация подключения к базе данных без запроса пароля"""
         # Автоматическое подключение с паролем по умолчанию
         if db.connect('1'):  # Используем пароль по умолчанию '1'
-            print("Успешное подключение к базе данных")
+            logger.info("Успешное подключение к базе данных")
             return True
         else:
-            print("Не удалось подключиться к базе данных")
+            logger.error("Не удалось подключиться к базе данных")
             return False
 
     def start_login(self):
@@ -45,7 +49,7 @@ class MedicalCenter:
 
     def handle_login(self, user_data):
         """Обработка успешной авторизации"""
-        print(f"Пользователь {user_data['username']} успешно авторизован. Роль: {user_data['role']}")
+        logger.info("Пользователь %s успешно авторизован. Роль: %s", user_data['username'], user_data['role'])
 
         # Закрываем окно авторизации
         self.login_window.close()
@@ -58,7 +62,7 @@ class MedicalCenter:
         elif user_data['role'] == 'admin':
             self.open_admin_window(user_data)
         else:
-            print(f"Неизвестная роль: {user_data['role']}")
+            logger.warning("Неизвестная роль: %s", user_data['role'])
             # Возвращение к окну авторизации в случае неизвестной роли
             QTimer.singleShot(0, self.start_login)
 
@@ -89,6 +93,8 @@ class MedicalCenter:
 
 
 if __name__ == "__main__":
+    setup_logging()
+
     # Запуск приложения
     medical_center = MedicalCenter()
     sys.exit(medical_center.run())
\ No newline at end of file
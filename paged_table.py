@@ -0,0 +1,645 @@
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QRect, Signal
+from PySide6.QtGui import QColor
+from PySide6.QtWidgets import QLabel, QStyledItemDelegate
+
+from async_query import query_executor
+from change_feed import change_feed
+from database_connection import DEFAULT_PAGE_SIZE
+
+
+def _order_keys(order_key):
+    return (order_key,) if isinstance(order_key, str) else tuple(order_key)
+
+
+def _comparable_key(key):
+    """
+    Ключ строки, который можно сравнивать в Python: NULL (None) в столбце ключа
+    меньше любого значения, как в ORDER BY SQLite (см. keyset_page_parts)
+    """
+    return tuple((value is not None, value) for value in key)
+
+
+def _insert_position(keys, key, descending):
+    """Номер, на который встает строка с ключом key в списке ключей keys (в порядке выборки)"""
+    low, high = 0, len(keys)
+    while low < high:
+        middle = (low + high) // 2
+        if (keys[middle] < key) if descending else (keys[middle] > key):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def changed_row_ids(rows, identity, change_columns, changes):
+    """
+    id строк списка, которые нужно выбрать заново после изменений changes ({таблица: {id: операция}})
+
+    identity - столбец строки с id записи (последний столбец ключа выборки);
+    change_columns - {таблица: столбец строки с id ее записи}. Записи основной
+    таблицы (столбец identity) берутся все: среди них могут быть новые. Изменения
+    связанных таблиц (пациенты, справочники) касаются только загруженных строк
+    с этими записями.
+    """
+    ids = set()
+    for table, column in change_columns.items():
+        changed = changes.get(table)
+        if not changed:
+            continue
+        if column == identity:
+            ids.update(changed)
+        else:
+            ids.update(row[identity] for row in rows if row[column] in changed)
+    return ids
+
+
+def changed_rows_operations(rows, ids, fresh_rows, order_key, descending=False, bound=None):
+    """
+    Изменения загруженного списка по текущим версиям измененных записей
+
+    rows - загруженные строки в порядке ключа постраничной выборки order_key
+    (последний столбец ключа - id строки); ids - id измененных записей,
+    fresh_rows - их строки в выборке сейчас (db.fetch_changed_rows).
+    bound - ключ последней загруженной строки, если загружены не все страницы:
+    записи за ним не добавляются, они придут со следующими страницами.
+
+    Возвращает операции, которые применяются по порядку: ('update', номер, строка) -
+    строка изменилась на месте, ('remove', номер) и ('insert', номер, строка).
+    """
+    keys = _order_keys(order_key)
+    identity = keys[-1]
+
+    def row_key(row):
+        return _comparable_key(row[key] for key in keys)
+
+    if bound is not None:
+        bound = _comparable_key(bound)
+    fresh = {row[identity]: row for row in fresh_rows}
+    operations = []
+    # Ключи строк, оставшихся в списке, в порядке списка
+    kept = []
+    for row in rows:
+        if row[identity] not in ids:
+            kept.append(row_key(row))
+            continue
+        current = fresh.get(row[identity])
+        if current is not None and row_key(current) == row_key(row):
+            del fresh[row[identity]]
+            operations.append(('update', len(kept), current))
+            kept.append(row_key(row))
+        else:
+            # Удалена, больше не подходит под условия или переместилась (вставляется ниже)
+            operations.append(('remove', len(kept)))
+
+    for row in fresh.values():
+        key = row_key(row)
+        if bound is not None and ((key < bound) if descending else (key > bound)):
+            continue
+        position = _insert_position(kept, key, descending)
+        kept.insert(position, key)
+        operations.append(('insert', position, row))
+    return operations
+
+
+class LoadingIndicator(QLabel):
+    """Надпись «Загрузка...» поверх таблицы (QTableWidget или QTableView) на время фонового запроса"""
+
+    def __init__(self, table, text="Загрузка..."):
+        super().__init__(text, table)
+        self.table = table
+        self.setAlignment(Qt.AlignCenter)
+        self.setStyleSheet("background-color: rgba(255, 255, 255, 230); color: #555555; "
+                           "border: 1px solid #c8c8c8; border-radius: 4px; padding: 4px 12px;")
+        self.hide()
+
+    def start(self):
+        """Показ индикатора: по центру пустой таблицы или у нижнего края под загруженными строками"""
+        self.adjustSize()
+        viewport = self.table.viewport().geometry()
+        x = viewport.x() + (viewport.width() - self.width()) // 2
+        if self.table.model().rowCount():
+            y = viewport.bottom() - self.height() - 8
+        else:
+            y = viewport.y() + (viewport.height() - self.height()) // 2
+        self.move(x, y)
+        self.raise_()
+        self.show()
+
+    def stop(self):
+        """Скрытие индикатора"""
+        self.hide()
+
+
+class _ChangeTrackingMixin:
+    """
+    Обновление загруженных строк выборки по журналу изменений (change_feed.ChangeFeed)
+
+    Класс хранит загруженные строки в self._rows, выборку в _query, _order_key,
+    _params и _descending, а позицию постраничной загрузки - в _after и _has_more.
+    Заново выбираются только строки измененных записей (db.fetch_changed_rows),
+    changed_rows_operations переводит их в операции над списком, а каждая операция
+    применяется своим методом класса: _remove_loaded_row, _update_loaded_row
+    и _insert_loaded_row.
+    """
+
+    def _init_change_tracking(self):
+        # Таблица -> столбец результата с id ее записи (watch_changes)
+        self.change_columns = {}
+        # id измененных строк, еще не выбранных заново
+        self._changed = set()
+        self._changes_channel = (self, 'changes')
+
+    def watch_changes(self, change_columns):
+        """
+        Обновление загруженных строк по журналу изменений
+
+        change_columns - {таблица: столбец результата с id ее записи}, например
+        {'analysis_results': 'id', 'patients': 'patient_id'}: после изменения
+        пациента заново выбираются только загруженные строки с его patient_id
+        (см. changed_row_ids).
+        Если журнал нельзя дочитать, выборка загружается заново (reload).
+        """
+        self.change_columns = dict(change_columns)
+        feed = change_feed()
+        feed.changes_received.connect(self.apply_changes)
+        feed.reset_required.connect(self.reload)
+
+    def apply_changes(self, changes):
+        """Выборка заново только строк записей, измененных в changes ({таблица: {id: операция}})"""
+        if self._query is None:
+            return
+        identity = _order_keys(self._order_key)[-1]
+        self._changed |= changed_row_ids(self._rows, identity, self.change_columns, changes)
+        self._fetch_changed_rows()
+
+    def _cancel_changes(self):
+        """Отмена ожидаемой выборки измененных строк (перед новой выборкой списка)"""
+        self._changed = set()
+        self.executor.cancel(self._changes_channel)
+
+    def _fetch_changed_rows(self):
+        # Изменения, пришедшие во время выборки, выбираются следующим запросом
+        if not self._changed or self._query is None or self.executor.is_busy(self._changes_channel):
+            return
+        ids, self._changed = self._changed, set()
+        query, params = self._query, self._params
+        identity = _order_keys(self._order_key)[-1]
+        self.executor.submit(
+            self._changes_channel,
+            lambda connection: (ids, connection.fetch_changed_rows(query, identity, ids, params)),
+            self._on_changed_rows_loaded,
+        )
+
+    def _on_changed_rows_loaded(self, result):
+        ids, rows = result
+        bound = self._after if self._has_more else None
+        for operation in changed_rows_operations(self._rows, ids, rows, self._order_key, self._descending, bound):
+            if operation[0] == 'remove':
+                self._remove_loaded_row(operation[1])
+            elif operation[0] == 'update':
+                self._update_loaded_row(operation[1], operation[2])
+            else:
+                self._insert_loaded_row(operation[1], operation[2])
+        self._fetch_changed_rows()
+
+    def _remove_loaded_row(self, row):
+        """Удаление строки номер row из self._rows и с экрана"""
+        raise NotImplementedError
+
+    def _update_loaded_row(self, row, values):
+        """Замена строки номер row в self._rows и ее перерисовка"""
+        raise NotImplementedError
+
+    def _insert_loaded_row(self, row, values):
+        """Вставка строки values на место row в self._rows и на экран"""
+        raise NotImplementedError
+
+
+class TablePager(_ChangeTrackingMixin):
+    """
+    Постраничная загрузка строк в QTableWidget через db.fetch_page
+
+    Первая страница загружается в load(), следующие - при прокрутке таблицы
+    к концу. В памяти и в таблице находятся только просмотренные страницы,
+    поэтому открытие списка не зависит от размера таблицы в базе.
+    Порядок строк задается ключом запроса, сортировку таблицы по щелчку
+    на заголовке для таких списков следует отключать.
+
+    Страницы запрашиваются в фоновом потоке (AsyncQueryExecutor), пока запрос
+    выполняется, поверх таблицы показывается индикатор загрузки. Новый load()
+    отменяет ожидаемый результат предыдущей выборки.
+
+    После watch_changes() выборка load() обновляется по журналу изменений базы:
+    заново выбираются, перерисовываются, добавляются и удаляются только строки
+    измененных записей (см. _ChangeTrackingMixin).
+    """
+
+    def __init__(self, table, append_rows, page_size=DEFAULT_PAGE_SIZE, executor=None):
+        """
+        table - QTableWidget;
+        append_rows(rows, first_row) - заполнение строк таблицы начиная с first_row
+        (количество строк таблицы уже увеличено на len(rows)).
+        """
+        self.table = table
+        self.append_rows = append_rows
+        self.page_size = page_size
+        self.executor = executor or query_executor()
+        self.indicator = LoadingIndicator(table)
+        # Функция выборки страницы: (connection, after, limit) -> (строки, ключ следующей страницы)
+        self._fetch_page = None
+        self._after = None
+        self._has_more = False
+        # Загруженные строки и выборка load() для обновления по журналу изменений
+        self._rows = []
+        self._query = None
+        self._order_key = None
+        self._params = ()
+        self._descending = False
+        self._init_change_tracking()
+
+        table.verticalScrollBar().valueChanged.connect(self._on_scroll)
+        # Результат для закрытого окна не нужен
+        table.destroyed.connect(self._on_table_destroyed)
+
+    def load(self, query, order_key, params=None, descending=False):
+        """Новая выборка (см. db.fetch_page): таблица очищается и загружается первая страница"""
+        params = tuple(params or ())
+        self.load_from(lambda connection, after, limit: connection.fetch_page(
+            query, order_key, after=after, limit=limit, params=params, descending=descending))
+        self._query = query
+        self._order_key = order_key
+        self._params = params
+        self._descending = descending
+
+    def load_from(self, fetch_page):
+        """
+        Новая выборка из функции fetch_page(connection, after, limit) -> (строки, ключ
+        следующей страницы), например метода db, который дополняет страницу связанными
+        записями; функция выполняется в фоновом потоке
+        """
+        self._fetch_page = fetch_page
+        self._after = None
+        self._has_more = True
+        self._rows = []
+        self._query = None
+        self.executor.cancel(self)
+        self._cancel_changes()
+        self.table.setRowCount(0)
+        self.load_next_page()
+
+    def reload(self):
+        """Повторная загрузка текущей выборки с первой страницы"""
+        if self._query is not None:
+            self.load(self._query, self._order_key, self._params, self._descending)
+        elif self._fetch_page is not None:
+            self.load_from(self._fetch_page)
+
+    def has_more(self):
+        """Есть ли незагруженные страницы"""
+        return self._has_more
+
+    def is_loading(self):
+        """Выполняется ли запрос страницы"""
+        return self.executor.is_busy(self)
+
+    def load_next_page(self):
+        """Запрос следующей страницы; строки добавляются в конец таблицы по готовности"""
+        if not self._has_more or self.is_loading():
+            return
+        fetch_page, after, limit = self._fetch_page, self._after, self.page_size
+
+        self.indicator.start()
+        self.executor.submit(
+            self,
+            lambda connection: fetch_page(connection, after, limit),
+            self._on_page_loaded,
+            self._on_page_failed,
+        )
+
+    def _on_page_loaded(self, page):
+        rows, self._after = page
+        self._has_more = self._after is not None
+        self.indicator.stop()
+
+        first_row = self.table.rowCount()
+        self._rows.extend(rows)
+        self.table.setRowCount(first_row + len(rows))
+        self.append_rows(rows, first_row)
+
+    def _on_page_failed(self, message):
+        # Ошибка уже записана в журнал; следующая прокрутка повторит запрос
+        self.indicator.stop()
+
+    def _remove_loaded_row(self, row):
+        del self._rows[row]
+        self.table.removeRow(row)
+
+    def _update_loaded_row(self, row, values):
+        self._rows[row] = values
+        self.append_rows([values], row)
+
+    def _insert_loaded_row(self, row, values):
+        self._rows.insert(row, values)
+        self.table.insertRow(row)
+        self.append_rows([values], row)
+
+    def _on_table_destroyed(self):
+        self.executor.cancel(self)
+        self.executor.cancel(self._changes_channel)
+        if self.change_columns:
+            feed = change_feed()
+            try:
+                feed.changes_received.disconnect(self.apply_changes)
+                feed.reset_required.disconnect(self.reload)
+            except RuntimeError:
+                # При завершении приложения опрос удаляется раньше таблиц
+                pass
+
+    def _on_scroll(self, value):
+        # Следующая страница подгружается, когда до конца таблицы остается меньше экрана
+        scroll_bar = self.table.verticalScrollBar()
+        if self._has_more and value >= scroll_bar.maximum() - scroll_bar.pageStep():
+            self.load_next_page()
+
+
+class PagedTableModel(_ChangeTrackingMixin, QAbstractTableModel):
+    """
+    Модель таблицы с постраничной загрузкой через canFetchMore/fetchMore
+
+    Представление (QTableView) само запрашивает следующую страницу, когда прокрутка
+    доходит до конца загруженных строк. Страницы выбираются db.fetch_page в фоновом
+    потоке (AsyncQueryExecutor). Модель хранит только строки результата, виджеты
+    и элементы таблицы на каждую строку не создаются: представление запрашивает
+    у модели только значения видимых ячеек.
+
+    Сортировка по щелчку на заголовке выполняется в базе: у столбца задается ключ
+    постраничной выборки, модель запоминает выбранный столбец и порядок и сообщает
+    об изменении сигналом sort_changed, а виджет загружает выборку заново
+    с ключом и порядком из sort_key().
+
+    После watch_changes() модель обновляется по журналу изменений базы
+    (change_feed.ChangeFeed), в том числе по изменениям с других рабочих мест:
+    заново выбираются только строки измененных записей, они заменяются на месте,
+    удаляются или вставляются по ключу сортировки (changed_rows_operations).
+    """
+
+    sort_changed = Signal()
+
+    def __init__(self, columns, page_size=DEFAULT_PAGE_SIZE, executor=None, parent=None, cache_pages=False):
+        """
+        columns - список (заголовок, значение) или (заголовок, значение, ключ сортировки):
+        значение - имя столбца результата, функция row -> значение или None (столбец
+        без данных, например с кнопками делегата); ключ сортировки - order_key для
+        db.fetch_page, по столбцам без ключа таблица не сортируется.
+        cache_pages - страницы берутся из кэша результатов запросов (fetch_page(cache=True)),
+        для списков, которые часто перезагружают с теми же фильтрами.
+        """
+        super().__init__(parent)
+        self.columns = columns
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self.executor = executor or query_executor()
+        # Индикатор загрузки представления (LoadingIndicator), задается в attach_view()
+        self.indicator = None
+        self.sort_column = None
+        self.sort_order = Qt.AscendingOrder
+        self._header = None
+        self._rows = []
+        self._query = None
+        self._order_key = None
+        self._params = ()
+        self._descending = False
+        self._after = None
+        self._has_more = False
+        self._init_change_tracking()
+
+    def attach_view(self, view):
+        """Подключение представления: модель и индикатор загрузки поверх него"""
+        view.setModel(self)
+        self.indicator = LoadingIndicator(view)
+        # Результат для закрытого окна не нужен
+        changes_channel = self._changes_channel
+        view.destroyed.connect(lambda: self.executor.cancel(self))
+        view.destroyed.connect(lambda: self.executor.cancel(changes_channel))
+        if any(self._sort_key(column) for column in range(len(self.columns))):
+            self._header = view.horizontalHeader()
+            if self.sort_column is not None:
+                self._header.setSortIndicator(self.sort_column, self.sort_order)
+            view.setSortingEnabled(True)
+
+    def set_sort(self, column, order=Qt.AscendingOrder):
+        """Начальная сортировка (без загрузки выборки)"""
+        self.sort_column = column
+        self.sort_order = order
+        if self._header is not None:
+            self._header.setSortIndicator(column, order)
+
+    def sort_key(self):
+        """Ключ постраничной выборки и признак убывания для текущей сортировки"""
+        return self._sort_key(self.sort_column), self.sort_order == Qt.DescendingOrder
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Вызывается представлением по щелчку на заголовке
+        if not self._sort_key(column):
+            # Столбец без ключа: указатель сортировки возвращается на текущий столбец
+            if self._header is not None and self.sort_column is not None:
+                self._header.setSortIndicator(self.sort_column, self.sort_order)
+            return
+        if (column, order) == (self.sort_column, self.sort_order):
+            return
+        self.sort_column = column
+        self.sort_order = order
+        self.sort_changed.emit()
+
+    def _sort_key(self, column):
+        if column is None or column < 0 or len(self.columns[column]) < 3:
+            return None
+        return self.columns[column][2]
+
+    def load(self, query, order_key, params=None, descending=False):
+        """Новая выборка (см. db.fetch_page): строки модели заменяются первой страницей"""
+        self.executor.cancel(self)
+        self._cancel_changes()
+        self.beginResetModel()
+        self._rows = []
+        self._query = query
+        self._order_key = order_key
+        self._params = tuple(params or ())
+        self._descending = descending
+        self._after = None
+        self._has_more = True
+        self.endResetModel()
+        self.fetchMore()
+
+    def reload(self):
+        """Повторная загрузка текущей выборки с первой страницы"""
+        if self._query is not None:
+            self.load(self._query, self._order_key, self._params, self._descending)
+
+    def row(self, row):
+        """Строка результата по номеру строки модели"""
+        return self._rows[row]
+
+    def update_row(self, row, values):
+        """
+        Изменение загруженной строки без повторной выборки
+
+        values - новые значения столбцов (например, строка RETURNING после UPDATE);
+        перерисовывается только эта строка.
+        """
+        updated = dict(self._rows[row].items())
+        updated.update(values.items())
+        self._rows[row] = updated
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.columns) - 1))
+
+    def remove_row(self, row):
+        """Удаление загруженной строки без повторной выборки"""
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self.endRemoveRows()
+
+    def is_loading(self):
+        """Выполняется ли запрос страницы"""
+        return self.executor.is_busy(self)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section][0]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            value = self.columns[index.column()][1]
+            if value is None:
+                return None
+            row = self._rows[index.row()]
+            value = value(row) if callable(value) else row[value]
+            return '' if value is None else str(value)
+        if role == Qt.UserRole:
+            return self._rows[index.row()]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more and not self.is_loading()
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        query, order_key, after = self._query, self._order_key, self._after
+        params, descending, limit = self._params, self._descending, self.page_size
+        cache = self.cache_pages
+
+        if self.indicator is not None:
+            self.indicator.start()
+        self.executor.submit(
+            self,
+            lambda connection: connection.fetch_page(query, order_key, after=after, limit=limit,
+                                                     params=params, descending=descending, cache=cache),
+            self._on_page_loaded,
+            self._on_page_failed,
+        )
+
+    def _on_page_loaded(self, page):
+        rows, self._after = page
+        self._has_more = self._after is not None
+        if self.indicator is not None:
+            self.indicator.stop()
+        if rows:
+            first_row = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first_row, first_row + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+
+    def _on_page_failed(self, message):
+        # Ошибка уже записана в журнал; следующая прокрутка повторит запрос
+        if self.indicator is not None:
+            self.indicator.stop()
+
+    def _remove_loaded_row(self, row):
+        self.remove_row(row)
+
+    def _update_loaded_row(self, row, values):
+        self._rows[row] = values
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.columns) - 1))
+
+    def _insert_loaded_row(self, row, values):
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.insert(row, values)
+        self.endInsertRows()
+
+
+class ActionButtonsDelegate(QStyledItemDelegate):
+    """
+    Кнопки действий в ячейке таблицы, нарисованные делегатом
+
+    В отличие от setCellWidget, не создает виджеты на каждую строку. Нажатие
+    на кнопку передается сигналом clicked(номер строки, ключ действия).
+    """
+
+    clicked = Signal(int, str)
+
+    # Цвета кнопок по имени стиля, как у QPushButton#primary и т. п. в таблицах стилей окон
+    COLORS = {
+        'primary': '#007bff',
+        'secondary': '#6c757d',
+        'success': '#28a745',
+        'danger': '#dc3545',
+        'info': '#17a2b8',
+        'successS': '#A5D6A7',
+        'dangerS': '#FFAB91',
+    }
+    # Цвет текста светлых кнопок (для остальных - белый)
+    TEXT_COLORS = {
+        'successS': '#2c3e50',
+        'dangerS': '#2c3e50',
+    }
+    MARGIN = 4
+    SPACING = 5
+
+    def __init__(self, actions, parent=None, available=None):
+        """
+        actions - список (ключ действия, текст кнопки, стиль из COLORS);
+        available(row) - ключи действий, доступных для строки результата (по умолчанию все).
+        Место под кнопку отводится всегда, поэтому кнопки не сдвигаются между строками.
+        """
+        super().__init__(parent)
+        self.actions = actions
+        self.available = available
+
+    def _buttons(self, rect, index):
+        """Пары (прямоугольник, действие) для кнопок, доступных в строке index"""
+        area = rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        count = len(self.actions)
+        width = (area.width() - self.SPACING * (count - 1)) // count
+        keys = None if self.available is None else self.available(index.model().row(index.row()))
+        return [(QRect(area.x() + i * (width + self.SPACING), area.y(), width, area.height()), action)
+                for i, action in enumerate(self.actions) if keys is None or action[0] in keys]
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(painter.RenderHint.Antialiasing)
+        font = painter.font()
+        font.setBold(True)
+        painter.setFont(font)
+        for rect, (_, text, style) in self._buttons(option.rect, index):
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor(self.COLORS[style]))
+            painter.drawRoundedRect(rect, 5, 5)
+            painter.setPen(QColor(self.TEXT_COLORS.get(style, 'white')))
+            painter.drawText(rect, Qt.AlignCenter, text)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            position = event.position().toPoint()
+            for rect, (key, _, _) in self._buttons(option.rect, index):
+                if rect.contains(position):
+                    self.clicked.emit(index.row(), key)
+                    return True
+        return super().editorEvent(event, model, option, index)
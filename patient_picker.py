@@ -0,0 +1,178 @@
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QTimer, Signal
+from PySide6.QtWidgets import QCompleter, QLineEdit
+
+from async_query import query_executor
+from database_connection import db, DEFAULT_PATIENT_MATCHES
+
+
+class PatientSearchModel(QAbstractListModel):
+    """
+    Подсказки для выбора пациента: кандидаты db.find_patients для строки поиска
+
+    Кандидаты запрашиваются в фоновом потоке (AsyncQueryExecutor) по индексу
+    patients_search, в модели только последняя выборка (не более limit строк),
+    поэтому ни время ответа, ни память не зависят от числа пациентов в базе.
+    """
+
+    # Роль со строкой пациента (dict)
+    PatientRole = Qt.UserRole
+
+    # Выборка для строки поиска загружена
+    results_ready = Signal(str)
+
+    def __init__(self, limit=DEFAULT_PATIENT_MATCHES, executor=None, parent=None):
+        super().__init__(parent)
+        self.limit = limit
+        self.executor = executor or query_executor()
+        # Только пациенты без анализов этого типа (см. db.find_patients)
+        self.without_analysis_type_id = None
+        self._patients = []
+
+    def search(self, text):
+        """Запрос кандидатов для строки поиска; пустая строка очищает модель"""
+        text = text.strip()
+        if not text:
+            self.executor.cancel(self)
+            self._show(text, [])
+            return
+
+        limit, without_analysis_type_id = self.limit, self.without_analysis_type_id
+        self.executor.submit(
+            self,
+            lambda connection: connection.find_patients(
+                text, limit, without_analysis_type_id=without_analysis_type_id),
+            lambda patients: self._show(text, patients),
+            lambda message: self._show(text, []),
+        )
+
+    def cancel(self):
+        """Отмена ожидаемого результата"""
+        self.executor.cancel(self)
+
+    def _show(self, text, patients):
+        self.beginResetModel()
+        self._patients = [dict(patient) for patient in patients]
+        self.endResetModel()
+        self.results_ready.emit(text)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._patients)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        patient = self._patients[index.row()]
+        if role == Qt.DisplayRole:
+            details = [patient.get('birth_date'), patient.get('phone')]
+            return " · ".join([patient['full_name']] + [value for value in details if value])
+        if role == Qt.EditRole:
+            return patient['full_name']
+        if role == self.PatientRole:
+            return patient
+        return None
+
+
+class PatientPicker(QLineEdit):
+    """
+    Поле выбора пациента с подсказками по мере ввода
+
+    Заменяет QComboBox со всеми пациентами: список не загружается заранее,
+    после паузы в наборе кандидаты (ФИО с опечатками, телефон, email)
+    запрашиваются в фоновом потоке и показываются списком QCompleter.
+    Выбранный пациент - patient(); пустое поле означает, что пациент
+    не выбран (в фильтрах - «все пациенты», см. empty_text).
+    Текст, введенный без выбора из списка, при выходе из поля заменяется
+    ФИО выбранного пациента.
+    """
+
+    # Выбран другой пациент (dict или None)
+    patient_changed = Signal(object)
+
+    # Пауза в наборе (мс), после которой запрашиваются кандидаты
+    SEARCH_DELAY_MS = 250
+
+    def __init__(self, empty_text="ФИО или телефон пациента", parent=None):
+        super().__init__(parent)
+        self._patient = None
+        self.setPlaceholderText(empty_text)
+        self.setClearButtonEnabled(True)
+        self.setMinimumWidth(250)
+
+        self.search_model = PatientSearchModel(parent=self)
+        self.search_model.results_ready.connect(self._show_completions)
+
+        # Кандидаты уже отобраны запросом, QCompleter их только показывает
+        self.patient_completer = QCompleter(self.search_model, self)
+        self.patient_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.patient_completer.setMaxVisibleItems(10)
+        self.patient_completer.activated[QModelIndex].connect(self._on_activated)
+        self.setCompleter(self.patient_completer)
+
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(lambda: self.search_model.search(self.text()))
+
+        self.textEdited.connect(self._on_text_edited)
+        self.editingFinished.connect(self._restore_text)
+        # Результат для закрытого поля не нужен
+        search_model = self.search_model
+        self.destroyed.connect(lambda: search_model.executor.cancel(search_model))
+
+    def patient(self):
+        """Выбранный пациент (dict) или None"""
+        return self._patient
+
+    def patient_id(self):
+        """id выбранного пациента или None"""
+        return self._patient['id'] if self._patient else None
+
+    def patient_name(self):
+        """ФИО выбранного пациента или пустая строка"""
+        return self._patient['full_name'] if self._patient else ""
+
+    def set_patient(self, patient):
+        """Выбор пациента (строка таблицы patients или None)"""
+        self.search_timer.stop()
+        self.search_model.cancel()
+        previous_id = self.patient_id()
+        self._patient = dict(patient) if patient else None
+        self.setText(self.patient_name())
+        if self.patient_id() != previous_id:
+            self.patient_changed.emit(self._patient)
+
+    def set_patient_id(self, patient_id):
+        """Выбор пациента по id"""
+        self.set_patient(db.get_patient(patient_id) if patient_id else None)
+
+    def set_without_analysis_type(self, analysis_type_id):
+        """Предлагать только пациентов без анализов этого типа (None - всех)"""
+        self.search_model.without_analysis_type_id = analysis_type_id
+
+    def _on_text_edited(self, text):
+        if text.strip():
+            self.search_timer.start()
+        else:
+            # Очищенное поле - пациент не выбран
+            self.set_patient(None)
+
+    def _show_completions(self, text):
+        # Ответ на устаревшую строку не показывается
+        if text != self.text().strip() or not self.hasFocus():
+            return
+        if self.search_model.rowCount() == 0:
+            self.patient_completer.popup().hide()
+            return
+        self.patient_completer.complete()
+        popup = self.patient_completer.popup()
+        popup.setCurrentIndex(self.patient_completer.completionModel().index(0, 0))
+
+    def _on_activated(self, index):
+        patient = index.data(PatientSearchModel.PatientRole)
+        if patient is not None:
+            self.set_patient(patient)
+
+    def _restore_text(self):
+        self.search_timer.stop()
+        if self.text() != self.patient_name():
+            self.setText(self.patient_name())
@@ -0,0 +1,143 @@
+import bisect
+import json
+import re
+import threading
+from datetime import datetime
+
+
+# Верхние границы корзин гистограммы задержек (мс): геометрическая шкала
+# от 0.01 мс до ~2 минут, шаг 25%. Память на оператор не зависит от числа вызовов.
+LATENCY_BUCKETS_MS = [0.01 * 1.25 ** i for i in range(74)]
+
+# Ограничение числа различных операторов и кэша нормализации
+MAX_STATEMENTS = 1000
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(query):
+    """Нормализация SQL: один пробел между словами, литералы и списки IN заменены на ?"""
+    normalized = _STRING_LITERAL_RE.sub("?", query)
+    normalized = _NUMBER_LITERAL_RE.sub("?", normalized)
+    normalized = _IN_LIST_RE.sub("(?...)", normalized)
+    return _WHITESPACE_RE.sub(" ", normalized).strip()
+
+
+class StatementStats:
+    """Статистика одного нормализованного SQL-оператора"""
+
+    __slots__ = ('sql', 'calls', 'total_ms', 'max_ms', 'rows', 'buckets', 'plan', 'plan_captured_at')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.plan = None
+        self.plan_captured_at = None
+
+    def record(self, elapsed_ms, rows):
+        """Учет одного выполнения"""
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        self.rows += rows
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, fraction):
+        """Оценка перцентиля по гистограмме (верхняя граница корзины, мс)"""
+        if not self.calls:
+            return 0.0
+        rank = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return min(LATENCY_BUCKETS_MS[index], self.max_ms)
+                return self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        """Снимок статистики в виде словаря"""
+        return {
+            'sql': self.sql,
+            'calls': self.calls,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'p50_ms': round(self.percentile(0.50), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+            'plan': self.plan,
+            'plan_captured_at': self.plan_captured_at,
+        }
+
+
+class QueryStatistics:
+    """Сбор статистики выполнения SQL-операторов по нормализованному тексту"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statements = {}
+        # Кэш: исходный текст запроса -> статистика его нормализованного оператора.
+        # Повторный запрос не нормализуется и не берет блокировку
+        self._by_query = {}
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+
+    def record(self, query, elapsed_ms, rows):
+        """Учет выполнения запроса; возвращает статистику оператора (или None при переполнении)"""
+        stats = self._by_query.get(query)
+        if stats is None:
+            stats = self._statement(query)
+            if stats is None:
+                return None
+        # Счетчики обновляются без блокировки: при одновременном учете из двух
+        # потоков одно выполнение может потеряться, статистика остается оценкой
+        stats.record(elapsed_ms, rows)
+        return stats
+
+    def _statement(self, query):
+        """Статистика оператора запроса (создается при первом выполнении)"""
+        sql = normalize_sql(query)
+        with self._lock:
+            stats = self._statements.get(sql)
+            if stats is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    return None
+                stats = self._statements[sql] = StatementStats(sql)
+            if len(self._by_query) < MAX_STATEMENTS * 4:
+                self._by_query[query] = stats
+        return stats
+
+    def set_plan(self, stats, plan):
+        """Сохранение плана выполнения медленного оператора"""
+        stats.plan = plan
+        stats.plan_captured_at = datetime.now().isoformat(timespec='seconds')
+
+    def reset(self):
+        """Сброс накопленной статистики"""
+        with self._lock:
+            self._statements.clear()
+            self._by_query = {}
+            self.started_at = datetime.now().isoformat(timespec='seconds')
+
+    def snapshot(self):
+        """Список статистик операторов, отсортированный по суммарному времени"""
+        with self._lock:
+            statements = [stats.to_dict() for stats in self._statements.values()]
+        statements.sort(key=lambda item: item['total_ms'], reverse=True)
+        return statements
+
+
+def dump_stats_json(stats, path):
+    """Сохранение результата db.stats() в JSON-файл"""
+    with open(path, 'w', encoding='utf-8') as stats_file:
+        json.dump(stats, stats_file, ensure_ascii=False, indent=2)
@@ -1,5 +1,6 @@
 import os
 import json
+import sqlite3
 from datetime import datetime
 import docx
 from docx.shared import Pt, Cm, RGBColor, Inches
@@ -7,7 +8,7 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from PySide6.QtWidgets import QFileDialog, QMessageBox
 from PySide6.QtCore import QDate
 
-from database_connection import DatabaseConnection
+from database_connection import DatabaseConnection, date_range_bounds
 
 # Создаем экземпляр менеджера БД
 db = DatabaseConnection()
@@ -140,11 +141,11 @@ def export_all_analyses_to_word(parent_widget, filters=None):
     # Применяем фильтры, если они указаны
     if filters:
         if filters.get('patient_id'):
-            query += " AND p.id = ?"
+            query += " AND ar.patient_id = ?"
             params.append(filters['patient_id'])
         
         if filters.get('analysis_type_id'):
-            query += " AND at.id = ?"
+            query += " AND ar.analysis_type_id = ?"
             params.append(filters['analysis_type_id'])
         
         if filters.get('from_date'):
@@ -152,17 +153,19 @@ def export_all_analyses_to_word(parent_widget, filters=None):
             params.append(filters['from_date'])
         
         if filters.get('to_date'):
-            query += " AND ar.result_date <= ?"
-            params.append(filters['to_date'])
+            # Дата окончания включается целиком: сравнение с началом следующего дня
+            query += " AND ar.result_date < ?"
+            params.append(date_range_bounds(filters['to_date'], filters['to_date'])[1])
         
         if filters.get('status'):
             query += " AND ar.status = ?"
             params.append(filters['status'])
     
-    # Получаем результаты
-    results = db.fetch_all(query, tuple(params))
+    # Количество результатов; сами строки читаются потоком при формировании документа
+    total = db.fetch_one(f"SELECT COUNT(*) as count FROM ({query})", tuple(params))
+    total = total['count'] if total else 0
     
-    if not results:
+    if not total:
         QMessageBox.warning(parent_widget, "Внимание", "Нет результатов анализов для экспорта.")
         return
     
@@ -186,56 +189,61 @@ def export_all_analyses_to_word(parent_widget, filters=None):
     date_paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
     
     # Общая информация
-    doc.add_paragraph(f'Количество результатов: {len(results)}')
+    doc.add_paragraph(f'Количество результатов: {total}')
     
     # Проходим по каждому результату
-    for i, result in enumerate(results, 1):
-        doc.add_heading(f'{i}. {result["analysis_type"]} - {result["patient_name"]}', level=2)
+    try:
+        for i, result in enumerate(db.iter_rows(query, tuple(params)), 1):
+            # Разделитель между результатами
+            if i > 1:
+                doc.add_paragraph('_' * 50)
         
-        # Информация о пациенте
-        patient_info = doc.add_paragraph()
-        patient_info.add_run('Пациент: ').bold = True
-        patient_info.add_run(f'{result["patient_name"]}, {result["birth_date"]}, {result["gender"]}, тел: {result["phone"]}')
+            doc.add_heading(f'{i}. {result["analysis_type"]} - {result["patient_name"]}', level=2)
         
-        date_info = doc.add_paragraph()
-        date_info.add_run('Дата анализа: ').bold = True
-        date_info.add_run(result['date'])
+            # Информация о пациенте
+            patient_info = doc.add_paragraph()
+            patient_info.add_run('Пациент: ').bold = True
+            patient_info.add_run(f'{result["patient_name"]}, {result["birth_date"]}, {result["gender"]}, тел: {result["phone"]}')
         
-        status_info = doc.add_paragraph()
-        status_info.add_run('Статус: ').bold = True
-        status_info.add_run(result['status'])
+            date_info = doc.add_paragraph()
+            date_info.add_run('Дата анализа: ').bold = True
+            date_info.add_run(result['date'])
         
-        lab_tech_info = doc.add_paragraph()
-        lab_tech_info.add_run('Лаборант: ').bold = True
-        lab_tech_info.add_run(result['lab_technician'])
+            status_info = doc.add_paragraph()
+            status_info.add_run('Статус: ').bold = True
+            status_info.add_run(result['status'])
         
-        # Данные результатов анализа
-        result_data = json.loads(result['result_data']) if result['result_data'] else {}
+            lab_tech_info = doc.add_paragraph()
+            lab_tech_info.add_run('Лаборант: ').bold = True
+            lab_tech_info.add_run(result['lab_technician'])
         
-        if result_data:
-            doc.add_heading('Результаты анализа:', level=3)
-            results_table = doc.add_table(rows=len(result_data) + 1, cols=3)
-            results_table.style = 'Table Grid'
+            # Данные результатов анализа
+            result_data = json.loads(result['result_data']) if result['result_data'] else {}
+        
+            if result_data:
+                doc.add_heading('Результаты анализа:', level=3)
+                results_table = doc.add_table(rows=len(result_data) + 1, cols=3)
+                results_table.style = 'Table Grid'
             
-            # Заголовки таблицы
-            headers = ['Параметр', 'Значение', 'Нормальные значения']
-            for j, header in enumerate(headers):
-                results_table.cell(0, j).text = header
+                # Заголовки таблицы
+                headers = ['Параметр', 'Значение', 'Нормальные значения']
+                for j, header in enumerate(headers):
+                    results_table.cell(0, j).text = header
             
-            # Заполняем таблицу результатами
-            for j, (param, value) in enumerate(result_data.items(), 1):
-                results_table.cell(j, 0).text = param
-                results_table.cell(j, 1).text = str(value)
+                # Заполняем таблицу результатами
+                for j, (param, value) in enumerate(result_data.items(), 1):
+                    results_table.cell(j, 0).text = param
+                    results_table.cell(j, 1).text = str(value)
                 
-                # Получаем нормальные значения для параметра
-                normal_values = get_normal_values(param)
-                results_table.cell(j, 2).text = normal_values
-        else:
-            doc.add_paragraph('Нет данных о результатах анализа.')
-        
-        # Добавляем разделитель между результатами
-        if i < len(results):
-            doc.add_paragraph('_' * 50)
+                    # Получаем нормальные значения для параметра
+                    normal_values = get_normal_values(param)
+                    results_table.cell(j, 2).text = normal_values
+            else:
+                doc.add_paragraph('Нет данных о результатах анализа.')
+    
+    except sqlite3.Error as e:
+        QMessageBox.critical(parent_widget, "Ошибка", f"Не удалось прочитать результаты анализов: {str(e)}")
+        return None
     
     # Выбор места сохранения файла
     date_str = datetime.now().strftime("%Y%m%d_%H%M")
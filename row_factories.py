@@ -0,0 +1,138 @@
+import sqlite3
+from collections import namedtuple
+
+
+# Доступные представления строк результата:
+#   dict       - словарь (по умолчанию, значения можно изменять)
+#   row        - sqlite3.Row с методами словаря (get, items, values)
+#   namedtuple - именованный кортеж, класс создается один раз на набор столбцов
+#   tuple      - кортеж с общим для всех строк соответствием столбец -> индекс
+# Все представления поддерживают row['столбец'], row.get(), keys(), values(),
+# items(), 'столбец' in row и dict(row). Изменять можно только dict.
+ROW_FACTORY_NAMES = ('dict', 'row', 'namedtuple', 'tuple')
+
+# Ограничение числа классов строк в кэше (по одному на набор столбцов)
+MAX_ROW_CLASSES = 1000
+
+
+class DictRow(sqlite3.Row):
+    """sqlite3.Row с методами словаря"""
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (IndexError, KeyError):
+            return default
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return list(zip(self.keys(), self))
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def to_dict(self):
+        return dict(zip(self.keys(), self))
+
+
+class _MappingRowMixin:
+    """Доступ к значениям кортежа по имени столбца, как в словаре"""
+
+    __slots__ = ()
+    # Имя столбца -> индекс; задается в классе, общем для всех строк запроса
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return list(self._index)
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return [(key, tuple.__getitem__(self, index)) for key, index in self._index.items()]
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def to_dict(self):
+        return {key: tuple.__getitem__(self, index) for key, index in self._index.items()}
+
+
+def _column_index(names):
+    # При повторяющихся именах столбцов берется последний, как в словаре
+    return {name: index for index, name in enumerate(names)}
+
+
+def _make_namedtuple_class(names):
+    base = namedtuple('Row', names, rename=True)
+    return type('Row', (_MappingRowMixin, base), {'__slots__': (), '_index': _column_index(names)})
+
+
+def _make_tuple_class(names):
+    return type('TupleRow', (_MappingRowMixin, tuple), {'__slots__': (), '_index': _column_index(names)})
+
+
+class _CachedClassFactory:
+    """Фабрика строк, создающая класс строки один раз на набор столбцов запроса"""
+
+    def __init__(self, make_class):
+        self._make_class = make_class
+        self._classes = {}
+        # cursor.description - один объект на все строки результата: повторный
+        # поиск класса выполняется только при смене запроса
+        self._last = (None, None)
+
+    def __call__(self, cursor, row):
+        description = cursor.description
+        last_description, row_class = self._last
+        if description is not last_description:
+            row_class = self._row_class(tuple(column[0] for column in description))
+            self._last = (description, row_class)
+        return tuple.__new__(row_class, row)
+
+    def _row_class(self, names):
+        row_class = self._classes.get(names)
+        if row_class is None:
+            row_class = self._make_class(names)
+            if len(self._classes) < MAX_ROW_CLASSES:
+                self._classes[names] = row_class
+        return row_class
+
+
+class _DictFactory:
+    """Фабрика строк-словарей; имена столбцов вычисляются один раз на запрос"""
+
+    def __init__(self):
+        self._last = (None, None)
+
+    def __call__(self, cursor, row):
+        description = cursor.description
+        last_description, names = self._last
+        if description is not last_description:
+            names = tuple(column[0] for column in description)
+            self._last = (description, names)
+        return dict(zip(names, row))
+
+
+def make_row_factory(name):
+    """Фабрика строк результата по имени из ROW_FACTORY_NAMES"""
+    if name == 'dict':
+        return _DictFactory()
+    if name == 'row':
+        return DictRow
+    if name == 'namedtuple':
+        return _CachedClassFactory(_make_namedtuple_class)
+    if name == 'tuple':
+        return _CachedClassFactory(_make_tuple_class)
+    raise ValueError(f"Неизвестное представление строк: {name}")
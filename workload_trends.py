@@ -0,0 +1,222 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from PySide6.QtCharts import QChart, QChartView, QDateTimeAxis, QLineSeries, QValueAxis
+from PySide6.QtCore import Qt, QDate, QDateTime, QTime
+from PySide6.QtGui import QPainter
+from PySide6.QtWidgets import QGridLayout, QLabel, QVBoxLayout, QWidget
+
+from async_query import query_executor
+
+
+# Таблицы, из которых строятся ряды (устаревание записи в кэше результатов запросов)
+WORKLOAD_TABLES = ('daily_doctor_appointment_stats', 'daily_lab_stats', 'daily_turnaround_stats',
+                   'doctors', 'users')
+
+# Шаг рядов по длине периода (дней): до 3 месяцев - дни, до 2 лет - недели, дальше - месяцы.
+# Шаг обозначается первым днем (понедельник недели, первое число месяца)
+TREND_FREQUENCIES = [(92, 'D'), (731, 'W-MON'), (None, 'MS')]
+
+# Число линий на графике: остальные врачи (лаборанты) суммируются в одну линию
+MAX_TREND_LINES = 8
+OTHERS_LABEL = "Остальные"
+
+APPOINTMENT_STATUSES = ['scheduled', 'completed', 'cancelled']
+
+
+def trend_frequency(start_date, end_date):
+    """Шаг рядов (правило pandas) для периода [start_date, end_date)"""
+    days = (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days
+    for max_days, frequency in TREND_FREQUENCIES:
+        if max_days is None or days <= max_days:
+            return frequency
+
+
+def _daily_frame(rows, columns):
+    """Строки сводки в DataFrame со столбцом day типа datetime64"""
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    frame['day'] = pd.to_datetime(frame['day'], format='%Y-%m-%d', errors='coerce')
+    return frame.dropna(subset=['day'])
+
+
+def _by_day(frame, column, days, frequency):
+    """Суммы count по дням и значениям column: строки - шаги периода, столбцы - значения column"""
+    table = frame.groupby(['day', column])['count'].sum().unstack(fill_value=0)
+    return table.reindex(days, fill_value=0).resample(frequency, closed='left', label='left').sum()
+
+
+def _named_lines(table, names):
+    """Подписи столбцов по именам и не более MAX_TREND_LINES линий (самые нагруженные)"""
+    table = table.rename(columns=lambda key: names.get(key) or f"№ {key}")
+    if table.shape[1] > MAX_TREND_LINES:
+        order = table.sum().sort_values(ascending=False).index
+        others = table[order[MAX_TREND_LINES - 1:]].sum(axis=1)
+        table = table[order[:MAX_TREND_LINES - 1]].assign(**{OTHERS_LABEL: others})
+    return table
+
+
+def compute_workload_trends(statistics, start_date, end_date, today=None):
+    """
+    Ряды нагрузки за период [start_date, end_date) по сводкам db.get_workload_statistics
+
+    Все ряды считаются операциями pandas над строками сводок (по строке на день
+    и разрез), а не над записями, поэтому время зависит только от длины периода.
+    Дни без записей дают нули; шаг ряда выбирается по длине периода (trend_frequency).
+    Возвращает словарь:
+      'frequency'           - шаг рядов;
+      'doctor_appointments' - записи на прием (кроме отмененных) по врачам;
+      'lab_results'         - результаты анализов по лаборантам;
+      'turnaround_hours'    - средний срок от записи на прием до результата, часы
+                              (NaN, если результатов нет);
+      'appointment_rates'   - доли отмененных ('cancelled') и неявок ('no_show',
+                              прошедшие записи, оставшиеся запланированными), %.
+    """
+    today = today or date.today().isoformat()
+    frequency = trend_frequency(start_date, end_date)
+    days = pd.date_range(start_date, end_date, freq='D', inclusive='left', name='day')
+
+    doctor_names = {row[0]: row[1] for row in statistics['doctors']}
+    user_names = {row[0]: row[1] for row in statistics['users']}
+
+    appointments = _daily_frame(statistics['doctor_appointments'], ['day', 'doctor_id', 'status', 'count'])
+    by_doctor = _by_day(appointments[appointments['status'] != 'cancelled'], 'doctor_id', days, frequency)
+
+    by_status = _by_day(appointments, 'status', days, frequency).reindex(
+        columns=APPOINTMENT_STATUSES, fill_value=0)
+    total = by_status.sum(axis=1)
+    # Неявка - запись прошедшего дня, оставшаяся запланированной: доля среди записей прошедших дней
+    past = _by_day(appointments[appointments['day'] < pd.Timestamp(today)], 'status', days, frequency).reindex(
+        columns=APPOINTMENT_STATUSES, fill_value=0)
+    past_total = past.sum(axis=1)
+    rates = pd.DataFrame({
+        'cancelled': by_status['cancelled'] / total.where(total > 0) * 100,
+        'no_show': past['scheduled'] / past_total.where(past_total > 0) * 100,
+    })
+
+    results = _daily_frame(statistics['lab_results'], ['day', 'lab_user_id', 'count'])
+    by_lab_user = _by_day(results, 'lab_user_id', days, frequency)
+
+    turnaround = _daily_frame(statistics['turnaround'], ['day', 'count', 'minutes'])
+    turnaround = turnaround.set_index('day')[['count', 'minutes']].reindex(days, fill_value=0)
+    turnaround = turnaround.resample(frequency, closed='left', label='left').sum()
+
+    return {
+        'frequency': frequency,
+        'doctor_appointments': _named_lines(by_doctor, doctor_names),
+        'lab_results': _named_lines(by_lab_user, user_names),
+        'turnaround_hours': (turnaround['minutes'] / turnaround['count'].where(turnaround['count'] > 0) / 60).astype(float),
+        'appointment_rates': rates,
+    }
+
+
+def load_workload_trends(connection, start_date, end_date, today=None):
+    """
+    Ряды compute_workload_trends из кэша результатов запросов: повторный запрос
+    того же периода не читает сводки, пока в них ничего не записано
+    """
+    today = today or date.today().isoformat()
+    return connection.cached_result(
+        ('workload_trends', start_date, end_date, today), WORKLOAD_TABLES,
+        lambda: compute_workload_trends(
+            connection.get_workload_statistics(start_date, end_date, row_factory='tuple'),
+            start_date, end_date, today),
+    )
+
+
+class WorkloadTrendsWidget(QWidget):
+    """
+    Графики динамики нагрузки за период (вкладка «Динамика» статистики администратора)
+
+    Ряды load_workload_trends считаются в фоновом потоке (AsyncQueryExecutor),
+    графики QtCharts перестраиваются по готовому результату.
+    """
+
+    # Заголовки графиков: ключ ряда -> (заголовок, подпись оси значений)
+    CHARTS = [
+        ('doctor_appointments', "Записи на прием по врачам", "Записей"),
+        ('lab_results', "Анализы по лаборантам", "Анализов"),
+        ('turnaround_hours', "Срок от записи на прием до результата анализа", "Часов"),
+        ('appointment_rates', "Отмены и неявки", "%"),
+    ]
+    RATE_TITLES = {'cancelled': "Отменено", 'no_show': "Неявки"}
+    FREQUENCY_TITLES = {'D': "по дням", 'W-MON': "по неделям", 'MS': "по месяцам"}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        grid = QGridLayout()
+        self.charts = {}
+        for position, (key, title, _) in enumerate(self.CHARTS):
+            chart = QChart()
+            chart.setTitle(title)
+            chart.legend().setAlignment(Qt.AlignBottom)
+            view = QChartView(chart)
+            view.setRenderHint(QPainter.Antialiasing)
+            view.setMinimumHeight(280)
+            grid.addWidget(view, position // 2, position % 2)
+            self.charts[key] = chart
+        layout.addLayout(grid)
+
+        # Результат для закрытого окна не нужен
+        self.destroyed.connect(lambda: query_executor().cancel(self))
+
+    def load(self, start_date, end_date):
+        """Пересчет графиков за период [start_date, end_date) (даты 'YYYY-MM-DD')"""
+        self.status_label.setText("Загрузка динамики...")
+        query_executor().submit(
+            self,
+            lambda connection: load_workload_trends(connection, start_date, end_date),
+            self._show_trends,
+            lambda message: self.status_label.setText(f"Ошибка при загрузке динамики: {message}"),
+        )
+
+    def _show_trends(self, trends):
+        """Построение графиков по рядам compute_workload_trends"""
+        self.status_label.setText(f"Динамика {self.FREQUENCY_TITLES.get(trends['frequency'], '')}")
+        for key, _, value_title in self.CHARTS:
+            lines = trends[key]
+            if key == 'appointment_rates':
+                lines = lines.rename(columns=self.RATE_TITLES)
+            elif key == 'turnaround_hours':
+                lines = lines.to_frame("Средний срок")
+            self._show_lines(self.charts[key], lines, value_title)
+
+    def _show_lines(self, chart, lines, value_title):
+        """Линии графика по столбцам DataFrame (индекс - начало шага периода)"""
+        chart.removeAllSeries()
+        for axis in chart.axes():
+            chart.removeAxis(axis)
+
+        # Время точек - полночь дня по местному времени, как показывает QDateTimeAxis
+        x = np.array([QDateTime(QDate(day.year, day.month, day.day), QTime(0, 0)).toMSecsSinceEpoch()
+                      for day in lines.index], dtype=float)
+
+        x_axis = QDateTimeAxis()
+        x_axis.setFormat("dd.MM.yyyy")
+        y_axis = QValueAxis()
+        y_axis.setTitleText(value_title)
+        y_axis.setLabelFormat("%.0f")
+        chart.addAxis(x_axis, Qt.AlignBottom)
+        chart.addAxis(y_axis, Qt.AlignLeft)
+
+        for column in lines.columns:
+            values = lines[column].to_numpy(dtype=float)
+            # Шаги без данных (NaN) не рисуются
+            present = ~np.isnan(values)
+            series = QLineSeries()
+            series.setName(str(column))
+            series.appendNp(x[present], values[present])
+            chart.addSeries(series)
+            series.attachAxis(x_axis)
+            series.attachAxis(y_axis)
+
+        if len(x):
+            x_axis.setRange(QDateTime.fromMSecsSinceEpoch(int(x[0])), QDateTime.fromMSecsSinceEpoch(int(x[-1])))
+        maximum = np.nanmax(lines.to_numpy(dtype=float), initial=0) if lines.size else 0
+        y_axis.setRange(0, max(maximum * 1.1, 1))
+        y_axis.applyNiceNumbers()